@@ -1,36 +1,116 @@
 # main_scraper.py
 
-from src.select_companies import select_companies
-from src.connection import validate_connection
+import sys
+import argparse
 
-# Los siguientes módulos se agregan más adelante:
-# from src import extract_filings, download_xml, extract_xbrl
+# Los módulos del pipeline (pandas, requests, lxml) se importan dentro de
+# main(), después de leer los argumentos: así --help responde al instante.
 
-def main():
+# Rutas por defecto (relativas a la raíz del repositorio)
+JOBS_DB = "dataset/pipeline_jobs.sqlite"
+INDEX_DIR = "dataset/index_json"
+XML_DIR = "dataset/xml_reports"
+FACTS_DB = "dataset/xbrl_facts.sqlite"
+METRICS_JSON = "dataset/pipeline_metrics.json"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="SEC Scraper: descarga índices, filings y XBRL y guarda "
+                    "los hechos. Se puede interrumpir y volver a lanzar: "
+                    "sólo se repite el trabajo fallido o pendiente.")
+    parser.add_argument("--mode", type=int, choices=[0, 1, 2], default=1,
+                        help="0 = todas las empresas, 1 = tickers indicados, "
+                             "2 = empresas aleatorias")
+    parser.add_argument("--tickers", default="",
+                        help="Tickers separados por coma (modo 1)")
+    parser.add_argument("--sample", type=int, default=10,
+                        help="Número de empresas aleatorias (modo 2)")
+    parser.add_argument("--forms", nargs="+", default=["10-K", "10-Q"])
+    parser.add_argument("--year", type=int, default=0,
+                        help="Año de presentación (0 = todos)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Hilos de descarga")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Volver a consultar los índices para detectar "
+                             "filings nuevos")
+    parser.add_argument("--cache", default=None,
+                        help="Directorio de DocumentCache (opcional)")
+    parser.add_argument("--jobs-db", default=JOBS_DB)
+    parser.add_argument("--status", action="store_true",
+                        help="Mostrar el estado de los trabajos y salir")
+    parser.add_argument("--metrics", default=METRICS_JSON,
+                        help="Resumen JSON de métricas al terminar "
+                             "('' = no guardarlo)")
+    parser.add_argument("--prometheus", default=None,
+                        help="Archivo de métricas en formato Prometheus, "
+                             "reescrito cada 15 s durante la ejecución")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Servir las métricas Prometheus en "
+                             "http://127.0.0.1:PUERTO/metrics")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     print("=== SEC Scraper ===")
-    print("Selecciona modo de ejecución:")
-    print(" 0 - Todas las empresas")
-    print(" 1 - Empresas seleccionadas manualmente")
-    print(" 2 - 10 empresas aleatorias")
 
-    try:
-        modo = int(input("Modo: "))
-    except ValueError:
-        print("Entrada inválida. Debe ser un número.")
-        return
+    from src.pipeline import (JobStore, run_pipeline, print_status,
+                              unfinished_jobs)
+
+    if args.status:
+        print_status(JobStore(args.jobs_db).counts())
+        return 0
+
+    tickers = [t for t in args.tickers.split(",") if t.strip()]
+    if args.mode == 1 and not tickers:
+        print("El modo 1 necesita --tickers (ej: --tickers AAPL,MSFT).")
+        return 2
 
-    companies_df = select_companies(modo)
+    from src.select_companies import select_companies
+    from src.connection import validate_connection
+    from src.document_cache import DocumentCache
+
+    companies_df = select_companies(args.mode, tickers=tickers,
+                                    sample_size=args.sample)
 
     if not validate_connection():
         print("Error de conexión con la SEC. Abortando.")
-        return
+        return 1
+
+    from src.metrics import (export_periodically, serve_prometheus,
+                             write_json_summary, write_prometheus)
 
-    # Aquí irán los siguientes pasos del pipeline
-    # extract_filings.run(companies_df)
-    # download_xml.run(companies_df)
-    # extract_xbrl.run(companies_df)
+    # Métricas visibles durante la ejecución (opcional)
+    exporter = export_periodically(args.prometheus) if args.prometheus \
+        else None
+    server = serve_prometheus(args.metrics_port) \
+        if args.metrics_port is not None else None
+
+    cache = DocumentCache(args.cache) if args.cache else None
+    try:
+        counts = run_pipeline(companies_df, args.jobs_db, INDEX_DIR, XML_DIR,
+                              FACTS_DB, forms=args.forms, year=args.year,
+                              max_workers=args.workers, cache=cache,
+                              refresh=args.refresh)
+    finally:
+        # El resumen se guarda también si la ejecución se interrumpe
+        if args.metrics:
+            write_json_summary(args.metrics)
+            print(f"Métricas guardadas en: {args.metrics}")
+        if exporter is not None:
+            exporter.set()
+            write_prometheus(args.prometheus)
+        if server is not None:
+            server.shutdown()
+    print_status(counts)
 
-    print("Proceso inicial completado.")
+    # Fallidos o todavía en curso (p. ej. reclamados por otro proceso)
+    unfinished = unfinished_jobs(counts)
+    if unfinished:
+        print(f"{unfinished} trabajos fallidos o sin terminar; vuelve a "
+              "ejecutar para reintentarlos.")
+        return 1
+    print("Proceso completado.")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,15 +1,16 @@
-import time
-import random
-import requests
+import os
+import json
+import hashlib
 import pandas as pd
-import xml.etree.ElementTree as ET
-from typing import List, Dict
-
-HEADERS = {
-    "User-Agent": "Alberto Paramio Galisteo (aparamio@uoc.edu) - "
-                  "SEC Scraper for academic use",
-    "Accept-Encoding": "gzip, deflate"
-}
+from typing import List, Dict, Optional, Set, Tuple
+from src.downloader import (fetch, iter_body, iter_concurrently,
+                            DEFAULT_MAX_WORKERS)
+from src.columnar_output import write_parquet_dataset_chunked
+from src.company_registry import get_registry
+from src.filing_catalog import FilingCatalog, load_catalog
+from src.text_blocks import TextBlockStore, externalize_text_blocks
+from src.xbrl_parser import iter_top_level_chunks
+from src.xbrl_types import tag_types
 
 
 def read_ticker_list(file_path: str) -> List[str]:
@@ -30,94 +31,178 @@ def read_ticker_list(file_path: str) -> List[str]:
 def map_tickers_to_ciks(tickers: List[str], company_list_path: str) -> pd.DataFrame:
     """
     Maps a list of ticker symbols to their corresponding CIKs using the company
-    list CSV.
+    registry built from the company list.
 
     Args:
         tickers (List[str]): List of ticker symbols to filter.
         company_list_path (str): Path to the CSV file containing columns
-        'ticker', 'cik', and 'title'.
+        'ticker', 'cik', and 'title' (or to company_tickers.json).
 
     Returns:
         pd.DataFrame: Filtered DataFrame with columns 'ticker', 'cik' (padded
         to 10 digits), and any other available metadata.
     """
-    df = pd.read_csv(company_list_path, dtype={"cik": str})
-    df = df[df["ticker"].isin(tickers)].copy()
-    df["cik"] = df["cik"].str.zfill(10)
-    return df
+    return get_registry(company_list_path).select_tickers(tickers)
+
+
+FORMS = {0: ["10-K", "10-Q"], 1: ["10-K"], 2: ["10-Q"]}
+
+# Fiscal quarter -> fiscal_period of the filing catalog; the fourth
+# quarter is reported in the annual report
+FISCAL_PERIODS = {1: "Q1", 2: "Q2", 3: "Q3", 4: ["Q4", "FY"]}
 
 
-def load_filing_datasets(report_type: int) -> pd.DataFrame:
+def load_filing_datasets(report_type: int,
+                         index_json_dir: str) -> FilingCatalog:
     """
-    Loads one or both SEC filing datasets (10-K and/or 10-Q) based on the
-    report type.
+    Loads the filing catalog of the SEC index.json files, after checking the
+    report type that will be queried from it.
+
+    The catalog is rebuilt only when `index_json_dir` has changed since it
+    was saved, and already holds the fiscal year and fiscal period of every
+    filing.
 
     Args:
         report_type (int):
-            - 1 to load only 10-K filings
-            - 2 to load only 10-Q filings
-            - 0 to load and combine both 10-K and 10-Q filings
+            - 1 to query only 10-K filings
+            - 2 to query only 10-Q filings
+            - 0 to query both 10-K and 10-Q filings
+        index_json_dir (str): Directory containing CIK index.json files.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the selected filings, with at
-        least columns:
-            - cik (string, zero-padded)
-            - filing_date
-            - form
-            - accession_number
-            - filing_url
+        FilingCatalog: Catalog of every filing of `index_json_dir`.
 
     Raises:
         ValueError: If report_type is not one of 0, 1, or 2.
     """
-    if report_type == 1:
-        return pd.read_csv("../dataset/10k_filings.csv",
-                           dtype={"cik": str})
-    elif report_type == 2:
-        return pd.read_csv("../dataset/10q_filings.csv",
-                           dtype={"cik": str})
-    elif report_type == 0:
-        df1 = pd.read_csv("../dataset/10k_filings.csv",
-                          dtype={"cik": str})
-        df2 = pd.read_csv("../dataset/10q_filings.csv",
-                          dtype={"cik": str})
-        return pd.concat([df1, df2], ignore_index=True)
-    else:
+    if report_type not in FORMS:
         raise ValueError("report_type must be 0 (all), 1 (10-K), or 2 (10-Q)")
+    return load_catalog(index_json_dir)
 
 
-def filter_filings(df: pd.DataFrame, ciks: List[str], year: int,
-                       quarter: int) -> pd.DataFrame:
+def filter_filings(catalog: FilingCatalog, ciks: List[str], year: int,
+                   quarter: int, report_type: int = 0) -> pd.DataFrame:
     """
-    Filters a DataFrame of SEC filings by CIKs, year, and quarter.
+    Filters the filing catalog by CIKs, form, fiscal year and fiscal quarter.
 
     Args:
-        df (pd.DataFrame): DataFrame containing filings with at least 'cik' and
-        'filing_date' columns.
+        catalog (FilingCatalog): Catalog from `load_filing_datasets`.
         ciks (List[str]): List of CIKs (10-digit strings) to include.
-        year (int): Year to filter filings by. Use 0 to include all years.
-        quarter (int): Quarter to filter by (1–4). Use 0 to include all quarters.
+        year (int): Fiscal year to filter filings by. Use 0 to include all
+        years.
+        quarter (int): Fiscal quarter to filter by (1–4, 4 being the annual
+        report). Use 0 to include all quarters.
+        report_type (int): 1 = 10-K, 2 = 10-Q, 0 = both.
 
     Returns:
-        pd.DataFrame: Filtered DataFrame containing only filings that match the
-        provided criteria.
+        pd.DataFrame: Catalog rows of the matching filings, with 'cik' as a
+        string and their 'fiscal_year' and 'fiscal_period'.
     """
-    df["year"] = pd.to_datetime(df["filing_date"]).dt.year
-    df["month"] = pd.to_datetime(df["filing_date"]).dt.month
-    filtered = df[df["cik"].isin(ciks)]
+    filtered = catalog.query(ciks=ciks, forms=FORMS[report_type],
+                             fiscal_year=year or None,
+                             fiscal_period=FISCAL_PERIODS.get(quarter))
+    return filtered.astype({"cik": str})
+
+
+BATCH_SIZE = 50  # records per flush to the output CSV
 
-    if year != 0:
-        filtered = filtered[filtered["year"] == year]
+PARQUET_CHUNK_SIZE = 10_000  # CSV rows held in memory by the Parquet step
 
-    if quarter in [1, 2, 3, 4]:
-        quarter_map = {1: (1, 3), 2: (4, 6), 3: (7, 9), 4: (10, 12)}
-        start_m, end_m = quarter_map[quarter]
-        filtered = filtered[(filtered["month"] >= start_m) & (filtered["month"] <= end_m)]
+METADATA_COLUMNS = ["cik", "ticker", "year", "quarter", "form",
+                    "accession_number"]
 
-    return filtered
 
+def checkpoint_path(output_path: str) -> str:
+    """Checkpoint file kept next to the output CSV."""
+    return output_path + ".checkpoint"
 
-def download_and_parse_xbrl(url: str, tags: List[str]) -> Dict[str, str]:
+
+def checkpoint_key(columns: List[str], year: int, quarter: int) -> str:
+    """
+    Fingerprint of the output columns and filters of a run: a checkpoint
+    written with another tag list, year or quarter cannot be resumed.
+    """
+    payload = "\n".join(list(columns) + [f"year={year}",
+                                          f"quarter={quarter}"])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_checkpoint(output_path: str, key: str = "") -> Tuple[Set[str], int]:
+    """
+    Reads the checkpoint of a previous run of `process_filings`.
+
+    The checkpoint is a JSON-lines file with one line per flushed batch:
+    {"key": <checkpoint_key>, "offset": <CSV size after the batch>,
+    "accessions": [...]}. A line cut short by a crash is ignored, and so is
+    the checkpoint itself when the output CSV no longer exists or when it
+    was written under another key.
+
+    Args:
+        output_path (str): Path to the output CSV.
+        key (str): `checkpoint_key` of the current run.
+
+    Returns:
+        Tuple[Set[str], int]: Accession numbers already written and the CSV
+        size, in bytes, covered by the checkpoint.
+    """
+    done, offset = set(), 0
+    path = checkpoint_path(output_path)
+    if not os.path.exists(path) or not os.path.exists(output_path):
+        return done, offset
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                batch = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if batch.get("key", "") != key:
+                print(f"Checkpoint of {output_path} was written with other "
+                      f"tags or filters: starting over")
+                return set(), 0
+            done.update(batch["accessions"])
+            offset = batch["offset"]
+    return done, offset
+
+
+def flush_batch(records: List[Dict], columns: List[str],
+                output_path: str,
+                text_store: Optional[TextBlockStore] = None,
+                key: str = "") -> None:
+    """
+    Appends `records` to the output CSV and then records their accession
+    numbers in the checkpoint. Both files are fsync'ed, so after a crash
+    the checkpoint never claims rows that are not on disk.
+
+    Args:
+        records (List[Dict]): Rows to write.
+        columns (List[str]): Output column order.
+        output_path (str): Path to the output CSV.
+        text_store (Optional[TextBlockStore]): If given, TextBlock values
+        are moved to this store and the CSV gets their block ids.
+        key (str): `checkpoint_key` recorded with the batch.
+    """
+    df = pd.DataFrame(records, columns=columns)
+    if text_store is not None:
+        # A batch is too small to pay for a process pool
+        df = externalize_text_blocks(df, text_store, max_workers=1)
+    write_header = not os.path.exists(output_path) \
+        or os.path.getsize(output_path) == 0
+    with open(output_path, "a", encoding="utf-8", newline="") as f:
+        df.to_csv(f, header=write_header, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+        offset = f.tell()
+    with open(checkpoint_path(output_path), "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "key": key,
+            "offset": offset,
+            "accessions": [r["accession_number"] for r in records]}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def download_and_parse_xbrl(url: str, tags: List[str],
+                            cache_path: Optional[str] = None) -> Dict[str, str]:
     """
     Downloads an XBRL (XML) file from the SEC and extracts the values of
     specified tags.
@@ -126,6 +211,8 @@ def download_and_parse_xbrl(url: str, tags: List[str]) -> Dict[str, str]:
         url (str): Direct URL to the XBRL (.xml) file.
         tags (List[str]): List of tag names (XBRL elements) to extract from the
         XML content.
+        cache_path (Optional[str]): If given, the raw XML is also saved to
+        this file while it is being parsed.
 
     Returns:
         Dict[str, str]: Dictionary where keys are tag names and values are the
@@ -136,15 +223,21 @@ def download_and_parse_xbrl(url: str, tags: List[str]) -> Dict[str, str]:
     Notes:
         - Only top-level tags in the XML are checked.
         - Namespaces are ignored (only the local tag name is considered).
+        - The response body is fed to an incremental parser as it arrives,
+          so the whole document is never held in memory.
     """
     try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
+        response = fetch(url, timeout=15, stream=True)
+        if not response.ok:
+            response.close()
+            response.raise_for_status()
+        tag_set = frozenset(tags)
         data = {}
-        for elem in root:
+        for elem in iter_top_level_chunks(iter_body(response, cache_path)):
+            if not isinstance(elem.tag, str):
+                continue
             tag = elem.tag.split("}")[-1]
-            if tag in tags:
+            if tag in tag_set:
                 data[tag] = elem.text
         return data
     except Exception as e:
@@ -154,24 +247,35 @@ def download_and_parse_xbrl(url: str, tags: List[str]) -> Dict[str, str]:
 
 def process_filings(df_filings: pd.DataFrame, tickers_map: Dict[str, str],
                     tags_df: pd.DataFrame, year: int, quarter: int,
-                    output_path: str) -> None:
+                    output_path: str,
+                    max_workers: int = DEFAULT_MAX_WORKERS,
+                    parquet_path: Optional[str] = None,
+                    batch_size: int = BATCH_SIZE,
+                    text_store: Optional[TextBlockStore] = None) -> None:
     """
     Processes a list of SEC filings: downloads each XBRL report, extracts specified tags,
     and saves the data to a structured CSV file.
 
     Args:
         df_filings (pd.DataFrame): DataFrame containing the filtered filings.
-                                   Must include 'cik', 'filing_date', and
-                                   'filing_url'.
+                                   Must include 'cik', 'accession_number',
+                                   'fiscal_year', and 'filing_url'.
         tickers_map (Dict[str, str]): Dictionary mapping CIKs (as strings) to
         tickers.
         tags_df (pd.DataFrame): DataFrame containing the 'tag_name' column with
         XBRL tags to extract.
-        year (int): Year of the filings being processed (used in output
-        metadata).
+        year (int): Fiscal year of the filings being processed.
         quarter (int): Quarter (1–4) or 0 for all quarters (used in output
         metadata).
         output_path (str): Path to the CSV file where the results will be saved.
+        max_workers (int): Number of concurrent download threads.
+        parquet_path (Optional[str]): If given, the results are also written
+        as a Parquet dataset partitioned by fiscal year and form, with the
+        tag columns typed by the `data_type` column of `tags_df`.
+        batch_size (int): Records written per flush to the output CSV.
+        text_store (Optional[TextBlockStore]): If given, TextBlock values
+        (whole HTML sections) are stored there, compressed, and the output
+        only holds their block ids.
 
     Returns:
         None
@@ -180,8 +284,19 @@ def process_filings(df_filings: pd.DataFrame, tickers_map: Dict[str, str],
         - Downloads the XBRL XML file for each filing from the SEC.
         - Extracts only the tags listed in `tags_df`.
         - Each row in the output CSV corresponds to one filing.
-        - Adds basic metadata: cik, ticker, year, quarter.
-        - Includes polite scraping delays to avoid overloading the SEC servers.
+        - Adds basic metadata: cik, ticker, year (the fiscal year of the
+          filing), quarter, form, accession_number.
+        - Downloads run concurrently under the shared rate limiter to
+          avoid overloading the SEC servers.
+        - Rows are appended to the CSV every `batch_size` filings and the
+          accession numbers written are recorded in
+          `<output_path>.checkpoint`. Running again with the same
+          `output_path` skips the filings already written, so an
+          interrupted run resumes where it stopped, as long as the tags,
+          year and quarter are the same; otherwise it starts over. Delete
+          both files to start over anyway.
+        - The Parquet dataset is written from the CSV in chunks of
+          PARQUET_CHUNK_SIZE rows.
     """
     tag_names = tags_df.columns.str.lower().str.strip().tolist()
     if "tag_name" not in tag_names:
@@ -189,10 +304,21 @@ def process_filings(df_filings: pd.DataFrame, tickers_map: Dict[str, str],
 
     tags_df.columns = tag_names  # Normalize headers
     tag_list = tags_df["tag_name"].tolist()
+    columns = list(dict.fromkeys(METADATA_COLUMNS + tag_list))
+
+    key = checkpoint_key(columns, year, quarter)
+    done, offset = load_checkpoint(output_path, key)
+    if done:
+        # Drop rows of a batch written after the last checkpoint entry
+        with open(output_path, "r+b") as f:
+            f.truncate(offset)
+        print(f"Resuming: {len(done)} filings already in {output_path}")
+    else:
+        for path in (output_path, checkpoint_path(output_path)):
+            if os.path.exists(path):
+                os.remove(path)
 
-    records = []
-
-    for _, row in df_filings.iterrows():
+    def process_row(row: Dict) -> Dict:
         cik = row["cik"]
         ticker = tickers_map.get(cik, "UNKNOWN")
         filing_url = row["filing_url"]
@@ -206,39 +332,68 @@ def process_filings(df_filings: pd.DataFrame, tickers_map: Dict[str, str],
         record = {
             "cik": cik,
             "ticker": ticker,
-            "year": pd.to_datetime(row["filing_date"]).year,
-            "quarter": quarter if quarter != 0 else "ALL"
+            "year": row["fiscal_year"],
+            "quarter": quarter if quarter != 0 else "ALL",
+            "form": row.get("form"),
+            "accession_number": row["accession_number"]
         }
         for tag in tag_list:
             record[tag] = tag_values.get(tag, None)
-        records.append(record)
-        time.sleep(random.uniform(1, 2.5))
-
-    df_result = pd.DataFrame(records)
-    df_result.to_csv(output_path, index=False)
+        return record
+
+    rows = (row for row in df_filings.to_dict("records")
+            if row["accession_number"] not in done)
+    batch = []
+    for record in iter_concurrently(process_row, rows,
+                                    max_workers=max_workers):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush_batch(batch, columns, output_path, text_store, key)
+            batch = []
+    if batch:
+        flush_batch(batch, columns, output_path, text_store, key)
+
+    if not os.path.exists(output_path):
+        pd.DataFrame(columns=columns).to_csv(output_path, index=False)
     print(f"\nSaved to: {output_path}")
 
+    if parquet_path is not None:
+        # Tags read as text and typed by their declared data_type, a chunk
+        # of the CSV at a time
+        dtypes = {"cik": str, **dict.fromkeys(tag_list, str)}
+        write_parquet_dataset_chunked(
+            lambda: pd.read_csv(output_path, dtype=dtypes,
+                                chunksize=PARQUET_CHUNK_SIZE),
+            parquet_path, tag_types=tag_types(tags_df))
+
 
 if __name__ == "__main__":
-    TICKER_FILE = "../dataset/tickers/tickers_prueba.txt"
-    COMPANY_LIST_FILE = "../dataset/company_list.csv"
-    TAGS_FILE = "../dataset/xbrl_tags.csv"
+    TICKER_FILE = "dataset/tickers/tickers_prueba.txt"
+    COMPANY_LIST_FILE = "dataset/company_list.csv"
+    INDEX_DIR = "dataset/index_json"
+    TAGS_FILE = "dataset/xbrl_tags.csv"
 
     REPORT_TYPE = 1  # 0 = all, 1 = 10-K, 2 = 10-Q
-    YEAR = 2024         # 0 = all years
-    QUARTER = 0      # 0 = all quarters
+    YEAR = 2024         # fiscal year, 0 = all years
+    QUARTER = 0      # fiscal quarter (4 = annual report), 0 = all quarters
 
-    OUTPUT_FILE = (f"../dataset/xbrl_data_{YEAR if YEAR != 0 else 'all'}_"
-                   f"{'10k' if REPORT_TYPE == 1 else '10q' if REPORT_TYPE == 2 
-                   else '10k_10q'}.csv")
+    REPORT_NAME = ('10k' if REPORT_TYPE == 1 else '10q' if REPORT_TYPE == 2
+                   else '10k_10q')
+    OUTPUT_FILE = (f"dataset/xbrl_data_{YEAR if YEAR != 0 else 'all'}_"
+                   f"{REPORT_NAME}.csv")
 
     tickers = read_ticker_list(TICKER_FILE)
     company_df = map_tickers_to_ciks(tickers, COMPANY_LIST_FILE)
     cik_list = company_df["cik"].tolist()
     ticker_map = dict(zip(company_df["cik"], company_df["ticker"]))
 
-    filings = load_filing_datasets(REPORT_TYPE)
-    filtered = filter_filings(filings, cik_list, YEAR, QUARTER)
+    catalog = load_filing_datasets(REPORT_TYPE, INDEX_DIR)
+    filtered = filter_filings(catalog, cik_list, YEAR, QUARTER, REPORT_TYPE)
     tags = pd.read_csv(TAGS_FILE)
 
-    process_filings(filtered, ticker_map, tags, YEAR, QUARTER, OUTPUT_FILE)
+    PARQUET_DIR = "dataset/xbrl_data_parquet"
+    TEXT_BLOCKS_DB = "dataset/xbrl_text_blocks.sqlite"
+    with TextBlockStore(TEXT_BLOCKS_DB) as text_store:
+        process_filings(filtered, ticker_map, tags, YEAR, QUARTER,
+                        OUTPUT_FILE, parquet_path=PARQUET_DIR,
+                        text_store=text_store)
@@ -0,0 +1,188 @@
+"""
+Module: benchmark_catalog
+Description: Build, load and query timings of the filing catalog on a
+synthetic catalog of millions of filings. The filings of
+dataset/index_json/ are replicated under new CIKs up to the requested size;
+each query is timed through the catalog indexes and through the equivalent
+boolean-mask filter over the whole frame, and both results are checked to
+be identical. Before timing, the fiscal periods of a few known filings of
+dataset/index_json/ are checked (52/53-week years ending in September and
+across January 1st), and so is a directory that mixes them with filers
+without recent filings.
+
+Usage (from the repository root):
+    python -m src.benchmark_catalog --rows 2000000
+"""
+
+import os
+import sys
+import json
+import shutil
+import time
+import argparse
+import tempfile
+import pandas as pd
+from typing import Callable, Dict, List, Tuple
+from src.extract_filings import (CATALOG_SOURCE_COLUMNS, collect_filings,
+                                 is_submissions_file)
+from src.filing_catalog import FilingCatalog, catalog_frame
+
+
+# (cik, accession number, fiscal year, fiscal period) of known filings
+KNOWN_PERIODS = [
+    # J&J, fiscalYearEnd "1229": years ending in early January
+    ("0000200406", "0000200406-21-000008", 2020, "FY"),  # 2021-01-03
+    ("0000200406", "0000200406-22-000022", 2021, "FY"),  # 2022-01-02
+    ("0000200406", "0000200406-23-000016", 2022, "FY"),  # 2023-01-01
+    ("0000200406", "0000200406-23-000056", 2023, "Q1"),  # 2023-04-02
+    ("0000200406", "0000200406-24-000013", 2023, "FY"),  # 2023-12-31
+    # Apple, fiscalYearEnd "0927": years ending after the nominal date
+    ("0000320193", "0000320193-23-000106", 2023, "FY"),  # 2023-09-30
+    ("0000320193", "0000320193-24-000006", 2024, "Q1"),  # 2023-12-30
+]
+
+
+def check_known_periods(catalog: FilingCatalog) -> List[str]:
+    """Mismatches between KNOWN_PERIODS and the catalog."""
+    problems = []
+    rows = catalog.df.set_index("accession_number")
+    for cik, accession, fiscal_year, fiscal_period in KNOWN_PERIODS:
+        if accession not in rows.index:
+            problems.append(f"{cik} {accession}: not in the catalog")
+            continue
+        row = rows.loc[accession]
+        found = (row["fiscal_year"], row["fiscal_period"])
+        if found != (fiscal_year, fiscal_period):
+            problems.append(f"{cik} {accession}: {found[0]} {found[1]}, "
+                            f"expected {fiscal_year} {fiscal_period}")
+    return problems
+
+
+# Submissions of filers without recent filings, as found in submissions.zip
+EMPTY_SUBMISSIONS = {
+    "0000000001": {"cik": "0000000001", "filings": {"recent": {
+        "accessionNumber": [], "filingDate": [], "reportDate": [],
+        "form": [], "primaryDocument": []}, "files": []}},
+    "0000000002": {"cik": "0000000002", "filings": {"recent": {}}},
+    "0000000003": {"cik": "0000000003"},
+}
+
+
+def check_empty_submissions(index_json_dir: str) -> List[str]:
+    """
+    Builds the catalog of `index_json_dir` plus EMPTY_SUBMISSIONS; they must
+    add no filing and break nothing.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        for filename in os.listdir(index_json_dir):
+            if is_submissions_file(filename):
+                shutil.copy(os.path.join(index_json_dir, filename), directory)
+        expected = len(FilingCatalog.build(directory))
+        for cik, data in EMPTY_SUBMISSIONS.items():
+            with open(os.path.join(directory, f"{cik}.json"), "w") as f:
+                json.dump(data, f)
+        found = len(FilingCatalog.build(directory))
+    except Exception as e:
+        return [f"{type(e).__name__}: {e}"]
+    finally:
+        shutil.rmtree(directory)
+    if found != expected:
+        return [f"{found} filings, expected {expected}"]
+    return []
+
+
+def synthetic_filings(index_json_dir: str, rows: int) -> pd.DataFrame:
+    """Filings of `index_json_dir` repeated under new CIKs up to `rows`."""
+    base = collect_filings(index_json_dir, None, 1, CATALOG_SOURCE_COLUMNS)
+    copies = -(-rows // len(base))
+    ciks = base["cik"].astype(int)
+    frames = [base.assign(cik=(ciks + copy * 10_000_000).astype(str)
+                          .str.zfill(10))
+              for copy in range(copies)]
+    return pd.concat(frames, ignore_index=True).iloc[:rows]
+
+
+def timed(func: Callable, repeat: int) -> Tuple[float, object]:
+    """Best wall time, in milliseconds, of `func()` and its last result."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Time the filing catalog on synthetic data.")
+    parser.add_argument("--index-dir", default="dataset/index_json")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    problems = check_known_periods(FilingCatalog.build(args.index_dir))
+    for problem in problems:
+        print(f"Wrong fiscal period: {problem}")
+    print(f"Fiscal periods of {len(KNOWN_PERIODS)} known filings: "
+          f"{'FAIL' if problems else 'OK'}")
+    empty_problems = check_empty_submissions(args.index_dir)
+    for problem in empty_problems:
+        print(f"Catalog with empty submissions: {problem}")
+    print(f"Submissions without recent filings: "
+          f"{'FAIL' if empty_problems else 'OK'}")
+    problems += empty_problems
+
+    filings = synthetic_filings(args.index_dir, args.rows)
+    build_ms, catalog = timed(
+        lambda: FilingCatalog(catalog_frame(filings)), 1)
+    path = os.path.join(tempfile.mkdtemp(), "filing_catalog.parquet")
+    save_ms, _ = timed(lambda: catalog.save(path), 1)
+    load_ms, catalog = timed(lambda: FilingCatalog.load(path), 1)
+    print(f"{len(catalog)} filings, {catalog.df['cik'].nunique()} CIKs, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"build {build_ms:.0f} ms, save {save_ms:.0f} ms, "
+          f"load {load_ms:.0f} ms")
+
+    df = catalog.df
+    ciks = catalog.ciks[::max(1, len(catalog.ciks) // 50)][:50]
+    forms = ["10-K", "10-Q"]
+    queries: Dict[str, Tuple[Dict, Callable[[], pd.Series]]] = {
+        "50 CIKs, 10-K/10-Q, 2020-2023": (
+            dict(ciks=ciks, forms=forms, start="2020-01-01",
+                 end="2023-12-31"),
+            lambda: (df["cik"].isin(ciks) & df["form"].isin(forms)
+                     & df["filing_date"].between("2020-01-01",
+                                                 "2023-12-31"))),
+        "one CIK, every filing": (
+            dict(ciks=ciks[0]), lambda: df["cik"] == ciks[0]),
+        "8-K, January 2024": (
+            dict(forms="8-K", start="2024-01-01", end="2024-01-31"),
+            lambda: (df["form"].eq("8-K")
+                     & df["filing_date"].between("2024-01-01",
+                                                 "2024-01-31"))),
+        "50 CIKs, fiscal 2023 FY": (
+            dict(ciks=ciks, fiscal_year=2023, fiscal_period="FY"),
+            lambda: (df["cik"].isin(ciks) & df["fiscal_year"].eq(2023)
+                     & df["fiscal_period"].eq("FY"))),
+    }
+
+    failed = bool(problems)
+    for name, (filters, mask) in queries.items():
+        # The first call also builds the date index when it is needed
+        catalog.query(**filters)
+        catalog_ms, result = timed(lambda: catalog.query(**filters),
+                                   args.repeat)
+        scan_ms, expected = timed(lambda: df[mask().fillna(False)],
+                                  args.repeat)
+        same = result.equals(expected.reset_index(drop=True))
+        failed |= not same
+        print(f"{name:>32}: {len(result):6d} rows  catalog "
+              f"{catalog_ms:7.2f} ms  full scan {scan_ms:8.2f} ms"
+              f"{'' if same else '  MISMATCH'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
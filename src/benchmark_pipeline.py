@@ -0,0 +1,522 @@
+"""
+Module: benchmark_pipeline
+Description: End-to-end throughput benchmark against a local stand-in for
+the SEC servers, so no run touches the live endpoints. The stand-in runs in
+its own process and serves synthetic fixtures scaled from the local
+dataset: every synthetic CIK gets a submissions document cloned from one of
+dataset/index_json/*.json (with its own CIK and document names), and every
+*_htm.xml under /Archives is one of dataset/xml_reports/*.xml with its
+report date moved to the requested one, so the extractor finds facts.
+Latency, 404s, 429s and 5xx responses can be injected.
+
+The real pipeline code is then run against it, stage by stage:
+download_index_json, extract_filings, download_xml_reports and the XBRL
+extractor, and requests/s, MB/s on the wire, facts/s and peak RSS are
+reported. --save writes the results as JSON and --compare fails (exit
+status 1) when a stage is slower than a saved baseline by more than the
+tolerance, so it can run before a deployment.
+
+Usage (from the repository root):
+    python -m src.benchmark_pipeline --companies 1000 --xml-files 200
+    python -m src.benchmark_pipeline --latency-ms 40 --throttle-rate 0.02 \\
+        --error-rate 0.01 --not-found-rate 0.05
+    python -m src.benchmark_pipeline --save bench.json
+    python -m src.benchmark_pipeline --compare bench.json --tolerance 0.2
+"""
+
+import io
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import zlib
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+INDEX_JSON_DIR = "dataset/index_json"
+XML_REPORTS_DIR = "dataset/xml_reports"
+TAGS_FILE = "dataset/xbrl_tags.csv"
+
+# Synthetic CIKs start here, away from the real ones
+SYNTHETIC_CIK_BASE = 1900000000
+
+STATS_PATH = "/_stats"
+
+# Throughput metrics compared with --compare (higher is better)
+COMPARED_METRICS = ["requests_per_second", "rows_per_second",
+                    "facts_per_second"]
+
+
+# --- stand-in server --------------------------------------------------------
+
+class FixtureSet:
+    """
+    Fixture templates and the rules that turn them into synthetic
+    documents.
+
+    Args:
+        index_json_dir (str): Directory with real submissions documents.
+        xml_dir (str): Directory with real XBRL instances
+        (name-YYYYMMDD_htm.xml).
+    """
+
+    def __init__(self, index_json_dir: str, xml_dir: str):
+        self.submissions = []
+        for path in sorted(glob.glob(os.path.join(index_json_dir,
+                                                  "[0-9]*.json"))):
+            with open(path, "r", encoding="utf-8") as f:
+                self.submissions.append(json.load(f))
+        self.instances = []
+        for path in sorted(glob.glob(os.path.join(xml_dir, "*.xml"))):
+            with open(path, "rb") as f:
+                self.instances.append((report_date(path), f.read()))
+        if not self.submissions or not self.instances:
+            raise ValueError(f"No fixtures in {index_json_dir} / {xml_dir}")
+        self._dated: Dict[Tuple[int, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def submissions_document(self, cik: str) -> bytes:
+        """Submissions JSON of a synthetic CIK (10 digits)."""
+        number = int(cik)
+        template = self.submissions[number % len(self.submissions)]
+        recent = template["filings"]["recent"]
+        prefix = f"c{number}"
+        document = dict(template,
+                        cik=str(number),
+                        name=f"Synthetic Company {number}",
+                        tickers=[f"S{number}"])
+        # Unique document names per CIK, so the XML downloads of different
+        # companies never collide; the date stays after the last "-".
+        document["filings"] = {
+            "recent": dict(recent, primaryDocument=[
+                prefix + name for name in recent["primaryDocument"]]),
+            "files": []
+        }
+        return json.dumps(document).encode("utf-8")
+
+    def instance_document(self, name: str) -> bytes:
+        """
+        XBRL instance for a requested file name. The template is chosen by
+        name and its report date replaced by the one in the name.
+        """
+        index = zlib.crc32(name.encode("utf-8")) % len(self.instances)
+        date = report_date(name)
+        key = (index, date)
+        with self._lock:
+            body = self._dated.get(key)
+        if body is None:
+            template_date, body = self.instances[index]
+            if len(date) == 8 and date.isdigit():
+                body = body.replace(iso_date(template_date).encode(),
+                                    iso_date(date).encode())
+            with self._lock:
+                self._dated[key] = body
+        return body
+
+
+def report_date(name: str) -> str:
+    """YYYYMMDD of a name like aapl-20230930_htm.xml (as the extractor)."""
+    return os.path.basename(name).split("-")[-1].split("_")[0]
+
+
+def iso_date(date: str) -> str:
+    return f"{date[:4]}-{date[4:6]}-{date[6:8]}"
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP/1.1 server with fault injection and request counters.
+
+    Args:
+        fixtures (FixtureSet): Documents to serve.
+        latency_ms (float): Added delay before every response.
+        jitter_ms (float): Uniform random extra delay (0..jitter_ms).
+        not_found_rate (float): Share of URLs that always answer 404
+        (chosen by URL, so retries see the same answer).
+        throttle_rate (float): Probability of a 429 response.
+        error_rate (float): Probability of a 500/502/503 response.
+        retry_after (str): Retry-After header of the 429 and 5xx responses
+        ("" to send none and let the client back off on its own).
+        seed (int): Seed of the fault injection.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], fixtures: FixtureSet,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 not_found_rate: float = 0.0, throttle_rate: float = 0.0,
+                 error_rate: float = 0.0, retry_after: str = "0",
+                 seed: int = 0):
+        super().__init__(address, StandInHandler)
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.not_found_rate = not_found_rate
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "bytes": 0, "status": {}}
+        self.stats_lock = threading.Lock()
+
+    def draw_fault(self, path: str) -> Optional[int]:
+        """Status code to answer instead of the document, if any."""
+        bucket = zlib.crc32(path.encode("utf-8")) % 10000
+        if bucket < self.not_found_rate * 10000:
+            return 404
+        with self.stats_lock:
+            draw = self.random.random()
+            status = self.random.choice([500, 502, 503])
+        if draw < self.throttle_rate:
+            return 429
+        if draw < self.throttle_rate + self.error_rate:
+            return status
+        return None
+
+    def record(self, status: int, size: int) -> None:
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += size
+            key = str(status)
+            self.stats["status"][key] = self.stats["status"].get(key, 0) + 1
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StandInServer
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0]
+        if path == STATS_PATH:
+            with self.server.stats_lock:
+                body = json.dumps(self.server.stats).encode("utf-8")
+            self._send(200, body, record=False)
+            return
+
+        delay = self.server.latency_ms + random.uniform(
+            0, self.server.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        status = self.server.draw_fault(path)
+        if status is not None:
+            headers = {}
+            if status != 404 and self.server.retry_after != "":
+                headers["Retry-After"] = self.server.retry_after
+            self._send(status, b"", headers)
+            return
+
+        body = self._document(path)
+        if body is None:
+            self._send(404, b"")
+            return
+        headers = {}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, body, headers)
+
+    def _document(self, path: str) -> Optional[bytes]:
+        name = path.rsplit("/", 1)[-1]
+        if path.startswith("/submissions/CIK") and name.endswith(".json"):
+            cik = name[3:-5]
+            if len(cik) == 10 and cik.isdigit():
+                return self.server.fixtures.submissions_document(cik)
+        elif path.startswith("/Archives/edgar/data/") \
+                and name.endswith("_htm.xml"):
+            return self.server.fixtures.instance_document(name)
+        return None
+
+    def _send(self, status: int, body: bytes,
+              headers: Optional[Dict[str, str]] = None,
+              record: bool = True) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if record:
+            self.server.record(status, len(body))
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def _serve(config: Dict, ports: "multiprocessing.Queue") -> None:
+    fixtures = FixtureSet(config.pop("index_json_dir"),
+                          config.pop("xml_dir"))
+    server = StandInServer(("127.0.0.1", 0), fixtures, **config)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def start_server(config: Dict) -> Tuple[multiprocessing.Process, str]:
+    """
+    Starts the stand-in in a separate process, so that its CPU and memory
+    are not charged to the pipeline being measured.
+
+    Returns:
+        Tuple[Process, str]: The server process and its base URL.
+    """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(config, ports),
+                                      daemon=True)
+    process.start()
+    port = ports.get(timeout=60)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def server_stats(base_url: str) -> Dict:
+    # urllib rather than the pipeline session, which is being measured
+    with urllib.request.urlopen(base_url + STATS_PATH) as response:
+        return json.load(response)
+
+
+# --- stages -----------------------------------------------------------------
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Peak resident set size in MB (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def run_stage(name: str, func: Callable[[], Dict], base_url: str,
+              verbose: bool = False) -> Dict:
+    """
+    Runs one stage and measures it: wall time, requests and bytes served
+    during the stage, and the peak RSS of this process and of the worker
+    processes reaped so far.
+    """
+    before = server_stats(base_url)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose
+                                    else io.StringIO()):
+        result = func()
+    seconds = time.perf_counter() - start
+    after = server_stats(base_url)
+
+    requests = after["requests"] - before["requests"]
+    status = {code: count - before["status"].get(code, 0)
+              for code, count in after["status"].items()
+              if count != before["status"].get(code, 0)}
+    result = dict(result, stage=name, seconds=round(seconds, 3))
+    if requests:
+        result.update(
+            requests=requests, status=status,
+            requests_per_second=round(requests / seconds, 1),
+            mb_per_second=round((after["bytes"] - before["bytes"])
+                                / 1e6 / seconds, 2))
+    if "rows" in result:
+        result["rows_per_second"] = round(result["rows"] / seconds, 1)
+    if "facts" in result:
+        result["facts_per_second"] = round(result["facts"] / seconds, 1)
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    result["peak_rss_children_mb"] = round(
+        peak_rss_mb(resource.RUSAGE_CHILDREN), 1)
+    return result
+
+
+def run_benchmark(args: argparse.Namespace, base_url: str,
+                  work_dir: str) -> List[Dict]:
+    import pandas as pd
+    import src.download_index_json as download_index_json
+    from src.downloader import set_rate_limit
+    from src.download_xbrl_data import load_tag_list, process_all_xml
+    from src.download_xml_reports import download_xml_reports
+    from src.extract_filings import ARCHIVES_BASE_URL, extract_all_filings
+
+    index_dir = os.path.join(work_dir, "index_json")
+    xml_dir = os.path.join(work_dir, "xml_reports")
+    company_list = os.path.join(work_dir, "company_list.csv")
+    ciks = [str(SYNTHETIC_CIK_BASE + i).zfill(10)
+            for i in range(args.companies)]
+    pd.DataFrame({"cik": ciks,
+                  "ticker": [f"S{int(cik)}" for cik in ciks],
+                  "title": [f"Synthetic Company {int(cik)}" for cik in ciks]}
+                 ).to_csv(company_list, index=False)
+
+    set_rate_limit(args.rate)
+    download_index_json.SUBMISSIONS_BASE_URL = base_url + "/submissions"
+    results = []
+
+    def index_stage() -> Dict:
+        download_index_json.download_all_index_files(
+            company_list, index_dir, max_workers=args.workers,
+            confirm=False, include_history=False)
+        files = [f for f in os.listdir(index_dir) if f.endswith(".json")]
+        return {"documents": len(files)}
+    results.append(run_stage("index", index_stage, base_url, args.verbose))
+
+    filings: Dict[str, pd.DataFrame] = {}
+
+    def filings_stage() -> Dict:
+        filings.update(extract_all_filings(index_dir, args.forms,
+                                           max_workers=args.processes))
+        return {"rows": sum(len(df) for df in filings.values())}
+    results.append(run_stage("filings", filings_stage, base_url,
+                             args.verbose))
+
+    # Latest filing of each company (date-named documents with XBRL), up to
+    # --xml-files, pointed at the stand-in
+    selected = (filings[args.forms[0]].drop_duplicates("cik")
+                .head(args.xml_files).copy())
+    selected["filing_url"] = selected["filing_url"].str.replace(
+        ARCHIVES_BASE_URL, base_url + "/Archives/edgar/data", regex=False)
+
+    def xml_stage() -> Dict:
+        download_xml_reports(selected, xml_dir, max_workers=args.workers)
+        return {"documents": len(os.listdir(xml_dir))}
+    results.append(run_stage("xml", xml_stage, base_url, args.verbose))
+
+    tag_list = load_tag_list(args.tags_file)
+
+    def extract_stage() -> Dict:
+        df = process_all_xml(xml_dir, tag_list, max_workers=args.processes)
+        values = df.drop(columns=["filename", "accession_number"],
+                         errors="ignore")
+        size = sum(os.path.getsize(os.path.join(xml_dir, f))
+                   for f in os.listdir(xml_dir))
+        return {"rows": len(df), "facts": int(values.notna().sum().sum()),
+                "mb": round(size / 1e6, 1)}
+    results.append(run_stage("extract", extract_stage, base_url,
+                             args.verbose))
+    return results
+
+
+# --- report -----------------------------------------------------------------
+
+def print_results(results: List[Dict]) -> None:
+    for result in results:
+        parts = [f"{result['seconds']:8.2f} s"]
+        if "requests" in result:
+            errors = {code: count for code, count in result["status"].items()
+                      if code != "200"}
+            parts.append(f"{result['requests']} requests "
+                         f"({result['requests_per_second']}/s, "
+                         f"{result['mb_per_second']} MB/s)")
+            if errors:
+                parts.append("errors " + ", ".join(
+                    f"{code}x{count}" for code, count in sorted(
+                        errors.items())))
+        if "documents" in result:
+            parts.append(f"{result['documents']} documents")
+        if "rows" in result:
+            parts.append(f"{result['rows']} rows "
+                         f"({result['rows_per_second']}/s)")
+        if "facts" in result:
+            parts.append(f"{result['facts']} facts "
+                         f"({result['facts_per_second']}/s)")
+        parts.append(f"peak RSS {result['peak_rss_mb']} MB "
+                     f"(workers {result['peak_rss_children_mb']} MB)")
+        print(f"{result['stage']:>8}: " + " — ".join(parts))
+
+
+def compare(results: List[Dict], baseline: List[Dict],
+            tolerance: float) -> List[str]:
+    """
+    Throughput metrics that fell more than `tolerance` (a fraction) below
+    the baseline.
+    """
+    previous = {result["stage"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result["stage"], {})
+        for metric in COMPARED_METRICS:
+            if metric in result and old.get(metric):
+                if result[metric] < old[metric] * (1 - tolerance):
+                    regressions.append(
+                        f"{result['stage']} {metric}: {result[metric]} "
+                        f"(baseline {old[metric]})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline against a local SEC stand-in.")
+    parser.add_argument("--companies", type=int, default=1000,
+                        help="Synthetic CIKs to serve and download")
+    parser.add_argument("--xml-files", type=int, default=200,
+                        help="XBRL instances to download and extract")
+    parser.add_argument("--forms", nargs="+", default=["10-K", "10-Q"],
+                        help="Forms to extract; XML is fetched for the first")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Download threads")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Worker processes of the extractors "
+                             "(default: every core)")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="Client requests/second ceiling")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--not-found-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", default="0",
+                        help="Retry-After of injected 429/5xx ('' = none)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index-json-dir", default=INDEX_JSON_DIR)
+    parser.add_argument("--xml-dir", default=XML_REPORTS_DIR)
+    parser.add_argument("--tags-file", default=TAGS_FILE)
+    parser.add_argument("--work-dir", default=None,
+                        help="Keep the downloaded files here "
+                             "(default: a temporary directory)")
+    parser.add_argument("--save", default=None,
+                        help="Write the results to this JSON file")
+    parser.add_argument("--metrics", default=None,
+                        help="Also write the client-side metrics summary "
+                             "(latency per host, retries, queue depths)")
+    parser.add_argument("--compare", default=None,
+                        help="Baseline JSON written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed throughput drop against the baseline")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Show the output of the pipeline stages")
+    args = parser.parse_args()
+
+    process, base_url = start_server({
+        "index_json_dir": args.index_json_dir, "xml_dir": args.xml_dir,
+        "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+        "not_found_rate": args.not_found_rate,
+        "throttle_rate": args.throttle_rate, "error_rate": args.error_rate,
+        "retry_after": args.retry_after, "seed": args.seed})
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="sec_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        results = run_benchmark(args, base_url, work_dir)
+    finally:
+        process.terminate()
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    if args.metrics:
+        from src.metrics import write_json_summary
+        write_json_summary(args.metrics)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print("FAIL" if regressions else
+              f"OK (within {args.tolerance:.0%} of {args.compare})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
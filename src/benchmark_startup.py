@@ -0,0 +1,94 @@
+"""
+Module: benchmark_startup
+Description: Start-up budget check for the command-line entry points. Each
+cheap command is launched in fresh interpreters and its best wall time is
+compared with the budget; the modules loaded by the `--help` and `check`
+paths are also checked so that no heavy dependency (pandas, requests,
+lxml, pyarrow) creeps back into them. Exits with status 1 when a command
+is over budget or imports a heavy module, so it can run in CI or cron.
+
+Usage (from the repository root):
+    python -m src.benchmark_startup --budget-ms 100 --repeat 10
+"""
+
+import sys
+import time
+import argparse
+import subprocess
+from typing import Dict, List
+
+HEAVY_MODULES = ["pandas", "numpy", "requests", "lxml", "pyarrow"]
+
+# name -> interpreter arguments. "check" only imports the code path of the
+# connection check; the request itself is network time, not start-up.
+COMMANDS = {
+    "interpreter": ["-c", "pass"],
+    "cli --help": ["-m", "src.cli", "--help"],
+    "cli search --help": ["-m", "src.cli", "search", "--help"],
+    "main_scraper --help": ["main_scraper.py", "--help"],
+    "check (imports)": ["-c", "import src.cli, src.connection"],
+}
+
+# Code paths whose imports must stay light
+IMPORT_PROBES = {
+    "cli": "import src.cli",
+    "check": "import src.cli, src.connection",
+    "main_scraper": "import main_scraper",
+}
+
+
+def best_wall_time(args: List[str], repeat: int) -> float:
+    """Best wall time, in seconds, of `python <args>` over `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True,
+                       stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def heavy_imports(statement: str) -> List[str]:
+    """Heavy modules loaded by running `statement` in a fresh interpreter."""
+    probe = (f"{statement}\nimport sys\n"
+             f"print(','.join(m for m in {HEAVY_MODULES!r} "
+             f"if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", probe], check=True,
+                            capture_output=True, text=True).stdout
+    loaded = output.strip().splitlines()[-1] if output.strip() else ""
+    return [module for module in loaded.split(",") if module]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Check the start-up time of the CLI entry points.")
+    parser.add_argument("--budget-ms", type=float, default=100.0,
+                        help="Maximum wall time per command")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="Runs per command (the best one counts)")
+    args = parser.parse_args()
+
+    failed = False
+    timings: Dict[str, float] = {}
+    for name, command in COMMANDS.items():
+        timings[name] = best_wall_time(command, args.repeat) * 1000
+    baseline = timings["interpreter"]
+    for name, ms in timings.items():
+        over = name != "interpreter" and ms > args.budget_ms
+        failed |= over
+        print(f"{name:>22}: {ms:6.1f} ms ({ms - baseline:+6.1f} ms vs the "
+              f"bare interpreter){'  OVER BUDGET' if over else ''}")
+
+    for name, statement in IMPORT_PROBES.items():
+        loaded = heavy_imports(statement)
+        if loaded:
+            failed = True
+            print(f"{name}: imports heavy modules at start-up: "
+                  f"{', '.join(loaded)}")
+
+    print("FAIL" if failed else f"OK (budget {args.budget_ms:.0f} ms)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
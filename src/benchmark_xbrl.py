@@ -0,0 +1,163 @@
+"""
+Module: benchmark_xbrl
+Description: Measures XBRL extraction throughput and peak memory over a
+directory of instances, comparing the tree-based parser (ET.parse) with the
+streaming one (lxml.iterparse). Each mode runs in its own subprocess so the
+peak RSS reported belongs to that mode only. The --micro option times the
+per-element tag/context lookup alone: list scans versus hash lookups.
+
+Usage (from the repository root):
+    python -m src.benchmark_xbrl --xml-dir dataset/xml_reports --repeat 5
+    python -m src.benchmark_xbrl --micro --tags-file dataset/xbrl_tags.csv
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from typing import Dict, List
+
+MODES = ["tree", "streaming"]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MB."""
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def list_xml_files(xml_dir: str) -> List[str]:
+    return sorted(os.path.join(xml_dir, f) for f in os.listdir(xml_dir)
+                  if f.endswith(".xml"))
+
+
+def run_mode(mode: str, xml_dir: str, tags_file: str,
+             repeat: int) -> Dict[str, float]:
+    """Runs one extraction mode in-process and returns its measurements."""
+    from src.download_xbrl_data import (load_tag_list, extract_from_xml,
+                                        extract_from_xml_streaming)
+
+    extract = extract_from_xml_streaming if mode == "streaming" \
+        else extract_from_xml
+    tag_list = load_tag_list(tags_file)
+    paths = list_xml_files(xml_dir)
+    total_bytes = sum(os.path.getsize(p) for p in paths) * repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            extract(path, tag_list)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "files": len(paths) * repeat,
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(len(paths) * repeat / elapsed, 2),
+        "mb_per_second": round(total_bytes / 1e6 / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def run_lookup_micro(xml_dir: str, tags_file: str,
+                     repeat: int) -> Dict[str, float]:
+    """
+    Times the per-element lookup of the fact loop over every element of the
+    instances in `xml_dir`, with the legacy list membership tests and with
+    the TagIndex/frozenset lookups.
+
+    Returns:
+        Dict[str, float]: Nanoseconds per element for each variant.
+    """
+    import xml.etree.ElementTree as ET
+    from src.xbrl_parser import TagIndex
+    from src.download_xbrl_data import (load_tag_list,
+                                        extract_relevant_contexts,
+                                        report_date_from_filename)
+
+    tag_list = load_tag_list(tags_file)
+    elements = []
+    context_list = []
+    for path in list_xml_files(xml_dir):
+        root = ET.parse(path).getroot()
+        contexts = extract_relevant_contexts(root,
+                                             report_date_from_filename(path))
+        context_list.extend(contexts)
+        elements.extend((elem.tag, elem.attrib.get("contextRef", ""))
+                        for elem in root.iter())
+    context_set = frozenset(context_list)
+
+    def legacy() -> int:
+        hits = 0
+        for qname, context in elements:
+            tag = qname.split("}")[-1].strip().lower()
+            if tag in tag_list and context in context_list:
+                hits += 1
+        return hits
+
+    def hashed() -> int:
+        hits = 0
+        tag_index = TagIndex(tag_list)
+        for qname, context in elements:
+            if context in context_set and tag_index.resolve(qname):
+                hits += 1
+        return hits
+
+    assert legacy() == hashed()
+    timings = {"elements": len(elements)}
+    for name, func in (("list_ns_per_element", legacy),
+                       ("hash_ns_per_element", hashed)):
+        best = min(_timed(func) for _ in range(repeat))
+        timings[name] = round(best * 1e9 / len(elements), 1)
+    return timings
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark XBRL extraction throughput and memory.")
+    parser.add_argument("--xml-dir", default="dataset/xml_reports")
+    parser.add_argument("--tags-file", default="dataset/xbrl_tags_sample.csv")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Passes over the directory")
+    parser.add_argument("--mode", choices=MODES,
+                        help="Run a single mode in this process")
+    parser.add_argument("--micro", action="store_true",
+                        help="Only time the tag/context lookups")
+    args = parser.parse_args()
+
+    if args.micro:
+        timings = run_lookup_micro(args.xml_dir, args.tags_file, args.repeat)
+        print(f"{timings['elements']} elements — list lookup "
+              f"{timings['list_ns_per_element']} ns/element, hash lookup "
+              f"{timings['hash_ns_per_element']} ns/element")
+        return
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.xml_dir, args.tags_file,
+                                  args.repeat)))
+        return
+
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "src.benchmark_xbrl", "--mode", mode,
+             "--xml-dir", args.xml_dir, "--tags-file", args.tags_file,
+             "--repeat", str(args.repeat)],
+            check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['mode']:>10}: {result['files']} files in "
+              f"{result['seconds']} s — {result['files_per_second']} files/s, "
+              f"{result['mb_per_second']} MB/s, "
+              f"peak RSS {result['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
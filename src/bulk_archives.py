@@ -0,0 +1,277 @@
+"""
+Module: bulk_archives
+Description: Ingestion from the SEC nightly bulk archives instead of one
+request per company. `submissions.zip` holds the submissions JSON of every
+filer (CIK##########.json plus its CIK##########-submissions-###.json
+history pages) and `companyfacts.zip` the XBRL facts of every filer
+(CIK##########.json). The archives are memory-mapped and their members are
+decompressed straight into the JSON parser, never extracted to disk; the
+members are split across a process pool, each worker mapping the archive
+itself. Submissions feed `extract_filings.filings_frame` and company facts
+feed the FactStore.
+
+    https://www.sec.gov/Archives/edgar/daily-index/bulkdata/submissions.zip
+    https://www.sec.gov/Archives/edgar/daily-index/xbrl/companyfacts.zip
+"""
+
+import os
+import re
+import json
+import mmap
+import zipfile
+import pandas as pd
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import (Callable, Dict, Iterable, Iterator, List, Optional,
+                    Set, Tuple)
+from src.extract_filings import (DEFAULT_FORMS, FILING_COLUMNS,
+                                 filings_frame, partition_by_form)
+from src.fact_store import FactStore
+from src.xbrl_parser import Fact
+
+SUBMISSIONS_ARCHIVE_URL = ("https://www.sec.gov/Archives/edgar/daily-index/"
+                           "bulkdata/submissions.zip")
+COMPANYFACTS_ARCHIVE_URL = ("https://www.sec.gov/Archives/edgar/daily-index/"
+                            "xbrl/companyfacts.zip")
+
+# Main member of a filer in either archive: CIK0000320193.json
+MAIN_MEMBER_PATTERN = re.compile(r"^CIK(\d{10})\.json$")
+
+MEMBERS_PER_TASK = 64
+
+# Per-process state of the pool workers: the archive is opened (and
+# mapped) once per worker, not once per task.
+_archive: Optional[zipfile.ZipFile] = None
+_archive_path: Optional[str] = None
+
+
+class _MappedFile(mmap.mmap):
+    """Memory map usable as a ZipFile source (mmap has no seekable()
+    before Python 3.13)."""
+
+    def seekable(self) -> bool:
+        return True
+
+
+def open_archive(path: str) -> zipfile.ZipFile:
+    """
+    Opens a ZIP archive through a read-only memory map: members are read
+    from the page cache without copying the archive into the process.
+    """
+    with open(path, "rb") as f:
+        # The mapping keeps its own reference to the file
+        mapped = _MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return zipfile.ZipFile(mapped)
+
+
+def _worker_archive(path: str) -> zipfile.ZipFile:
+    global _archive, _archive_path
+    if _archive is None or _archive_path != path:
+        _archive = open_archive(path)
+        _archive_path = path
+    return _archive
+
+
+def _read_json(archive: zipfile.ZipFile, name: str) -> Optional[Dict]:
+    """Parses a member while it is decompressed; None if it is missing."""
+    try:
+        member = archive.open(name)
+    except KeyError:
+        return None
+    with member:
+        return json.load(member)
+
+
+def main_members(archive_path: str,
+                 ciks: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Names of the per-filer main members of an archive, optionally limited
+    to some CIKs.
+    """
+    wanted = None if ciks is None else {str(cik).zfill(10) for cik in ciks}
+    # Only the central directory is read here; no need for the mapping
+    with zipfile.ZipFile(archive_path) as archive:
+        names = archive.namelist()
+    members = []
+    for name in names:
+        match = MAIN_MEMBER_PATTERN.match(name)
+        if match and (wanted is None or match.group(1) in wanted):
+            members.append(name)
+    return sorted(members)
+
+
+def _bounded_map(executor: Optional[Executor], func: Callable,
+                 tasks: List, window: int) -> Iterator:
+    """
+    Ordered map keeping at most `window` tasks in flight, so the parent
+    consumes results as fast as they are produced without piling them up.
+    Runs in this process when `executor` is None.
+    """
+    if executor is None:
+        yield from map(func, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(func, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# --- submissions.zip --------------------------------------------------------
+
+def _submissions_task(task: Tuple[str, List[str], Tuple[str, ...]]
+                      ) -> pd.DataFrame:
+    archive_path, members, forms = task
+    archive = _worker_archive(archive_path)
+    frames = []
+    for name in members:
+        data = _read_json(archive, name)
+        pages = [_read_json(archive, page["name"])
+                 for page in data.get("filings", {}).get("files", [])]
+        frames.append(filings_frame(data, forms,
+                                    [page for page in pages if page]))
+    if not frames:
+        return pd.DataFrame(columns=FILING_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def extract_filings_from_archive(archive_path: str,
+                                 forms: Iterable[str] = DEFAULT_FORMS,
+                                 ciks: Optional[Iterable[str]] = None,
+                                 max_workers: Optional[int] = None
+                                 ) -> Dict[str, pd.DataFrame]:
+    """
+    Same output as `extract_filings.extract_all_filings`, read from a local
+    submissions.zip instead of dataset/index_json/.
+
+    Args:
+        archive_path (str): Path to submissions.zip.
+        forms (Iterable[str]): Form types to extract.
+        ciks (Iterable[str]): Only these filers (all by default).
+        max_workers (int): Worker processes (None = every core, 1 = run in
+        this process).
+
+    Returns:
+        Dict[str, pd.DataFrame]: One DataFrame of filings per form type.
+    """
+    forms = tuple(dict.fromkeys(forms))
+    members = main_members(archive_path, ciks)
+    print(f"Reading {len(members)} filers from {archive_path}")
+
+    tasks = [(archive_path, chunk, forms)
+             for chunk in _chunks(members, MEMBERS_PER_TASK)]
+    if max_workers == 1 or len(tasks) < 2:
+        per_chunk = [_submissions_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            per_chunk = list(executor.map(_submissions_task, tasks))
+
+    if not per_chunk:
+        return partition_by_form(pd.DataFrame(columns=FILING_COLUMNS), forms)
+    return partition_by_form(pd.concat(per_chunk, ignore_index=True), forms)
+
+
+# --- companyfacts.zip -------------------------------------------------------
+
+def company_facts(data: Dict,
+                  concepts: Optional[Set[str]] = None
+                  ) -> Dict[str, List[Fact]]:
+    """
+    Converts a companyfacts document to Facts grouped by accession number.
+
+    Company facts are entity-wide (no dimensions) and carry no decimals.
+    Units keep the SEC labels ("USD", "USD/shares", "shares"). Concepts are
+    stored by local name, as the XBRL parser does.
+
+    Args:
+        data (Dict): Parsed CIK##########.json member.
+        concepts (Set[str]): Lowercase local names to keep (all by default).
+    """
+    cik = str(data.get("cik", "")).zfill(10)
+    by_accession: Dict[str, List[Fact]] = {}
+    for taxonomy in data.get("facts", {}).values():
+        for concept, detail in taxonomy.items():
+            if concepts is not None and concept.lower() not in concepts:
+                continue
+            for unit, values in detail.get("units", {}).items():
+                for value in values:
+                    start = value.get("start")
+                    by_accession.setdefault(value.get("accn", ""), []).append(
+                        Fact(cik=cik, concept=concept,
+                             period_start=start,
+                             period_end=value.get("end") if start else None,
+                             instant=None if start else value.get("end"),
+                             unit=unit, decimals=None, dimensions="",
+                             value=str(value.get("val"))))
+    return by_accession
+
+
+def _companyfacts_task(task: Tuple[str, List[str], Optional[Set[str]]]
+                       ) -> List[Dict[str, List[Fact]]]:
+    archive_path, members, concepts = task
+    archive = _worker_archive(archive_path)
+    return [company_facts(_read_json(archive, name), concepts)
+            for name in members]
+
+
+def ingest_companyfacts(archive_path: str, store: FactStore,
+                        ciks: Optional[Iterable[str]] = None,
+                        concepts: Optional[Iterable[str]] = None,
+                        skip_existing: bool = True,
+                        max_workers: Optional[int] = None) -> int:
+    """
+    Loads the facts of a local companyfacts.zip into a FactStore.
+
+    Members are parsed in a process pool; rows are written by this process
+    only, one transaction per accession. An accession filed jointly by
+    several registrants keeps the facts of all of them.
+
+    Args:
+        archive_path (str): Path to companyfacts.zip.
+        store (FactStore): Destination store.
+        ciks (Iterable[str]): Only these filers (all by default).
+        concepts (Iterable[str]): Only these concepts, case-insensitive
+        (all by default).
+        skip_existing (bool): Leave accessions already in the store alone;
+        facts parsed from the full instance (with dimensions and decimals)
+        are richer than the company facts summary.
+        max_workers (int): Worker processes (None = every core, 1 = run in
+        this process).
+
+    Returns:
+        int: Number of facts inserted.
+    """
+    concept_set = {c.lower() for c in concepts} if concepts else None
+    members = main_members(archive_path, ciks)
+    existing = store.accessions() if skip_existing else set()
+    print(f"Reading {len(members)} filers from {archive_path}")
+
+    total = 0
+    inserted: Set[str] = set()
+    tasks = [(archive_path, chunk, concept_set)
+             for chunk in _chunks(members, MEMBERS_PER_TASK)]
+    executor = None
+    if max_workers != 1 and len(tasks) > 1:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        window = 2 * (max_workers or os.cpu_count() or 1)
+        for filers in _bounded_map(executor, _companyfacts_task, tasks,
+                                   window):
+            for by_accession in filers:
+                for accession, facts in by_accession.items():
+                    if accession in existing:
+                        continue
+                    total += store.insert_facts(
+                        accession, facts, replace=accession not in inserted)
+                    inserted.add(accession)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print(f"Stored {total} facts from {archive_path}")
+    return total
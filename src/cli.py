@@ -0,0 +1,358 @@
+"""
+Module: cli
+Description: Single command-line entry point for the scraper stages. Only
+the standard library is imported at startup; each subcommand imports what
+it needs (pandas, requests, lxml...) when it runs, so `--help`, `check`
+and other cheap commands start almost as fast as the interpreter itself.
+Keep it that way: no pipeline module may be imported at module level here.
+
+Usage (from the repository root):
+    python -m src.cli check
+    python -m src.cli companies
+    python -m src.cli search micro
+    python -m src.cli index --incremental
+    python -m src.cli filings --forms 10-K 10-Q
+    python -m src.cli bulk --submissions dataset/submissions.zip
+    python -m src.cli catalog --tickers AAPL --forms 10-K --start 2020-01-01
+    python -m src.cli extract
+    python -m src.cli run --tickers AAPL,MSFT --year 2024
+    python -m src.cli status
+"""
+
+import os
+import sys
+import argparse
+from typing import List, Optional
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "dataset")
+
+
+def dataset_path(name: str) -> str:
+    return os.path.normpath(os.path.join(DATASET_DIR, name))
+
+
+def cmd_check(args: argparse.Namespace) -> int:
+    from src.connection import validate_connection
+    return 0 if validate_connection() else 1
+
+
+def cmd_companies(args: argparse.Namespace) -> int:
+    from src.download_company_list import download_company_tickers
+    from src.get_company_list import load_company_list
+
+    if args.download or not os.path.exists(args.tickers_json):
+        download_company_tickers(args.tickers_json)
+    df = load_company_list(args.tickers_json)
+    df.to_csv(args.output, index=False)
+    print(f"Company list saved to: {args.output} ({len(df)} companies)")
+    return 0
+
+
+def cmd_search(args: argparse.Namespace) -> int:
+    from src.company_registry import get_registry
+
+    matches = get_registry(args.tickers_json).search(args.prefix,
+                                                     limit=args.limit)
+    for cik, ticker, title in matches[["cik", "ticker", "title"]].itertuples(
+            index=False):
+        print(f"{cik}  {ticker:<8} {title}")
+    return 0 if len(matches) else 1
+
+
+def cmd_index(args: argparse.Namespace) -> int:
+    from src.downloader import set_rate_limit
+    from src.download_index_json import download_all_index_files
+
+    set_rate_limit(args.rate)
+    download_all_index_files(args.company_list, args.output_dir,
+                             max_workers=args.workers,
+                             incremental=args.incremental, confirm=False,
+                             include_history=not args.no_history)
+    return 0
+
+
+def cmd_filings(args: argparse.Namespace) -> int:
+    from src.extract_filings import extract_all_filings, save_filings
+
+    save_filings(extract_all_filings(args.index_dir, args.forms),
+                 args.output_dir)
+    return 0
+
+
+def cmd_bulk(args: argparse.Namespace) -> int:
+    from src.bulk_archives import (extract_filings_from_archive,
+                                   ingest_companyfacts)
+    from src.extract_filings import save_filings
+    from src.fact_store import FactStore
+
+    if not args.submissions and not args.companyfacts:
+        print("Nothing to do: pass --submissions and/or --companyfacts")
+        return 2
+    ciks = None
+    if args.tickers:
+        from src.company_registry import get_registry
+        ciks = list(get_registry().select_tickers(
+            args.tickers.split(","))["cik"])
+    if args.submissions:
+        save_filings(extract_filings_from_archive(
+            args.submissions, args.forms, ciks, args.workers),
+            args.output_dir)
+    if args.companyfacts:
+        with FactStore(args.facts_db) as store:
+            ingest_companyfacts(args.companyfacts, store, ciks,
+                                max_workers=args.workers)
+    return 0
+
+
+def cmd_catalog(args: argparse.Namespace) -> int:
+    from src.filing_catalog import load_catalog
+
+    catalog = load_catalog(args.index_dir, args.catalog,
+                           max_workers=args.workers, rebuild=args.rebuild)
+    ciks = None
+    if args.tickers:
+        from src.company_registry import get_registry
+        ciks = list(get_registry().select_tickers(
+            args.tickers.split(","))["cik"])
+    if not (ciks is not None or args.forms or args.start or args.end
+            or args.fiscal_year or args.fiscal_period):
+        print(f"{len(catalog)} filings of {len(catalog.ciks)} companies")
+        return 0
+    df = catalog.query(ciks=ciks, forms=args.forms, start=args.start,
+                       end=args.end, fiscal_year=args.fiscal_year,
+                       fiscal_period=args.fiscal_period)
+    df.to_csv(args.output or sys.stdout, index=False,
+              date_format="%Y-%m-%d")
+    return 0 if len(df) else 1
+
+
+def cmd_extract(args: argparse.Namespace) -> int:
+    from src.download_xbrl_data import (load_tag_list,
+                                        process_all_xml_incremental)
+    from src.columnar_output import write_parquet_dataset
+    from src.text_blocks import TextBlockStore
+    from src.xbrl_types import load_tag_types
+
+    tag_list = load_tag_list(args.tags_file)
+    tag_types = load_tag_types(args.types_file) \
+        if args.types_file and os.path.exists(args.types_file) else None
+    with TextBlockStore(args.text_blocks_db) as text_store:
+        df = process_all_xml_incremental(args.xml_dir, tag_list, args.output,
+                                         args.manifest,
+                                         max_workers=args.workers,
+                                         text_store=text_store,
+                                         periods=args.periods,
+                                         tag_types=tag_types)
+    if args.type_errors and "type_errors" in df.attrs:
+        df.attrs["type_errors"].to_csv(args.type_errors, index=False)
+    if args.parquet:
+        write_parquet_dataset(df, args.parquet, tag_types=tag_types)
+    return 0
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    import main_scraper
+
+    argv = ["--mode", str(args.mode), "--tickers", args.tickers,
+            "--sample", str(args.sample), "--year", str(args.year),
+            "--workers", str(args.workers), "--jobs-db", args.jobs_db,
+            "--forms", *args.forms]
+    if args.refresh:
+        argv.append("--refresh")
+    if args.cache:
+        argv += ["--cache", args.cache]
+    if args.metrics:
+        # Written by main() once, for every command
+        argv += ["--metrics", ""]
+    return main_scraper.main(argv)
+
+
+def cmd_status(args: argparse.Namespace) -> int:
+    from src.pipeline import JobStore, print_status
+
+    if not os.path.exists(args.jobs_db):
+        print(f"No job database at {args.jobs_db}")
+        return 1
+    print_status(JobStore(args.jobs_db).counts())
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="SEC scraper: company list, submissions indexes, "
+                    "filings and XBRL extraction.")
+    parser.add_argument("--metrics", default=None, metavar="PATH",
+                        help="Write a JSON metrics summary (requests, "
+                             "latency per host, parse rates) when the "
+                             "command ends")
+    parser.add_argument("--prometheus", default=None, metavar="PATH",
+                        help="Keep a Prometheus text-format metrics file "
+                             "up to date while the command runs")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on "
+                             "http://127.0.0.1:PORT/metrics")
+    commands = parser.add_subparsers(dest="command", required=True,
+                                     metavar="command")
+
+    check = commands.add_parser("check", help="Test the connection to the SEC")
+    check.set_defaults(func=cmd_check)
+
+    companies = commands.add_parser(
+        "companies", help="Build company_list.csv from company_tickers.json")
+    companies.add_argument("--tickers-json",
+                           default=dataset_path("company_tickers.json"))
+    companies.add_argument("--output",
+                           default=dataset_path("company_list.csv"))
+    companies.add_argument("--download", action="store_true",
+                           help="Download company_tickers.json again")
+    companies.set_defaults(func=cmd_companies)
+
+    search = commands.add_parser(
+        "search", help="Find companies by ticker or name prefix")
+    search.add_argument("prefix")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--tickers-json",
+                        default=dataset_path("company_tickers.json"))
+    search.set_defaults(func=cmd_search)
+
+    index = commands.add_parser(
+        "index", help="Download the submissions index.json files")
+    index.add_argument("--company-list",
+                       default=dataset_path("company_list.csv"))
+    index.add_argument("--output-dir", default=dataset_path("index_json"))
+    index.add_argument("--workers", type=int, default=8)
+    index.add_argument("--rate", type=float, default=8.0,
+                       help="Requests per second (SEC limit: 10)")
+    index.add_argument("--incremental", action="store_true",
+                       help="Only refresh companies with new filings")
+    index.add_argument("--no-history", action="store_true",
+                       help="Skip the older filing history pages")
+    index.set_defaults(func=cmd_index)
+
+    filings = commands.add_parser(
+        "filings", help="Extract filings lists from the index files")
+    filings.add_argument("--index-dir", default=dataset_path("index_json"))
+    filings.add_argument("--output-dir", default=dataset_path(""))
+    filings.add_argument("--forms", nargs="+", default=["10-K", "10-Q"])
+    filings.set_defaults(func=cmd_filings)
+
+    bulk = commands.add_parser(
+        "bulk", help="Ingest the SEC bulk archives (submissions.zip, "
+                     "companyfacts.zip) without per-company requests")
+    bulk.add_argument("--submissions", default=None,
+                      help="Local submissions.zip: writes the filings CSVs")
+    bulk.add_argument("--companyfacts", default=None,
+                      help="Local companyfacts.zip: fills the fact store")
+    bulk.add_argument("--tickers", default="",
+                      help="Only these companies (comma separated)")
+    bulk.add_argument("--forms", nargs="+", default=["10-K", "10-Q"])
+    bulk.add_argument("--output-dir", default=dataset_path(""))
+    bulk.add_argument("--facts-db",
+                      default=dataset_path("xbrl_facts.sqlite"))
+    bulk.add_argument("--workers", type=int, default=None,
+                      help="Worker processes (default: every core)")
+    bulk.set_defaults(func=cmd_bulk)
+
+    catalog = commands.add_parser(
+        "catalog", help="Build the filing catalog and query it by company, "
+                        "form, filing date or fiscal period")
+    catalog.add_argument("--index-dir", default=dataset_path("index_json"))
+    catalog.add_argument("--catalog",
+                         default=dataset_path("filing_catalog.parquet"))
+    catalog.add_argument("--rebuild", action="store_true",
+                         help="Rebuild the catalog even if it is current")
+    catalog.add_argument("--workers", type=int, default=None,
+                         help="Worker processes (default: every core)")
+    catalog.add_argument("--tickers", default="",
+                         help="Only these companies (comma separated)")
+    catalog.add_argument("--forms", nargs="+", default=None)
+    catalog.add_argument("--start", default=None,
+                         help="First filing date (YYYY-MM-DD)")
+    catalog.add_argument("--end", default=None,
+                         help="Last filing date (YYYY-MM-DD)")
+    catalog.add_argument("--fiscal-year", type=int, nargs="+", default=None)
+    catalog.add_argument("--fiscal-period", nargs="+", default=None,
+                         choices=["FY", "Q1", "Q2", "Q3", "Q4"])
+    catalog.add_argument("--output", default=None,
+                         help="Write the matching filings to this CSV "
+                              "(default: standard output)")
+    catalog.set_defaults(func=cmd_catalog)
+
+    extract = commands.add_parser(
+        "extract", help="Extract tags from the downloaded XBRL instances")
+    extract.add_argument("--xml-dir", default=dataset_path("xml_reports"))
+    extract.add_argument("--tags-file",
+                         default=dataset_path("xbrl_tags_sample.csv"))
+    extract.add_argument("--output",
+                         default=dataset_path("xbrl_data_extracted.csv"))
+    extract.add_argument("--manifest",
+                         default=dataset_path("xbrl_extract_manifest.json"))
+    extract.add_argument("--text-blocks-db",
+                         default=dataset_path("xbrl_text_blocks.sqlite"))
+    extract.add_argument("--parquet", default=None,
+                         help="Also write a partitioned Parquet dataset here")
+    extract.add_argument("--types-file",
+                         default=dataset_path("xbrl_tags.csv"),
+                         help="Tags CSV with a data_type column; declared "
+                              "columns are converted to their type ('' to "
+                              "keep every value as text)")
+    extract.add_argument("--type-errors", default=None, metavar="PATH",
+                         help="Write the values that do not match their "
+                              "declared type to this CSV")
+    extract.add_argument("--periods", nargs="+", default=None,
+                         metavar="PERIOD",
+                         help="Extract these report periods in one pass, as "
+                              "tag__period columns: FY FY_prior Q Q_prior "
+                              "YTD YTD_prior I I_prior")
+    extract.add_argument("--workers", type=int, default=os.cpu_count())
+    extract.set_defaults(func=cmd_extract)
+
+    run = commands.add_parser(
+        "run", help="Run or resume the whole pipeline (see main_scraper)")
+    run.add_argument("--mode", type=int, choices=[0, 1, 2], default=1)
+    run.add_argument("--tickers", default="")
+    run.add_argument("--sample", type=int, default=10)
+    run.add_argument("--forms", nargs="+", default=["10-K", "10-Q"])
+    run.add_argument("--year", type=int, default=0)
+    run.add_argument("--workers", type=int, default=8)
+    run.add_argument("--refresh", action="store_true")
+    run.add_argument("--cache", default=None)
+    run.add_argument("--jobs-db",
+                     default=dataset_path("pipeline_jobs.sqlite"))
+    run.set_defaults(func=cmd_run)
+
+    status = commands.add_parser("status", help="Show pipeline job counts")
+    status.add_argument("--jobs-db",
+                        default=dataset_path("pipeline_jobs.sqlite"))
+    status.set_defaults(func=cmd_status)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not (args.metrics or args.prometheus or args.metrics_port):
+        return args.func(args)
+
+    from src.metrics import (export_periodically, serve_prometheus,
+                             write_json_summary, write_prometheus)
+    exporter = export_periodically(args.prometheus) if args.prometheus \
+        else None
+    server = serve_prometheus(args.metrics_port) \
+        if args.metrics_port is not None else None
+    try:
+        return args.func(args)
+    finally:
+        if args.metrics:
+            write_json_summary(args.metrics)
+        if exporter is not None:
+            exporter.set()
+            write_prometheus(args.prometheus)
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Module: columnar_output
+Description: Writes extracted XBRL data as a Parquet dataset partitioned by
+fiscal year and form (fiscal_year=2023/form=10-K/part-0.parquet). cik and
+ticker are stored dictionary-encoded and numeric facts as typed columns, so
+downstream jobs read only the partitions and columns they need instead of
+re-parsing a wide CSV. Large inputs can be written chunk by chunk with
+`write_parquet_dataset_chunked`, which keeps one schema across chunks.
+"""
+
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+from src.xbrl_types import declared_type, to_declared_types
+
+PARTITION_COLUMNS = ["fiscal_year", "form"]
+
+# Low-cardinality identifiers stored with dictionary encoding
+DICTIONARY_COLUMNS = ["cik", "ticker", "quarter"]
+
+# Metadata columns never converted to numbers
+METADATA_COLUMNS = {"cik", "ticker", "year", "quarter", "filename",
+                    "accession_number", "fiscal_year", "form"}
+
+FISCAL_YEAR_TAGS = ["documentfiscalyearfocus", "DocumentFiscalYearFocus"]
+FORM_TAGS = ["form", "documenttype", "DocumentType"]
+
+DATE_IN_NAME = re.compile(r"(\d{4})\d{4}")
+
+
+def _first_present(df: pd.DataFrame, columns: Sequence[str]
+                   ) -> Optional[pd.Series]:
+    """Combines the given columns, keeping the first non-null value."""
+    result = None
+    for column in columns:
+        if column in df.columns:
+            result = df[column] if result is None \
+                else result.fillna(df[column])
+    return result
+
+
+def add_partition_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the `fiscal_year` and `form` partition columns.
+
+    fiscal_year comes from DocumentFiscalYearFocus when extracted, then from
+    the `year` column, then from the report date in the accession/file name
+    (aapl-20230930 -> 2023). form comes from a `form` or DocumentType column,
+    or "UNKNOWN".
+    """
+    fiscal_year = _first_present(df, FISCAL_YEAR_TAGS + ["year"])
+    name = _first_present(df, ["accession_number", "filename"])
+    if name is not None:
+        from_name = pd.to_numeric(
+            name.astype("string").str.extract(DATE_IN_NAME)[0])
+        fiscal_year = from_name if fiscal_year is None \
+            else fiscal_year.fillna(from_name)
+    if fiscal_year is None:
+        fiscal_year = pd.Series(pd.NA, index=df.index)
+    form = _first_present(df, FORM_TAGS)
+    partitions = pd.DataFrame({
+        "fiscal_year": pd.to_numeric(fiscal_year, errors="coerce")
+        .astype("Int64"),
+        # object first: a categorical form (DocumentType) has no "UNKNOWN"
+        # category to fill with
+        "form": form.astype(object).fillna("UNKNOWN").astype(str)
+        if form is not None else "UNKNOWN"
+    }, index=df.index)
+    existing = [column for column in partitions.columns
+                if column in df.columns]
+    return pd.concat([df.drop(columns=existing), partitions], axis=1)
+
+
+def to_typed_columns(df: pd.DataFrame,
+                     declared: Iterable[str] = (),
+                     text: Iterable[str] = ()) -> pd.DataFrame:
+    """
+    Converts fact columns whose non-null values are all numeric to typed
+    numeric columns (int64 / float64), and identifier columns to
+    categoricals (dictionary-encoded in Parquet). Other columns are kept as
+    strings. Columns in `declared` already have their declared type and are
+    left alone, and columns in `text` are kept as strings even if numeric.
+    """
+    declared = set(declared)
+    text = set(text)
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if column in declared or column in text:
+            pass
+        elif column in DICTIONARY_COLUMNS:
+            series = series.astype("string").astype("category")
+        elif column not in METADATA_COLUMNS and (
+                pd.api.types.is_object_dtype(series)
+                or pd.api.types.is_string_dtype(series)):
+            values = series.dropna()
+            numeric = pd.to_numeric(values, errors="coerce")
+            if len(values) and numeric.notna().all():
+                series = pd.to_numeric(series)
+        columns[column] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def write_parquet_dataset(df: pd.DataFrame, root: str,
+                          partition_cols: List[str] = PARTITION_COLUMNS,
+                          tag_types: Optional[Dict[str, str]] = None
+                          ) -> None:
+    """
+    Writes `df` as a partitioned Parquet dataset under `root`.
+
+    Partitions present in `df` replace the existing ones with the same key;
+    other partitions are left untouched.
+
+    Args:
+        df (pd.DataFrame): Extracted XBRL rows.
+        root (str): Dataset directory.
+        partition_cols (List[str]): Partition keys.
+        tag_types (Dict[str, str]): Declared data type per tag (see
+        `xbrl_types.tag_types`); declared columns are stored with that type
+        and the others are inferred. Values that do not match their type
+        are stored as nulls.
+    """
+    os.makedirs(root, exist_ok=True)
+    table = pa.Table.from_pandas(_typed_frame(df, tag_types),
+                                 preserve_index=False)
+    pq.write_to_dataset(table, root, partition_cols=partition_cols,
+                        existing_data_behavior="delete_matching")
+    print(f"Saved Parquet dataset to {root}")
+
+
+def _typed_frame(df: pd.DataFrame, tag_types: Optional[Dict[str, str]],
+                 text: Iterable[str] = ()) -> pd.DataFrame:
+    """Partition columns added and every column typed for Parquet."""
+    declared = []
+    if tag_types:
+        df, _ = to_declared_types(df, tag_types)
+        declared = [column for column in df.columns
+                    if declared_type(column, tag_types) is not None]
+    return to_typed_columns(add_partition_columns(df), declared, text)
+
+
+def _is_text(data_type: pa.DataType) -> bool:
+    return pa.types.is_string(data_type) \
+        or pa.types.is_large_string(data_type)
+
+
+def _merge_types(a: pa.DataType, b: pa.DataType) -> pa.DataType:
+    """Type that holds the values of a column typed `a` in one chunk and
+    `b` in another."""
+    if a == b or pa.types.is_null(b):
+        return a
+    if pa.types.is_null(a):
+        return b
+    if pa.types.is_dictionary(a) or pa.types.is_dictionary(b):
+        # Indices grow with the number of categories; all-null chunks have
+        # null dictionary values
+        values = [t.value_type for t in (a, b) if pa.types.is_dictionary(t)
+                  and not pa.types.is_null(t.value_type)]
+        return pa.dictionary(pa.int32(), values[0] if values else pa.string())
+    if pa.types.is_integer(a) and pa.types.is_integer(b):
+        return pa.int64()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t)
+           for t in (a, b)):
+        return pa.float64()
+    return a if _is_text(a) else b if _is_text(b) else pa.string()
+
+
+def write_parquet_dataset_chunked(
+        read_chunks: Callable[[], Iterable[pd.DataFrame]], root: str,
+        partition_cols: List[str] = PARTITION_COLUMNS,
+        tag_types: Optional[Dict[str, str]] = None) -> None:
+    """
+    Same as `write_parquet_dataset` for data read in chunks (e.g.
+    pd.read_csv(..., chunksize=...)), holding one chunk in memory at a time.
+
+    The chunks are read twice. The first pass finds the columns that are
+    text in some chunk (kept as text in all of them) and the type of every
+    column across chunks; the second one writes each chunk cast to that
+    schema. Partitions are replaced on their first write only, so rows of
+    the same partition in several chunks are all kept.
+
+    Args:
+        read_chunks (Callable): Returns a new iterator over the chunks.
+        root (str): Dataset directory.
+        partition_cols (List[str]): Partition keys.
+        tag_types (Dict[str, str]): Declared data type per tag (see
+        `write_parquet_dataset`).
+    """
+    text: Set[str] = set()
+    types: Dict[str, pa.DataType] = {}
+    for chunk in read_chunks():
+        df = _typed_frame(chunk, tag_types)
+        for field in pa.Schema.from_pandas(df, preserve_index=False):
+            data_type = field.type
+            if _is_text(data_type):
+                # An all-null column is text in pandas 3: it says nothing
+                if not df[field.name].notna().any():
+                    data_type = pa.null()
+                elif field.name not in METADATA_COLUMNS:
+                    text.add(field.name)
+            types[field.name] = _merge_types(
+                types.get(field.name, pa.null()), data_type)
+    # Text columns are read again as text, not as numbers cast to text
+    types = {name: pa.string() if name in text or pa.types.is_null(data_type)
+             else data_type for name, data_type in types.items()}
+
+    os.makedirs(root, exist_ok=True)
+    written: Set[str] = set()
+    for number, chunk in enumerate(read_chunks()):
+        df = _typed_frame(chunk, tag_types, text)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        schema = pa.schema([pa.field(name, types[name])
+                            for name in table.column_names],
+                           metadata=table.schema.metadata)
+        table = table.cast(schema)
+        keys = df[partition_cols].astype(str).agg("/".join, axis=1)
+        new = ~keys.isin(written).to_numpy()
+        for mask, behavior in ((new, "delete_matching"),
+                               (~new, "overwrite_or_ignore")):
+            if mask.any():
+                pq.write_to_dataset(
+                    table.filter(pa.array(mask)), root,
+                    partition_cols=partition_cols,
+                    basename_template=f"part-{number}-{{i}}.parquet",
+                    existing_data_behavior=behavior)
+        written.update(keys)
+    print(f"Saved Parquet dataset to {root}")
+
+
+def read_parquet_dataset(root: str, columns: Optional[List[str]] = None,
+                         fiscal_year: Optional[int] = None,
+                         form: Optional[str] = None) -> pd.DataFrame:
+    """
+    Reads selected columns and partitions of a dataset written by
+    `write_parquet_dataset`; other partitions are never opened.
+
+    Args:
+        root (str): Dataset directory.
+        columns (List[str]): Columns to read (all by default).
+        fiscal_year (int): Only read this fiscal year.
+        form (str): Only read this form type.
+    """
+    filters = []
+    if fiscal_year is not None:
+        filters.append(("fiscal_year", "=", fiscal_year))
+    if form is not None:
+        filters.append(("form", "=", form))
+    table = pq.read_table(root, columns=columns, filters=filters or None)
+    # Partition keys come back dictionary-encoded; the pandas metadata
+    # stored with the fragments would try to cast them to Int64.
+    return table.to_pandas(ignore_metadata=True)
@@ -0,0 +1,189 @@
+"""
+Module: company_registry
+Description: Process-wide index of SEC companies (CIK, ticker, name). The
+list is loaded once per process and kept with O(1) ticker -> CIK and
+CIK -> ticker maps plus a sorted prefix index for ticker and name search.
+Building the registry from company_tickers.json (or company_list.csv) is
+done once: a pickled snapshot is written next to the source file and
+reused until the source file changes.
+"""
+
+import os
+import bisect
+import pickle
+import threading
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.get_company_list import load_company_list
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "dataset")
+COMPANY_TICKERS_JSON = os.path.join(DATASET_DIR, "company_tickers.json")
+
+SNAPSHOT_SUFFIX = ".registry.pickle"
+
+# Bump when the snapshot layout changes; older snapshots are rebuilt.
+SNAPSHOT_VERSION = 1
+
+_registries: Dict[str, Tuple[Tuple[str, int, int], "CompanyRegistry"]] = {}
+_registries_lock = threading.Lock()
+
+
+class CompanyRegistry:
+    """
+    In-memory company index.
+
+    Args:
+        df (pd.DataFrame): Companies with columns cik (10-digit string),
+        ticker and title, in SEC order (primary listing first).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        self._ticker_rows: Dict[str, int] = {}
+        self._cik_rows: Dict[str, List[int]] = {}
+        for row, (cik, ticker) in enumerate(zip(self.df["cik"],
+                                                self.df["ticker"])):
+            if isinstance(ticker, str):
+                self._ticker_rows.setdefault(ticker.upper(), row)
+            self._cik_rows.setdefault(cik, []).append(row)
+
+        # Sorted (key, row) pairs: tickers and every word of the names
+        keys = [(ticker.lower(), row)
+                for ticker, row in self._ticker_rows.items()]
+        for row, title in enumerate(self.df["title"]):
+            if isinstance(title, str):
+                keys.extend((word, row) for word in set(title.lower().split()))
+        keys.sort()
+        self._prefix_keys = [key for key, _ in keys]
+        self._prefix_rows = [row for _, row in keys]
+
+    @classmethod
+    def from_file(cls, path: str) -> "CompanyRegistry":
+        """Builds a registry from company_tickers.json or company_list.csv."""
+        if path.endswith(".csv"):
+            # keep_default_na=False: "NA" (Nano Labs) is a ticker, not NaN
+            df = pd.read_csv(path, dtype={"cik": str}, keep_default_na=False,
+                             na_values=[""])
+            df["cik"] = df["cik"].str.zfill(10)
+        else:
+            df = load_company_list(path)
+        return cls(df)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Copy of the company list (cik, ticker, title)."""
+        return self.df.copy()
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def cik_for(self, ticker: str) -> Optional[str]:
+        """CIK of a ticker (case-insensitive), or None."""
+        row = self._ticker_rows.get(ticker.strip().upper())
+        return None if row is None else self.df["cik"].iat[row]
+
+    def tickers_for(self, cik: str) -> List[str]:
+        """Every ticker listed for a CIK, primary listing first."""
+        rows = self._cik_rows.get(str(cik).zfill(10), [])
+        return [self.df["ticker"].iat[row] for row in rows
+                if isinstance(self.df["ticker"].iat[row], str)]
+
+    def ticker_for(self, cik: str) -> Optional[str]:
+        """Primary ticker of a CIK, or None."""
+        tickers = self.tickers_for(cik)
+        return tickers[0] if tickers else None
+
+    def title_for(self, cik: str) -> Optional[str]:
+        """Company name of a CIK, or None."""
+        rows = self._cik_rows.get(str(cik).zfill(10))
+        return self.df["title"].iat[rows[0]] if rows else None
+
+    def ticker_map(self) -> Dict[str, str]:
+        """{cik: primary ticker} for every company."""
+        return {cik: self.df["ticker"].iat[rows[0]]
+                for cik, rows in self._cik_rows.items()}
+
+    def select_tickers(self, tickers: Iterable[str]) -> pd.DataFrame:
+        """
+        Rows of the given tickers (case-insensitive), in company list
+        order; unknown tickers are ignored.
+        """
+        rows = {self._ticker_rows[ticker.strip().upper()]
+                for ticker in tickers
+                if ticker.strip().upper() in self._ticker_rows}
+        return self.df.iloc[sorted(rows)].copy()
+
+    def select_ciks(self, ciks: Iterable[str]) -> pd.DataFrame:
+        """Rows of the given CIKs, in company list order."""
+        rows = {row for cik in ciks
+                for row in self._cik_rows.get(str(cik).zfill(10), [])}
+        return self.df.iloc[sorted(rows)].copy()
+
+    def search(self, prefix: str, limit: int = 20) -> pd.DataFrame:
+        """
+        Companies whose ticker or any word of whose name starts with
+        `prefix` (case-insensitive), in company list order.
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return self.df.iloc[:0].copy()
+        start = bisect.bisect_left(self._prefix_keys, prefix)
+        end = bisect.bisect_left(self._prefix_keys, prefix + "\uffff", start)
+        rows = sorted(set(self._prefix_rows[start:end]))[:limit]
+        return self.df.iloc[rows].copy()
+
+
+def _source_signature(path: str) -> Tuple[str, int, int]:
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def load_registry(path: str = COMPANY_TICKERS_JSON,
+                  snapshot_path: Optional[str] = None) -> CompanyRegistry:
+    """
+    Loads the registry from its snapshot, or builds it from `path` (and
+    rewrites the snapshot) when the snapshot is missing or `path` has
+    changed since it was written.
+
+    Args:
+        path (str): company_tickers.json or company_list.csv.
+        snapshot_path (str): Snapshot file (default: `path` +
+        ".registry.pickle").
+    """
+    snapshot_path = snapshot_path or path + SNAPSHOT_SUFFIX
+    signature = _source_signature(path)
+    if os.path.exists(snapshot_path):
+        try:
+            with open(snapshot_path, "rb") as f:
+                version, stored_signature, registry = pickle.load(f)
+            if version == SNAPSHOT_VERSION and stored_signature == signature:
+                return registry
+        except Exception as e:
+            print(f"Ignoring unreadable registry snapshot: {e}")
+
+    registry = CompanyRegistry.from_file(path)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump((SNAPSHOT_VERSION, signature, registry), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as e:
+        print(f"Could not write registry snapshot {snapshot_path}: {e}")
+    return registry
+
+
+def get_registry(path: str = COMPANY_TICKERS_JSON) -> CompanyRegistry:
+    """
+    Shared registry for `path`, loaded on first use and reloaded only if
+    the file changes.
+    """
+    key = os.path.abspath(path)
+    signature = _source_signature(path)
+    with _registries_lock:
+        cached = _registries.get(key)
+        if cached is None or cached[0] != signature:
+            cached = (signature, load_registry(path))
+            _registries[key] = cached
+    return cached[1]
@@ -1,21 +1,17 @@
 # src/connection.py
 
-import requests
-
-HEADERS = {
-    "User-Agent": "Alberto Paramio Galisteo (aparamio@uoc.edu) - "
-                  "SEC Scraper for academic use",
-    "Accept-Encoding": "gzip, deflate"
-}
-
 TEST_CIK = "0000320193"  # Apple Inc.
 URL = f"https://data.sec.gov/submissions/CIK{TEST_CIK}.json"
 
 
 def validate_connection():
+    # Misma sesión que el resto de etapas (cabeceras SEC, keep-alive);
+    # se importa aquí para que requests solo se cargue al comprobar
+    from src.http_session import get_session
+
     print(f"Testing connection to: {URL}")
     try:
-        response = requests.get(URL, headers=HEADERS, timeout=10)
+        response = get_session().get(URL, timeout=10)
         print(f"Status code: {response.status_code}")
 
         if response.status_code == 200:
@@ -32,4 +28,3 @@ def validate_connection():
 
 if __name__ == "__main__":
     validate_connection()
-
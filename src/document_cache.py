@@ -0,0 +1,133 @@
+"""
+Module: document_cache
+Description: Compressed, content-addressed cache for raw SEC documents
+(submissions JSON, XBRL instances). Bodies are stored gzip-compressed under
+the SHA-256 of their uncompressed content, so identical bodies downloaded
+from different URLs are kept once. A small SQLite index maps each URL to
+its content hash. Readers get a file object that decompresses on the fly,
+so parsers can stream from the cache without a temporary file.
+
+Layout:
+    <root>/index.sqlite
+    <root>/objects/ab/abcdef...gz
+"""
+
+import os
+import gzip
+import uuid
+import sqlite3
+import hashlib
+from datetime import datetime, timezone
+from typing import IO, Iterable, Iterator, Optional
+
+COMPRESS_LEVEL = 6
+
+
+class DocumentCache:
+    """
+    Content-addressed store of compressed documents keyed by URL.
+
+    Safe to use from several threads or processes: objects are written to
+    a temporary file and renamed into place, and the index is SQLite.
+
+    Args:
+        root (str): Cache directory.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index_path = os.path.join(root, "index.sqlite")
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS refs (
+                    url TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at TEXT NOT NULL
+                )""")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest + ".gz")
+
+    def digest(self, url: str) -> Optional[str]:
+        """Returns the content hash stored for `url`, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT digest FROM refs WHERE url = ?",
+                               (url,)).fetchone()
+        return row[0] if row else None
+
+    def has(self, url: str) -> bool:
+        """True if a body for `url` is cached."""
+        digest = self.digest(url)
+        return digest is not None and os.path.exists(self._object_path(digest))
+
+    def tee(self, url: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Yields `chunks` unchanged while compressing them into the cache.
+
+        The document is registered under `url` only once every chunk has
+        been consumed; an interrupted stream leaves no trace in the cache.
+        """
+        tmp_path = os.path.join(self.objects_dir,
+                                f"tmp-{uuid.uuid4().hex}.gz")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with gzip.open(tmp_path, "wb",
+                           compresslevel=COMPRESS_LEVEL) as f:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+                    yield chunk
+            self._commit(url, tmp_path, hasher.hexdigest(), size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_stream(self, url: str, chunks: Iterable[bytes]) -> str:
+        """Stores a document given as byte chunks; returns its hash."""
+        for _ in self.tee(url, chunks):
+            pass
+        return self.digest(url)
+
+    def put(self, url: str, data: bytes) -> str:
+        """Stores a document held in memory; returns its hash."""
+        return self.put_stream(url, [data])
+
+    def _commit(self, url: str, tmp_path: str, digest: str,
+                size: int) -> None:
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            os.remove(tmp_path)  # identical body already stored
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(tmp_path, object_path)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?)",
+                (url, digest, size,
+                 datetime.now(timezone.utc).isoformat(timespec="seconds")))
+
+    def open(self, url: str) -> IO[bytes]:
+        """
+        Opens the cached body of `url` for streaming reads; the content is
+        decompressed on the fly.
+
+        Raises:
+            KeyError: If `url` is not cached.
+        """
+        digest = self.digest(url)
+        if digest is None:
+            raise KeyError(url)
+        return gzip.open(self._object_path(digest), "rb")
+
+    def read(self, url: str) -> bytes:
+        """Returns the whole cached body of `url`."""
+        with self.open(url) as f:
+            return f.read()
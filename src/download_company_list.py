@@ -4,8 +4,8 @@ Description: Downloads the official company_tickers.json file from the SEC
 website.
 """
 
-import requests
 import os
+from src.downloader import fetch
 
 
 def download_company_tickers(output_path: str) -> None:
@@ -16,15 +16,10 @@ def download_company_tickers(output_path: str) -> None:
         output_path (str): Path where the JSON file should be saved.
     """
     url = "https://www.sec.gov/files/company_tickers.json"
-    headers = {
-        "User-Agent": "MySECProject/1.0 (your_email@example.com)",
-        "Accept-Encoding": "gzip, deflate",
-        "Host": "www.sec.gov"
-    }
 
     try:
         print(f"Downloading company_tickers.json from {url}...")
-        response = requests.get(url, headers=headers)
+        response = fetch(url, timeout=10)
         response.raise_for_status()
 
         # Ensure output folder exists
@@ -40,5 +35,5 @@ def download_company_tickers(output_path: str) -> None:
 
 
 if __name__ == "__main__":
-    output_file = "../dataset/company_tickers.json"
+    output_file = "dataset/company_tickers.json"
     download_company_tickers(output_file)
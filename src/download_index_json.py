@@ -3,20 +3,29 @@ Module: download_index_json
 Description: Downloads index.json files for all companies listed
 in company_list.csv using their CIKs. Includes polite scraping,
 CIK formatting, estimated time calculation, and user confirmation.
+Supports an incremental refresh mode based on conditional GETs, and
+fetches the older filing history pages listed under `filings.files`.
+Documents are written as plain files in the output directory, or into a
+compressed DocumentCache when one is given.
 """
 
 import os
-import time
-import random
-import requests
-import pandas as pd
+import json
+import threading
+from functools import partial
+from typing import Dict, List, Optional
+from src.company_registry import get_registry
+from src.document_cache import DocumentCache
+from src.downloader import (fetch, run_concurrently, DEFAULT_MAX_WORKERS,
+                            DEFAULT_REQUESTS_PER_SECOND)
 
+SUBMISSIONS_BASE_URL = "https://data.sec.gov/submissions"
 
-HEADERS = {
-    "User-Agent": "Alberto Paramio Galisteo (aparamio@uoc.edu) - "
-                  "SEC Scraper for academic use",
-    "Accept-Encoding": "gzip, deflate"
-}
+# Sidecar file (inside the output directory) with the HTTP validators and
+# the newest accession number seen for each CIK.
+REFRESH_INDEX_FILE = "_refresh_index.json"
+
+_refresh_index_lock = threading.Lock()
 
 
 def clean_cik(cik: str) -> str:
@@ -24,9 +33,49 @@ def clean_cik(cik: str) -> str:
     return str(cik).split('.')[0].zfill(10)
 
 
-def estimate_download_time(num_items: int, avg_seconds: float = 2.0) -> float:
+def submissions_url(cik: str) -> str:
+    """URL of the main submissions document of a CIK."""
+    return f"{SUBMISSIONS_BASE_URL}/CIK{cik}.json"
+
+
+def history_page_url(name: str) -> str:
+    """URL of a CIK##########-submissions-###.json history page."""
+    return f"{SUBMISSIONS_BASE_URL}/{name}"
+
+
+def _read_stored(path: str, url: str,
+                 cache: Optional[DocumentCache]) -> Optional[str]:
+    """Returns a stored document from the cache or disk, or None."""
+    if cache is not None:
+        return cache.read(url).decode("utf-8") if cache.has(url) else None
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _is_stored(path: str, url: str, cache: Optional[DocumentCache]) -> bool:
+    return cache.has(url) if cache is not None else os.path.exists(path)
+
+
+def _write_stored(path: str, url: str, content: bytes,
+                  cache: Optional[DocumentCache]) -> None:
+    """Stores a document in the cache, or atomically on disk."""
+    if cache is not None:
+        cache.put(url, content)
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def estimate_download_time(
+        num_items: int,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND) -> float:
     """Estimates total time in seconds for all downloads."""
-    return num_items * avg_seconds
+    return num_items / requests_per_second
 
 
 def confirm_download_time(seconds: float) -> bool:
@@ -38,22 +87,96 @@ def confirm_download_time(seconds: float) -> bool:
     return response == "y"
 
 
-def download_index_json(cik: str, output_dir: str) -> bool:
-    """Downloads the index.json for a given CIK and saves it."""
-    url = f"https://data.sec.gov/submissions/CIK{cik}.json"
+def load_refresh_index(output_dir: str) -> Dict[str, Dict[str, str]]:
+    """Loads the per-CIK refresh index, or an empty one if missing."""
+    path = os.path.join(output_dir, REFRESH_INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_refresh_index(refresh_index: Dict[str, Dict[str, str]],
+                       output_dir: str) -> None:
+    """Atomically writes the per-CIK refresh index."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, REFRESH_INDEX_FILE)
+    tmp_path = path + ".tmp"
+    with _refresh_index_lock:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(refresh_index, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def latest_accession(text: str) -> Optional[str]:
+    """Returns the newest accession number of a submissions JSON body."""
+    accessions = (json.loads(text).get("filings", {}).get("recent", {})
+                  .get("accessionNumber", []))
+    return accessions[0] if accessions else None
+
+
+def download_index_json(cik: str, output_dir: str,
+                        refresh_index: Optional[Dict] = None,
+                        cache: Optional[DocumentCache] = None) -> bool:
+    """
+    Downloads the index.json for a given CIK and saves it.
+
+    Args:
+        cik (str): 10-digit CIK.
+        output_dir (str): Directory where the file is saved.
+        refresh_index (Dict): Per-CIK validators. When given, the request is
+        conditional (If-None-Match / If-Modified-Since) and the file is only
+        rewritten if the server reports a change and the newest accession
+        number differs from the stored one. The index is updated in place.
+        cache (DocumentCache): Store the document compressed in this cache
+        instead of writing it to `output_dir`.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    url = submissions_url(cik)
     output_path = os.path.join(output_dir, f"{cik}.json")
 
+    headers = {}
+    entry = {}
+    if refresh_index is not None and _is_stored(output_path, url, cache):
+        entry = refresh_index.get(cik, {})
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if "latest_accession" not in entry:
+            # First incremental run over files downloaded before.
+            entry = {"latest_accession": latest_accession(
+                _read_stored(output_path, url, cache))}
+
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        response = fetch(url, headers=headers, timeout=10)
         if response.status_code == 404:
             print(f"Skipping: {cik} — Not found (404)")
             return False
 
+        if response.status_code == 304:
+            print(f"Unchanged: {cik}")
+            return False
+
         response.raise_for_status()
 
-        os.makedirs(output_dir, exist_ok=True)
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(response.text)
+        if refresh_index is not None:
+            newest = latest_accession(response.text)
+            unchanged = (newest is not None
+                         and newest == entry.get("latest_accession"))
+            with _refresh_index_lock:
+                refresh_index[cik] = {
+                    "etag": response.headers.get("ETag", ""),
+                    "last_modified": response.headers.get("Last-Modified", ""),
+                    "latest_accession": newest or ""
+                }
+            if unchanged:
+                print(f"Unchanged: {cik} (same latest filing)")
+                return False
+
+        _write_stored(output_path, url, response.content, cache)
 
         print(f"Downloaded: {cik}")
         return True
@@ -63,29 +186,111 @@ def download_index_json(cik: str, output_dir: str) -> bool:
         return False
 
 
-def download_all_index_files(csv_path: str, output_dir: str) -> None:
+def list_history_pages(cik: str, output_dir: str,
+                       cache: Optional[DocumentCache] = None) -> List[str]:
+    """Returns the `filings.files` page names of a downloaded index.json."""
+    text = _read_stored(os.path.join(output_dir, f"{cik}.json"),
+                        submissions_url(cik), cache)
+    if text is None:
+        return []
+    files = json.loads(text).get("filings", {}).get("files", [])
+    return [page["name"] for page in files]
+
+
+def download_history_page(name: str, output_dir: str,
+                          cache: Optional[DocumentCache] = None) -> bool:
+    """
+    Downloads one CIK##########-submissions-###.json page next to the
+    main file (or into the cache). Pages are immutable once published, so
+    an existing page is never downloaded again.
+    """
+    output_path = os.path.join(output_dir, name)
+    url = history_page_url(name)
+    if _is_stored(output_path, url, cache):
+        return False
+
+    try:
+        response = fetch(url, timeout=10)
+        response.raise_for_status()
+        _write_stored(output_path, url, response.content, cache)
+        print(f"Downloaded page: {name}")
+        return True
+    except Exception as e:
+        print(f"Error downloading {name}: {e}")
+        return False
+
+
+def download_history_pages(ciks: List[str], output_dir: str,
+                           max_workers: int = DEFAULT_MAX_WORKERS,
+                           cache: Optional[DocumentCache] = None) -> int:
+    """
+    Downloads the missing history pages of every CIK concurrently, under
+    the same shared rate limiter as the main files.
+
+    Returns:
+        int: Number of pages downloaded.
+    """
+    names = [name for cik in ciks
+             for name in list_history_pages(cik, output_dir, cache)
+             if not _is_stored(os.path.join(output_dir, name),
+                               history_page_url(name), cache)]
+    results = run_concurrently(partial(download_history_page,
+                                       output_dir=output_dir, cache=cache),
+                               names, max_workers=max_workers)
+    return sum(results)
+
+
+def download_all_index_files(csv_path: str, output_dir: str,
+                             max_workers: int = DEFAULT_MAX_WORKERS,
+                             incremental: bool = False,
+                             confirm: bool = True,
+                             include_history: bool = True,
+                             cache: Optional[DocumentCache] = None) -> None:
     """
     Downloads index.json files for all companies in the CSV.
 
     Args:
         csv_path (str): Path to company_list.csv
         output_dir (str): Directory where the files are saved
+        max_workers (int): Number of concurrent download threads
+        incremental (bool): Only rewrite files that changed since the last
+        run, using the validators stored in the refresh index
+        confirm (bool): Ask for confirmation before starting
+        include_history (bool): Also download the older filing history
+        pages listed under `filings.files`
+        cache (DocumentCache): Store documents compressed in this cache
+        instead of as plain files (the refresh index stays in output_dir)
     """
-    df = pd.read_csv(csv_path, dtype={"cik": str})
+    df = get_registry(csv_path).frame
     total = len(df)
 
-    estimated_time = estimate_download_time(total)
-    if not confirm_download_time(estimated_time):
-        print("Download cancelled.")
-        return
+    if confirm:
+        estimated_time = estimate_download_time(total)
+        if not confirm_download_time(estimated_time):
+            print("Download cancelled.")
+            return
+
+    refresh_index = load_refresh_index(output_dir) if incremental else None
+
+    ciks = [clean_cik(cik) for cik in df["cik"]]
+    try:
+        results = run_concurrently(partial(download_index_json,
+                                           output_dir=output_dir,
+                                           refresh_index=refresh_index,
+                                           cache=cache),
+                                   ciks, max_workers=max_workers)
+    finally:
+        if refresh_index is not None:
+            save_refresh_index(refresh_index, output_dir)
+    print(f"Downloaded {sum(results)} of {total} index files.")
 
-    for index, row in df.iterrows():
-        cik = clean_cik(row["cik"])
-        download_index_json(cik, output_dir)
-        time.sleep(random.uniform(1, 2.5))
+    if include_history:
+        pages = download_history_pages(ciks, output_dir, max_workers, cache)
+        print(f"Downloaded {pages} history pages.")
 
 
 if __name__ == "__main__":
-    CSV_PATH = "../dataset/company_list.csv"
-    OUTPUT_DIR = "../dataset/index_json"
-    download_all_index_files(CSV_PATH, OUTPUT_DIR)
+    CSV_PATH = "dataset/company_list.csv"
+    OUTPUT_DIR = "dataset/index_json"
+    INCREMENTAL = True  # Only refresh companies with new filings
+    download_all_index_files(CSV_PATH, OUTPUT_DIR, incremental=INCREMENTAL)
@@ -1,13 +1,40 @@
 import os
+import json
+import time
+import hashlib
 import xml.etree.ElementTree as ET
 import pandas as pd
-from typing import List, Dict
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterable, List, Dict, Optional, Set, Tuple
+from src.columnar_output import write_parquet_dataset
+from src.document_cache import DocumentCache
 from datetime import datetime, timedelta
+from src.downloader import fetch, iter_body
+from src.metrics import get_metrics
+from src.text_blocks import TextBlockStore, externalize_text_blocks
+from src.xbrl_types import load_tag_types, to_declared_types
+from src.xbrl_parser import (PERIODS, MultiPeriodExtractor, TagIndex,
+                             parse_chunks, parse_streaming, period_column,
+                             validate_periods)
 
 # Configuración general
-TAGS_FILE = "../dataset/xbrl_tags_sample.csv"
-XML_FOLDER = "../dataset/xml_reports"
-OUTPUT_CSV = "../dataset/xbrl_data_extracted.csv"
+TAGS_FILE = "dataset/xbrl_tags_sample.csv"
+TAG_TYPES_FILE = "dataset/xbrl_tags.csv"  # data_type de cada etiqueta
+XML_FOLDER = "dataset/xml_reports"
+OUTPUT_CSV = "dataset/xbrl_data_extracted.csv"
+OUTPUT_PARQUET = "dataset/xbrl_data_parquet"  # particionado por año fiscal y formulario
+MANIFEST_FILE = "dataset/xbrl_extract_manifest.json"
+TEXT_BLOCKS_DB = "dataset/xbrl_text_blocks.sqlite"  # TextBlocks fuera de la tabla
+MAX_WORKERS = os.cpu_count()  # 1 = secuencial
+
+# Cambiar cuando cambie la lógica de extracción: invalida el manifiesto y
+# obliga a re-procesar todos los archivos
+EXTRACTOR_VERSION = "1"
+
+# Clave que marca las filas de archivos que no se pudieron procesar (con el
+# mensaje de error); no se guarda como columna
+ERROR_KEY = "error"
 
 # Cargar etiquetas desde CSV
 def load_tag_list(tags_file: str) -> List[str]:
@@ -15,8 +42,8 @@ def load_tag_list(tags_file: str) -> List[str]:
     return tags_df["tag_name"].str.strip().str.lower().tolist()
 
 # Extraer contextoRef relevante basado en la fecha estimada del informe
-def extract_relevant_contexts(root, target_date: str) -> List[str]:
-    contexts = []
+def extract_relevant_contexts(root, target_date: str) -> Set[str]:
+    contexts = set()
     try:
         filing_dt = datetime.strptime(target_date, "%Y%m%d")
         for elem in root.findall(".//{http://www.xbrl.org/2003/instance}context"):
@@ -26,61 +53,347 @@ def extract_relevant_contexts(root, target_date: str) -> List[str]:
                 try:
                     context_dt = datetime.strptime(end_date_elem.text.strip(), "%Y-%m-%d")
                     if abs((context_dt - filing_dt).days) <= 1:
-                        contexts.append(context_id)
+                        contexts.add(context_id)
                 except:
                     continue
     except:
         pass
     return contexts
 
+# Inferir fecha desde el nombre del archivo: ejemplo goog-20221231_htm.xml
+def report_date_from_filename(xml_path: str) -> str:
+    filename = os.path.basename(xml_path)
+    return filename.split("-")[-1].split("_")[0]  # "20221231"
+
 # Extraer datos de un archivo XML
 
-def extract_from_xml(xml_path: str, tag_list: List[str]) -> Dict[str, str]:
+# xml_path también sirve para inferir la fecha; si se pasa `source` (p. ej. un
+# documento abierto desde DocumentCache) se lee de ahí en lugar del disco.
+# Con `raise_errors` un archivo ilegible lanza la excepción en lugar de
+# devolver lo extraído hasta el error.
+def extract_from_xml(xml_path: str, tag_list: Iterable[str],
+                     source: Optional[IO[bytes]] = None,
+                     raise_errors: bool = False) -> Dict[str, str]:
     data = {}
+    tag_index = TagIndex(tag_list)
     try:
-        tree = ET.parse(xml_path)
+        tree = ET.parse(source if source is not None else xml_path)
         root = tree.getroot()
 
-        # Inferir fecha desde el nombre del archivo: ejemplo goog-20221231_htm.xml
-        filename = os.path.basename(xml_path)
-        date_part = filename.split("-")[-1].split("_")[0]  # "20221231"
+        date_part = report_date_from_filename(xml_path)
         relevant_contexts = extract_relevant_contexts(root, date_part)
 
+        # Búsquedas por hash: contexto en un set y QName resuelto una sola vez
         for elem in root.iter():
-            tag = elem.tag.split("}")[-1].strip().lower()
             context = elem.attrib.get("contextRef", "")
-            if tag in tag_list and elem.text and context in relevant_contexts:
+            if context not in relevant_contexts or not elem.text:
+                continue
+            tag = tag_index.resolve(elem.tag)
+            if tag is not None:
                 data[tag] = elem.text.strip()
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error processing {xml_path}: {e}")
     return data
 
-# Procesar todos los XML en la carpeta
-def process_all_xml(xml_folder: str, tag_list: List[str]) -> pd.DataFrame:
-    records = []
-    for filename in os.listdir(xml_folder):
-        if filename.endswith(".xml"):
-            xml_path = os.path.join(xml_folder, filename)
-            print(f"Processing: {filename}")
-            row = extract_from_xml(xml_path, tag_list)
-
-            # Inferir metadatos desde el nombre del archivo
-            row["filename"] = filename
-            row["accession_number"] = filename.replace("_htm.xml", "").replace(".xml", "")
-            records.append(row)
-    return pd.DataFrame(records)
+# Crear el extractor de varios periodos (None = extractor de un solo periodo)
+def _period_extractor(tag_list: Iterable[str], target_date: str,
+                      periods: Optional[Iterable[str]]) -> Optional[MultiPeriodExtractor]:
+    if not periods:
+        return None
+    return MultiPeriodExtractor(tag_list, target_date, periods)
+
+# Extraer datos en streaming (iterparse): memoria constante con archivos grandes.
+# Con `periods` (p. ej. ["FY", "FY_prior", "I", "I_prior"]) se extraen en la
+# misma pasada todos esos periodos, en columnas etiqueta__periodo.
+# `raise_errors` como en extract_from_xml.
+def extract_from_xml_streaming(xml_path: str, tag_list: Iterable[str],
+                               source: Optional[IO[bytes]] = None,
+                               periods: Optional[Iterable[str]] = None,
+                               raise_errors: bool = False) -> Dict[str, str]:
+    try:
+        target_date = report_date_from_filename(xml_path)
+        return parse_streaming(source if source is not None else xml_path,
+                               tag_list, target_date,
+                               _period_extractor(tag_list, target_date, periods))
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error processing {xml_path}: {e}")
+        return {}
+
+# Extraer datos de un documento guardado en DocumentCache (descompresión en
+# streaming, sin archivo temporal)
+def extract_cached_xml(cache: DocumentCache, url: str, tag_list: Iterable[str],
+                       streaming: bool = True,
+                       periods: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    with cache.open(url) as source:
+        if streaming or periods:
+            return extract_from_xml_streaming(url, tag_list, source, periods)
+        return extract_from_xml(url, tag_list, source=source)
+
+# Descargar y extraer en streaming: el cuerpo de la respuesta se va pasando
+# al parser incremental mientras llega, sin guardarlo entero en memoria. Si
+# se indica cache_path, los bytes se escriben también a ese archivo; con
+# `cache` se guardan comprimidos en el DocumentCache y, si el documento ya
+# estaba en la caché, se parsea desde ahí sin tocar la red.
+def fetch_and_extract_xbrl(url: str, tag_list: Iterable[str],
+                           cache_path: Optional[str] = None,
+                           cache: Optional[DocumentCache] = None,
+                           periods: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    try:
+        if cache is not None and cache.has(url):
+            return extract_cached_xml(cache, url, tag_list, periods=periods)
+        response = fetch(url, timeout=15, stream=True)
+        if not response.ok:
+            response.close()
+            response.raise_for_status()
+        chunks = iter_body(response, cache_path)
+        if cache is not None:
+            chunks = cache.tee(url, chunks)
+        target_date = report_date_from_filename(url)
+        return parse_chunks(chunks, tag_list, target_date,
+                            _period_extractor(tag_list, target_date, periods))
+    except Exception as e:
+        print(f"Error downloading/parsing {url}: {e}")
+        return {}
+
+# Procesar un archivo XML (función de nivel de módulo para poder usarla en
+# un ProcessPoolExecutor). Un error en un archivo no detiene el lote: la fila
+# sale vacía y con el mensaje en ERROR_KEY. La extracción de varios periodos
+# sólo existe en streaming.
+def process_xml_file(xml_path: str, tag_list: Iterable[str],
+                     streaming: bool = True,
+                     periods: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    filename = os.path.basename(xml_path)
+    print(f"Processing: {filename}")
+    try:
+        if streaming or periods:
+            row = extract_from_xml_streaming(xml_path, tag_list,
+                                             periods=periods,
+                                             raise_errors=True)
+        else:
+            row = extract_from_xml(xml_path, tag_list, raise_errors=True)
+    except Exception as e:
+        print(f"Error processing {xml_path}: {e}")
+        row = {ERROR_KEY: str(e)}
+
+    # Inferir metadatos desde el nombre del archivo
+    row["filename"] = filename
+    row["accession_number"] = filename.replace("_htm.xml", "").replace(".xml", "")
+    return row
+
+# Listar los XML de la carpeta en orden alfabético
+def list_xml_paths(xml_folder: str) -> List[str]:
+    return [os.path.join(xml_folder, filename)
+            for filename in sorted(os.listdir(xml_folder))
+            if filename.endswith(".xml")]
+
+# Igual que process_xml_file, devolviendo también el tiempo de parseo (las
+# métricas de los procesos del pool no llegan al proceso principal)
+def process_xml_file_timed(xml_path: str, tag_list: Iterable[str],
+                           streaming: bool = True,
+                           periods: Optional[Iterable[str]] = None
+                           ) -> Tuple[Dict[str, str], float]:
+    start = time.perf_counter()
+    row = process_xml_file(xml_path, tag_list, streaming, periods)
+    return row, time.perf_counter() - start
+
+# Procesar una lista de XML. Con max_workers != 1 los archivos se reparten en
+# un pool de procesos (None = todos los núcleos); el orden de las filas es el
+# de `xml_paths`. El tiempo y los hechos de cada archivo van a las métricas.
+def process_xml_paths(xml_paths: List[str], tag_list: Iterable[str],
+                      streaming: bool = True, max_workers: Optional[int] = 1,
+                      chunksize: int = 4,
+                      periods: Optional[Iterable[str]] = None) -> List[Dict[str, str]]:
+    # Periodos desconocidos: error antes de empezar, no uno por archivo
+    periods = validate_periods(periods) if periods else None
+    worker = partial(process_xml_file_timed, tag_list=frozenset(tag_list),
+                     streaming=streaming, periods=periods)
+    if max_workers == 1 or len(xml_paths) < 2:
+        results = [worker(xml_path) for xml_path in xml_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(worker, xml_paths,
+                                        chunksize=chunksize))
+    metrics = get_metrics()
+    for xml_path, (row, seconds) in zip(xml_paths, results):
+        # Todas las columnas salvo filename y accession_number son hechos
+        facts = 0 if ERROR_KEY in row else len(row) - 2
+        metrics.record_parse(row["filename"], seconds, facts,
+                             os.path.getsize(xml_path))
+    return [row for row, _ in results]
+
+# Convertir las columnas declaradas en xbrl_tags.csv a su tipo (Int64,
+# float64, boolean, fecha, category...). Las celdas que no se pueden convertir
+# quedan vacías y se guardan en df.attrs["type_errors"] (fila, columna, tipo,
+# valor original).
+def apply_tag_types(df: pd.DataFrame, tag_types: Dict[str, str]) -> pd.DataFrame:
+    typed, errors = to_declared_types(df, tag_types)
+    if len(errors):
+        print(f"{len(errors)} values do not match their declared data type "
+              f"(see df.attrs['type_errors'])")
+    typed.attrs["type_errors"] = errors
+    return typed
+
+# Procesar todos los XML en la carpeta. Con `tag_types` (ver
+# xbrl_types.load_tag_types) las columnas salen ya tipadas.
+def process_all_xml(xml_folder: str, tag_list: List[str],
+                    streaming: bool = True, max_workers: Optional[int] = 1,
+                    chunksize: int = 4,
+                    periods: Optional[Iterable[str]] = None,
+                    tag_types: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    records = process_xml_paths(list_xml_paths(xml_folder), tag_list,
+                                streaming, max_workers, chunksize, periods)
+    df = pd.DataFrame(records).drop(columns=ERROR_KEY, errors="ignore")
+    return apply_tag_types(df, tag_types) if tag_types else df
+
+# Columnas de datos en el orden de tag_list; cada etiqueta seguida de sus
+# columnas por periodo (etiqueta__fy, etiqueta__fy_prior...)
+def data_columns(tag_list: Iterable[str], columns: Iterable[str]) -> List[str]:
+    present = set(columns)
+    ordered = []
+    for tag in dict.fromkeys(tag_list):
+        for column in [tag] + [period_column(tag, p) for p in PERIODS]:
+            if column in present:
+                ordered.append(column)
+    return ordered
+
+# Huella del conjunto de etiquetas, de la versión del extractor, de si los
+# TextBlocks se guardan aparte y de los periodos: si cambia, todos los
+# resultados anteriores quedan obsoletos
+def extraction_key(tag_list: Iterable[str],
+                   external_text_blocks: bool = False,
+                   periods: Optional[Iterable[str]] = None) -> str:
+    parts = [EXTRACTOR_VERSION, str(external_text_blocks)]
+    if periods:
+        parts.append("periods=" + ",".join(validate_periods(periods)))
+    payload = "\n".join(parts + sorted(set(tag_list)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# SHA-256 del contenido de un archivo, leído por bloques
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+# Cargar el manifiesto de extracción (vacío si no existe)
+def load_manifest(manifest_path: str) -> Dict:
+    if not os.path.exists(manifest_path):
+        return {"extraction_key": "", "files": {}}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# Guardar el manifiesto de forma atómica
+def save_manifest(manifest: Dict, manifest_path: str) -> None:
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+# Decidir qué archivos hay que (re)procesar. Tamaño y mtime iguales bastan
+# para dar un archivo por no modificado; si cambian, se compara el hash del
+# contenido (p. ej. un archivo copiado de nuevo sin cambios). El manifiesto
+# sólo vale para el CSV que lo generó: si ese CSV ya no existe o es otro,
+# todos los archivos quedan pendientes. Devuelve los archivos pendientes y
+# las entradas nuevas del manifiesto.
+def plan_extraction(xml_paths: List[str], manifest: Dict, key: str,
+                    output_csv: str) -> Tuple[List[str], Dict[str, Dict]]:
+    valid = manifest.get("extraction_key") == key \
+        and manifest.get("output_csv") == os.path.abspath(output_csv) \
+        and os.path.exists(output_csv)
+    previous = manifest.get("files", {}) if valid else {}
+    pending, entries = [], {}
+    for xml_path in xml_paths:
+        filename = os.path.basename(xml_path)
+        stat = os.stat(xml_path)
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        old = previous.get(filename)
+        if old and old["size"] == entry["size"] \
+                and old["mtime_ns"] == entry["mtime_ns"]:
+            entry["sha256"] = old["sha256"]
+        else:
+            entry["sha256"] = file_sha256(xml_path)
+            if not old or old["sha256"] != entry["sha256"]:
+                pending.append(xml_path)
+        entries[filename] = entry
+    return pending, entries
+
+# Extracción incremental: sólo se procesan los archivos nuevos o modificados
+# (o todos si cambian las etiquetas, los periodos o EXTRACTOR_VERSION) y sus
+# filas se combinan con las del CSV existente. Las filas de archivos que ya
+# no están en la carpeta se eliminan. El manifiesto se guarda después del CSV, así
+# que una ejecución interrumpida sólo provoca trabajo repetido; los archivos
+# que fallan no entran en él y se reintentan en la siguiente ejecución. Con
+# `text_store`, el HTML de los TextBlocks se guarda comprimido en ese almacén
+# y la tabla sólo contiene el id de cada bloque. Con `periods` se extraen
+# varios periodos por archivo (ver xbrl_parser.PERIODS). Con `tag_types` el
+# DataFrame devuelto está tipado; el CSV se escribe siempre como texto.
+def process_all_xml_incremental(xml_folder: str, tag_list: List[str],
+                                output_csv: str, manifest_path: str,
+                                streaming: bool = True,
+                                max_workers: Optional[int] = 1,
+                                text_store: Optional[TextBlockStore] = None,
+                                periods: Optional[Iterable[str]] = None,
+                                tag_types: Optional[Dict[str, str]] = None
+                                ) -> pd.DataFrame:
+    key = extraction_key(tag_list, text_store is not None, periods)
+    xml_paths = list_xml_paths(xml_folder)
+    manifest = load_manifest(manifest_path)
+    pending, entries = plan_extraction(xml_paths, manifest, key, output_csv)
+    print(f"{len(pending)} of {len(xml_paths)} XML files new or changed")
+
+    previous = pd.DataFrame()
+    if pending != xml_paths and os.path.exists(output_csv):
+        previous = pd.read_csv(output_csv, dtype=str)
+        previous = previous[previous["filename"].isin(entries.keys())]
+    records = process_xml_paths(pending, tag_list, streaming, max_workers,
+                                periods=periods)
+    failed = {record["filename"] for record in records if ERROR_KEY in record}
+    if failed:
+        print(f"{len(failed)} XML files failed; they will be retried")
+    if records:
+        reprocessed = {record["filename"] for record in records}
+        if not previous.empty:
+            previous = previous[~previous["filename"].isin(reprocessed)]
+        new_rows = pd.DataFrame(records).drop(columns=ERROR_KEY,
+                                              errors="ignore")
+        if text_store is not None:
+            new_rows = externalize_text_blocks(new_rows, text_store,
+                                               max_workers=max_workers)
+        df = pd.concat([previous, new_rows], ignore_index=True)
+    else:
+        df = previous
+
+    # Metadatos primero y filas en orden alfabético de archivo
+    cols = ["filename", "accession_number"] + \
+        data_columns(tag_list, df.columns)
+    df = df.reindex(columns=cols).sort_values("filename", ignore_index=True)
+
+    df.to_csv(output_csv, index=False)
+    print(f"Saved extracted XBRL data to {output_csv}")
+    save_manifest({"extraction_key": key,
+                   "extractor_version": EXTRACTOR_VERSION,
+                   "output_csv": os.path.abspath(output_csv),
+                   "files": {filename: entry
+                             for filename, entry in entries.items()
+                             if filename not in failed}}, manifest_path)
+    return apply_tag_types(df, tag_types) if tag_types else df
 
 if __name__ == "__main__":
     tag_list = load_tag_list(TAGS_FILE)
-    df = process_all_xml(XML_FOLDER, tag_list)
-
-    # Reordenar columnas: metadatos primero
-    cols = ["filename", "accession_number"] + [tag for tag in tag_list if tag in df.columns]
-    df = df[cols]
+    with TextBlockStore(TEXT_BLOCKS_DB) as text_store:
+        df = process_all_xml_incremental(XML_FOLDER, tag_list, OUTPUT_CSV,
+                                         MANIFEST_FILE,
+                                         max_workers=MAX_WORKERS,
+                                         text_store=text_store,
+                                         tag_types=load_tag_types(TAG_TYPES_FILE))
 
-    df.to_csv(OUTPUT_CSV, index=False)
-    print(f"Saved extracted XBRL data to {OUTPUT_CSV}")
+    write_parquet_dataset(df, OUTPUT_PARQUET)
 
 
 
@@ -1,15 +1,10 @@
 import os
-import time
-import random
-import requests
 import pandas as pd
-from bs4 import BeautifulSoup
-from typing import List
-
-HEADERS = {
-    "User-Agent": "Alberto Paramio Galisteo (aparamio@uoc.edu) - SEC Scraper for academic use",
-    "Accept-Encoding": "gzip, deflate"
-}
+from functools import partial
+from typing import Dict, List, Optional
+from src.company_registry import get_registry
+from src.document_cache import DocumentCache
+from src.downloader import fetch, iter_body, run_concurrently, DEFAULT_MAX_WORKERS
 
 def transform_htm_to_xml_url(filing_url: str) -> str:
     """
@@ -19,91 +14,87 @@ def transform_htm_to_xml_url(filing_url: str) -> str:
         return filing_url.replace(".htm", "_htm.xml")
     return filing_url
 
-def download_xml_reports(filings_df: pd.DataFrame, output_dir: str, retries: int = 2) -> None:
+def download_xml_report(row: Dict, output_dir: str, retries: int = 2,
+                        cache: Optional[DocumentCache] = None) -> bool:
+    """
+    Downloads the XBRL instance of a single filing into `output_dir`, or
+    streams it compressed into `cache` when one is given.
+    """
+    cik = row["cik"].lstrip("0")
+    ticker = row.get("ticker", "UNKNOWN")
+    filing_url = row["filing_url"]
+
+    print(f"Processing: {ticker} ({cik})")
+
+    xml_url = transform_htm_to_xml_url(filing_url)
+    filename = os.path.basename(xml_url)
+    output_path = os.path.abspath(os.path.join(output_dir, filename))
+
+    if cache.has(xml_url) if cache is not None else os.path.exists(output_path):
+        print(f"✔ File already exists: {filename}")
+        return True
+
+    try:
+        response = fetch(xml_url, timeout=10, max_retries=retries,
+                         stream=True)
+        if not response.ok:
+            response.close()
+            response.raise_for_status()
+        if cache is not None:
+            cache.put_stream(xml_url, iter_body(response))
+        else:
+            for _ in iter_body(response, output_path):
+                pass
+        print(f"✔ Downloaded: {filename}")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to download {filename}: {e}")
+        return False
+
+def download_xml_reports(filings_df: pd.DataFrame, output_dir: str, retries: int = 2,
+                         max_workers: int = DEFAULT_MAX_WORKERS,
+                         cache: Optional[DocumentCache] = None) -> None:
     os.makedirs(output_dir, exist_ok=True)
-    for _, row in filings_df.iterrows():
-        cik = row["cik"].lstrip("0")
-        ticker = row.get("ticker", "UNKNOWN")
-        filing_url = row["filing_url"]
-
-        print(f"Processing: {ticker} ({cik})")
-
-        xml_url = transform_htm_to_xml_url(filing_url)
-        filename = os.path.basename(xml_url)
-        output_path = os.path.abspath(os.path.join(output_dir, filename))
-
-        if os.path.exists(output_path):
-            print(f"✔ File already exists: {filename}")
-            continue
-
-        for attempt in range(retries + 1):
-            try:
-                response = requests.get(xml_url, headers=HEADERS, timeout=10)
-                response.raise_for_status()
-                with open(output_path, "wb") as f:
-                    f.write(response.content)
-                print(f"✔ Downloaded: {filename}")
-                break
-            except Exception as e:
-                if attempt < retries:
-                    print(f"Retrying ({attempt + 1}/{retries}) for {filename}")
-                    time.sleep(random.uniform(1, 2))
-                else:
-                    print(f"❌ Failed to download {filename}: {e}")
-        time.sleep(random.uniform(1, 2.5))
+    rows = filings_df.to_dict("records")
+    run_concurrently(partial(download_xml_report, output_dir=output_dir,
+                             retries=retries, cache=cache),
+                     rows, max_workers=max_workers)
 
 def main():
-    TICKER_FILE = "../dataset/tickers/tickers_prueba.txt"
-    COMPANY_LIST_FILE = "../dataset/company_list.csv"
-    OUTPUT_DIR = "../dataset/xml_reports"
+    # pyarrow is only needed here, not by the pipeline importing this module
+    from src.filing_catalog import load_catalog
+
+    TICKER_FILE = "dataset/tickers/tickers_prueba.txt"
+    COMPANY_LIST_FILE = "dataset/company_list.csv"
+    INDEX_DIR = "dataset/index_json"
+    OUTPUT_DIR = "dataset/xml_reports"
     REPORT_TYPE = 1  # 0 = both, 1 = 10-K, 2 = 10-Q
-    YEAR = 2023
-    QUARTER = 0  # 0 = all
+    YEAR = 2023  # fiscal year, 0 = all
+    QUARTER = 0  # fiscal quarter (4 = annual report), 0 = all
+
+    FORMS = {0: ["10-K", "10-Q"], 1: ["10-K"], 2: ["10-Q"]}
+    FISCAL_PERIODS = {1: "Q1", 2: "Q2", 3: "Q3", 4: ["Q4", "FY"]}
 
     def read_ticker_list(file_path: str) -> List[str]:
         with open(file_path, "r") as f:
             return [line.strip().upper() for line in f if line.strip()]
 
     def map_tickers_to_ciks(tickers: List[str], company_list_path: str) -> pd.DataFrame:
-        df = pd.read_csv(company_list_path, dtype={"cik": str})
-        df = df[df["ticker"].isin(tickers)].copy()
-        df["cik"] = df["cik"].str.zfill(10)
-        return df
-
-    def load_filing_datasets(report_type: int) -> pd.DataFrame:
-        if report_type == 1:
-            return pd.read_csv("../dataset/10k_filings.csv", dtype={"cik": str})
-        elif report_type == 2:
-            return pd.read_csv("../dataset/10q_filings.csv", dtype={"cik": str})
-        elif report_type == 0:
-            df1 = pd.read_csv("../dataset/10k_filings.csv", dtype={"cik": str})
-            df2 = pd.read_csv("../dataset/10q_filings.csv", dtype={"cik": str})
-            return pd.concat([df1, df2], ignore_index=True)
-        else:
-            raise ValueError("report_type must be 0 (all), 1 (10-K), or 2 (10-Q)")
-
-    def filter_filings(df: pd.DataFrame, ciks: List[str], year: int, quarter: int) -> pd.DataFrame:
-        df["year"] = pd.to_datetime(df["filing_date"]).dt.year
-        df["month"] = pd.to_datetime(df["filing_date"]).dt.month
-        filtered = df[df["cik"].isin(ciks)]
-
-        if year != 0:
-            filtered = filtered[filtered["year"] == year]
-
-        if quarter in [1, 2, 3, 4]:
-            quarter_map = {1: (1, 3), 2: (4, 6), 3: (7, 9), 4: (10, 12)}
-            start_m, end_m = quarter_map[quarter]
-            filtered = filtered[(filtered["month"] >= start_m) & (filtered["month"] <= end_m)]
+        return get_registry(company_list_path).select_tickers(tickers)
 
-        return filtered
+    if REPORT_TYPE not in FORMS:
+        raise ValueError("report_type must be 0 (all), 1 (10-K), or 2 (10-Q)")
 
     tickers = read_ticker_list(TICKER_FILE)
     df_company = map_tickers_to_ciks(tickers, COMPANY_LIST_FILE)
     cik_list = df_company["cik"].tolist()
 
-    filings = load_filing_datasets(REPORT_TYPE)
-    filtered = filter_filings(filings, cik_list, YEAR, QUARTER)
-    filtered = filtered.merge(df_company[["cik", "ticker"]], on="cik", how="left")
+    filtered = load_catalog(INDEX_DIR).query(
+        ciks=cik_list, forms=FORMS[REPORT_TYPE],
+        fiscal_year=YEAR or None,
+        fiscal_period=FISCAL_PERIODS.get(QUARTER))
+    filtered = filtered.astype({"cik": str}).merge(
+        df_company[["cik", "ticker"]], on="cik", how="left")
 
     download_xml_reports(filtered, OUTPUT_DIR)
 
@@ -0,0 +1,317 @@
+"""
+Module: downloader
+Description: Shared download engine for every pipeline stage. Requests are
+issued from a thread pool and paced by a token-bucket limiter shared by all
+workers, so the SEC fair-access ceiling (10 requests/second) is respected
+no matter how many threads are running. Transient failures (429, 5xx and
+network errors) are retried with jittered exponential backoff, honouring the
+Retry-After header when the server sends one. Every attempt is counted in
+the shared metrics registry (status class, latency and bytes per host,
+retries, time spent waiting for the limiter).
+"""
+
+import os
+import time
+import random
+import threading
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import (Callable, Dict, Iterable, Iterator, List, Optional,
+                    TypeVar)
+from urllib.parse import urlsplit
+from src.http_session import get_session
+from src.metrics import get_metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# SEC allows 10 requests/second per client; stay slightly below it.
+DEFAULT_REQUESTS_PER_SECOND = 8.0
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_CAP = 60.0
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket limiting how many requests start per second.
+
+    Args:
+        rate (float): Tokens added per second (requests/second ceiling).
+        burst (int): Maximum number of tokens that can be accumulated.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available and consumes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated
+                self._tokens = min(self.burst,
+                                   self._tokens + elapsed * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Drains the bucket so no worker starts a request for `seconds`."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+_default_limiter = RateLimiter(DEFAULT_REQUESTS_PER_SECOND)
+
+
+def get_limiter() -> RateLimiter:
+    """Returns the process-wide limiter shared by all stages."""
+    return _default_limiter
+
+
+def set_rate_limit(requests_per_second: float) -> None:
+    """Replaces the process-wide limiter with a new requests/second ceiling."""
+    global _default_limiter
+    _default_limiter = RateLimiter(requests_per_second)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Converts a Retry-After header (seconds or HTTP-date) to seconds to wait.
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the header is missing or
+        cannot be parsed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BACKOFF_BASE,
+                  cap: float = DEFAULT_BACKOFF_CAP) -> float:
+    """Full-jitter exponential backoff for the given attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def fetch(url: str, headers: Optional[Dict[str, str]] = None,
+          timeout: float = 10, max_retries: int = DEFAULT_MAX_RETRIES,
+          limiter: Optional[RateLimiter] = None,
+          **kwargs) -> requests.Response:
+    """
+    Performs a rate-limited GET with retries.
+
+    Non-retryable responses (e.g. 200, 304, 404) are returned as-is so the
+    caller decides how to handle them. Retryable statuses are returned only
+    after the last attempt has failed.
+
+    Args:
+        url (str): URL to download.
+        headers (Dict[str, str]): Extra headers on top of the session ones.
+        timeout (float): Socket timeout in seconds.
+        max_retries (int): Number of retries after the first attempt.
+        limiter (RateLimiter): Limiter to use; defaults to the shared one.
+        **kwargs: Extra arguments passed to `Session.get`.
+
+    Returns:
+        requests.Response: Final response.
+
+    Raises:
+        requests.RequestException: If every attempt failed at network level.
+    """
+    limiter = limiter or get_limiter()
+    session = get_session()
+    metrics = get_metrics()
+    host = urlsplit(url).hostname or ""
+
+    for attempt in range(max_retries + 1):
+        waited = time.perf_counter()
+        limiter.acquire()
+        started = time.perf_counter()
+        metrics.inc("rate_limit_wait_seconds_total", started - waited)
+        try:
+            response = session.get(url, headers=headers, timeout=timeout,
+                                   **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.inc("http_requests_total", host=host, status="error")
+            if attempt == max_retries:
+                raise
+            metrics.inc("http_retries_total", host=host,
+                        reason=type(e).__name__)
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        metrics.observe("http_request_seconds",
+                        time.perf_counter() - started, host=host)
+        metrics.inc("http_requests_total", host=host,
+                    status=f"{response.status_code // 100}xx")
+        if not kwargs.get("stream"):
+            # Streamed bodies are counted by iter_body as they are read
+            metrics.inc("http_response_bytes_total", len(response.content),
+                        host=host)
+
+        if response.status_code not in RETRY_STATUS_CODES \
+                or attempt == max_retries:
+            return response
+
+        metrics.inc("http_retries_total", host=host,
+                    reason=str(response.status_code))
+
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = backoff_delay(attempt)
+        if response.status_code == 429:
+            # Throttled: hold back every worker, not only this one.
+            limiter.pause(delay)
+        print(f"Retrying ({attempt + 1}/{max_retries}) {url} "
+              f"after status {response.status_code}")
+        response.close()
+        time.sleep(delay)
+
+    return response
+
+
+def iter_body(response: requests.Response,
+              cache_path: Optional[str] = None,
+              chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yields the (decompressed) body of a streamed response chunk by chunk.
+
+    When `cache_path` is given, the chunks are also written to that file as
+    they go by. The file is written under a temporary name and only renamed
+    into place once the whole body has been received, so an interrupted
+    transfer never leaves a truncated file in the cache.
+
+    Args:
+        response (requests.Response): Response opened with stream=True.
+        cache_path (str): Optional file where the raw body is saved.
+        chunk_size (int): Bytes per chunk.
+    """
+    received = 0
+    try:
+        with response:
+            if cache_path is None:
+                for chunk in response.iter_content(chunk_size):
+                    received += len(chunk)
+                    yield chunk
+                return
+
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)),
+                        exist_ok=True)
+            tmp_path = cache_path + ".part"
+            try:
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        received += len(chunk)
+                        yield chunk
+                os.replace(tmp_path, cache_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    finally:
+        get_metrics().inc("http_response_bytes_total", received,
+                          host=urlsplit(response.url or "").hostname or "")
+
+
+def queue_name(worker: Callable) -> str:
+    """Label of a worker in the queue_depth metric (its function name)."""
+    func = getattr(worker, "func", worker)  # functools.partial
+    return getattr(func, "__name__", "worker")
+
+
+def _dequeuing(worker: Callable[[T], R], queue: str) -> Callable[[T], R]:
+    """Wraps `worker` so the queue_depth gauge drops when an item starts."""
+    metrics = get_metrics()
+
+    def run(item: T) -> R:
+        metrics.add_gauge("queue_depth", -1, queue=queue)
+        return worker(item)
+    return run
+
+
+def run_concurrently(worker: Callable[[T], R], items: Iterable[T],
+                     max_workers: int = DEFAULT_MAX_WORKERS) -> List[R]:
+    """
+    Runs `worker` over `items` in a thread pool.
+
+    Pacing is done by `fetch` through the shared limiter, so the number of
+    workers only controls how many requests may be in flight at once.
+
+    Args:
+        worker (Callable): Function applied to each item.
+        items (Iterable): Work items.
+        max_workers (int): Number of threads.
+
+    Returns:
+        List: Results in the same order as `items`.
+    """
+    items = list(items)
+    queue = queue_name(worker)
+    get_metrics().add_gauge("queue_depth", len(items), queue=queue)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_dequeuing(worker, queue), items))
+
+
+def iter_concurrently(worker: Callable[[T], R], items: Iterable[T],
+                      max_workers: int = DEFAULT_MAX_WORKERS,
+                      max_pending: Optional[int] = None) -> Iterator[R]:
+    """
+    Like `run_concurrently`, but yields each result as soon as it and every
+    earlier one are done, and keeps at most `max_pending` items submitted at
+    a time, so memory stays bounded however many items there are.
+
+    Args:
+        worker (Callable): Function applied to each item.
+        items (Iterable): Work items; consumed lazily.
+        max_workers (int): Number of threads.
+        max_pending (int): Submitted but not yet yielded items
+        (default: 4 * max_workers).
+
+    Yields:
+        Results in the same order as `items`.
+    """
+    max_pending = max_pending or 4 * max_workers
+    items = iter(items)
+    metrics = get_metrics()
+    queue = queue_name(worker)
+    run = _dequeuing(worker, queue)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                metrics.add_gauge("queue_depth", 1, queue=queue)
+                pending.append(executor.submit(run, item))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Stopped early (error or Ctrl-C): drop work not yet started
+            for future in pending:
+                if future.cancel():
+                    metrics.add_gauge("queue_depth", -1, queue=queue)
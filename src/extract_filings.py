@@ -0,0 +1,266 @@
+"""
+Module: extract_filings
+Description: Parses SEC index.json files from dataset/index_json/ and
+extracts filing metadata for several form types (10-K, 10-Q, 10-K/A, 8-K,
+20-F...) in a single pass. Each submissions file is parsed once, merged with
+its cached history pages, and its filings are partitioned by form; large
+directories are processed in a process pool.
+"""
+
+import os
+import re
+import json
+import pandas as pd
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence
+from src.document_cache import DocumentCache
+from src.download_index_json import history_page_url, submissions_url
+
+DEFAULT_FORMS = ("10-K", "10-Q")
+
+ARCHIVES_BASE_URL = "https://www.sec.gov/Archives/edgar/data"
+
+FILING_COLUMNS = ["cik", "accession_number", "filing_date", "form",
+                  "filing_url"]
+
+# FILING_COLUMNS plus the fields the filing catalog derives periods from
+CATALOG_SOURCE_COLUMNS = FILING_COLUMNS + ["report_date", "fiscal_year_end"]
+
+# Submissions files are named after the zero-padded CIK (0000320193.json).
+SUBMISSIONS_FILE_PATTERN = re.compile(r"^\d{10}\.json$")
+
+# Below this number of files a process pool costs more than it saves.
+PARALLEL_MIN_FILES = 200
+
+
+def is_submissions_file(filename: str) -> bool:
+    """Returns True for main submissions files (not sidecars or pages)."""
+    return bool(SUBMISSIONS_FILE_PATTERN.match(filename))
+
+
+def filings_filename(form: str) -> str:
+    """Output CSV name for a form type, e.g. 10-K/A -> 10ka_filings.csv."""
+    return re.sub(r"[^0-9a-z]", "", form.lower()) + "_filings.csv"
+
+
+def _columnar_block(filings: Dict) -> pd.DataFrame:
+    """Loads one block of parallel filing arrays into a DataFrame."""
+    accessions = filings.get("accessionNumber", [])
+    return pd.DataFrame({
+        "accession_number": accessions,
+        "filing_date": filings.get("filingDate", []),
+        "report_date": filings.get("reportDate", [""] * len(accessions)),
+        "form": filings.get("form", []),
+        "primary_document": filings.get("primaryDocument", [])
+    })
+
+
+def filings_frame(data: Dict, forms: Optional[Iterable[str]] = DEFAULT_FORMS,
+                  pages: Optional[List[Dict]] = None,
+                  columns: Sequence[str] = FILING_COLUMNS) -> pd.DataFrame:
+    """
+    Builds the filings of the requested forms from a loaded submissions
+    document.
+
+    The `filings.recent` block is already columnar (parallel arrays), so it
+    is loaded straight into a DataFrame and filtered with a vectorized mask;
+    accession cleaning and URL building are vectorized string operations.
+
+    Args:
+        data (Dict): Parsed index.json document
+        forms (Iterable[str]): Form types to keep (None keeps every form)
+        pages (List[Dict]): Parsed history pages listed in `filings.files`
+        (same columnar layout as `filings.recent`), merged after it
+        columns (Sequence[str]): Output columns, FILING_COLUMNS or
+        CATALOG_SOURCE_COLUMNS
+
+    Returns:
+        pd.DataFrame: Matching filings with `columns`
+    """
+    recent = data.get("filings", {}).get("recent", {})
+    cik = data.get("cik", "UNKNOWN")
+
+    # Empty blocks (filers without recent filings) load as float64 columns,
+    # which have no .str accessor: skip them
+    blocks = [block for block in map(_columnar_block,
+                                     [recent] + (pages or []))
+              if len(block)]
+    if not blocks:
+        return pd.DataFrame(columns=list(columns), dtype=str)
+    df = pd.concat(blocks, ignore_index=True) if len(blocks) > 1 \
+        else blocks[0]
+    if forms is not None:
+        df = df[df["form"].isin(frozenset(forms))]
+    if df.empty:
+        return pd.DataFrame(columns=list(columns), dtype=str)
+
+    # Build filing URL
+    accession_clean = df["accession_number"].str.replace("-", "", regex=False)
+    base_url = f"{ARCHIVES_BASE_URL}/{cik}/"
+    df = df.assign(cik=cik,
+                   filing_url=base_url + accession_clean + "/"
+                   + df["primary_document"],
+                   fiscal_year_end=data.get("fiscalYearEnd") or "")
+
+    return df[list(columns)].reset_index(drop=True)
+
+
+def load_history_pages(data: Dict, index_json_dir: Optional[str] = None,
+                       cache: Optional[DocumentCache] = None) -> List[Dict]:
+    """
+    Loads the cached `filings.files` pages of a submissions document.
+
+    Pages are stored by download_index_json next to the main file, under
+    their SEC name (CIK##########-submissions-###.json), or in the document
+    cache when one is given. Pages that have not been downloaded are skipped.
+    """
+    pages = []
+    for page in data.get("filings", {}).get("files", []):
+        if cache is not None:
+            url = history_page_url(page["name"])
+            if cache.has(url):
+                with cache.open(url) as f:
+                    pages.append(json.load(f))
+            continue
+        page_path = os.path.join(index_json_dir, page["name"])
+        if os.path.exists(page_path):
+            with open(page_path, 'r', encoding='utf-8') as f:
+                pages.append(json.load(f))
+    return pages
+
+
+def extract_filings_from_file(json_path: str,
+                              forms: Optional[Iterable[str]] = DEFAULT_FORMS,
+                              include_history: bool = True,
+                              columns: Sequence[str] = FILING_COLUMNS
+                              ) -> pd.DataFrame:
+    """
+    Extracts filings metadata for the requested forms from one index.json.
+
+    Args:
+        json_path (str): Path to a company's index.json file
+        forms (Iterable[str]): Form types to keep (None keeps every form)
+        include_history (bool): Merge the older filings stored in the
+        cached `filings.files` pages
+        columns (Sequence[str]): Output columns (see `filings_frame`)
+
+    Returns:
+        pd.DataFrame: Matching filings with `columns`
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    pages = None
+    if include_history:
+        pages = load_history_pages(data, os.path.dirname(json_path))
+    return filings_frame(data, forms, pages, columns)
+
+
+def extract_filings_from_cache(cache: DocumentCache, cik: str,
+                               forms: Iterable[str] = DEFAULT_FORMS,
+                               include_history: bool = True) -> pd.DataFrame:
+    """
+    Same as `extract_filings_from_file`, reading the submissions document
+    (and its history pages) of `cik` from a DocumentCache. The JSON is
+    decompressed while it is parsed; no file is materialized.
+    """
+    with cache.open(submissions_url(cik)) as f:
+        data = json.load(f)
+
+    pages = load_history_pages(data, cache=cache) if include_history else None
+    return filings_frame(data, forms, pages)
+
+
+def partition_by_form(df: pd.DataFrame, forms: Iterable[str]
+                      ) -> Dict[str, pd.DataFrame]:
+    """Splits a filings DataFrame into one DataFrame per requested form."""
+    groups = {form: group.reset_index(drop=True)
+              for form, group in df.groupby("form", sort=False)}
+    return {form: groups.get(form, pd.DataFrame(columns=FILING_COLUMNS))
+            for form in forms}
+
+
+def collect_filings(index_json_dir: str,
+                    forms: Optional[Iterable[str]] = DEFAULT_FORMS,
+                    max_workers: Optional[int] = None,
+                    columns: Sequence[str] = FILING_COLUMNS) -> pd.DataFrame:
+    """
+    Processes all index.json files once and concatenates their filings.
+
+    Args:
+        index_json_dir (str): Directory containing CIK index.json files
+        forms (Iterable[str]): Form types to extract (None keeps every form)
+        max_workers (int): Worker processes; None uses every core. The pool
+        is only used for directories with at least PARALLEL_MIN_FILES files.
+        columns (Sequence[str]): Output columns (see `filings_frame`)
+
+    Returns:
+        pd.DataFrame: Filings of every company, in CIK file order
+    """
+    paths = [os.path.join(index_json_dir, filename)
+             for filename in sorted(os.listdir(index_json_dir))
+             if is_submissions_file(filename)]
+
+    worker = partial(extract_filings_from_file, forms=forms, columns=columns)
+    if len(paths) >= PARALLEL_MIN_FILES and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            per_file = list(executor.map(worker, paths, chunksize=32))
+    else:
+        per_file = [worker(path) for path in paths]
+
+    if not per_file:
+        return pd.DataFrame(columns=list(columns))
+    return pd.concat(per_file, ignore_index=True)
+
+
+def extract_all_filings(index_json_dir: str,
+                        forms: Iterable[str] = DEFAULT_FORMS,
+                        max_workers: Optional[int] = None
+                        ) -> Dict[str, pd.DataFrame]:
+    """
+    Processes all index.json files once and collects filings per form.
+
+    Args:
+        index_json_dir (str): Directory containing CIK index.json files
+        forms (Iterable[str]): Form types to extract
+        max_workers (int): Worker processes (see `collect_filings`)
+
+    Returns:
+        Dict[str, pd.DataFrame]: One DataFrame of filings per form type
+    """
+    forms = tuple(dict.fromkeys(forms))
+    return partition_by_form(collect_filings(index_json_dir, forms,
+                                             max_workers), forms)
+
+
+def extract_all_cached_filings(cache: DocumentCache, ciks: Iterable[str],
+                               forms: Iterable[str] = DEFAULT_FORMS
+                               ) -> Dict[str, pd.DataFrame]:
+    """
+    Collects filings per form for the given CIKs from a DocumentCache.
+    CIKs whose submissions document is not cached are skipped.
+    """
+    forms = tuple(dict.fromkeys(forms))
+    per_file = [extract_filings_from_cache(cache, cik, forms)
+                for cik in ciks if cache.has(submissions_url(cik))]
+    if not per_file:
+        return partition_by_form(pd.DataFrame(columns=FILING_COLUMNS), forms)
+    return partition_by_form(pd.concat(per_file, ignore_index=True), forms)
+
+
+def save_filings(frames: Dict[str, pd.DataFrame], output_dir: str) -> None:
+    """Writes one <form>_filings.csv per form type into `output_dir`."""
+    for form, df in frames.items():
+        output_file = os.path.join(output_dir, filings_filename(form))
+        df.to_csv(output_file, index=False)
+        print(f"Extracted {len(df)} {form} filings.")
+        print(f"Saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    INPUT_DIR = "dataset/index_json"
+    OUTPUT_DIR = "dataset"
+    FORMS = ["10-K", "10-Q"]
+
+    save_filings(extract_all_filings(INPUT_DIR, FORMS), OUTPUT_DIR)
@@ -0,0 +1,186 @@
+"""
+Module: fact_store
+Description: Embedded SQLite store of XBRL facts in long format, one row per
+(cik, accession, concept, period, unit, dimensions) with its value and
+decimals. Unlike the wide CSV outputs, nothing is overwritten or thrown
+away: every context, unit and period is kept, and the (cik, concept,
+period) indexes let analysts query thousands of filings in milliseconds
+instead of re-parsing the XML for every new question.
+"""
+
+import os
+import sqlite3
+import pandas as pd
+from itertools import islice
+from typing import Iterable, List, Optional, Set
+from src.xbrl_parser import Fact, iter_facts, iter_top_level
+
+INSERT_BATCH_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    cik TEXT,
+    accession TEXT NOT NULL,
+    concept TEXT NOT NULL,
+    period_start TEXT,
+    period_end TEXT,
+    instant TEXT,
+    unit TEXT,
+    decimals TEXT,
+    dimensions TEXT NOT NULL DEFAULT '',
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_facts_cik_concept_end
+    ON facts (cik, concept, period_end);
+CREATE INDEX IF NOT EXISTS idx_facts_cik_concept_instant
+    ON facts (cik, concept, instant);
+CREATE INDEX IF NOT EXISTS idx_facts_concept_end
+    ON facts (concept, period_end);
+CREATE INDEX IF NOT EXISTS idx_facts_accession
+    ON facts (accession);
+"""
+
+
+class FactStore:
+    """
+    Long-format XBRL fact table on local disk.
+
+    Args:
+        db_path (str): SQLite database file (created if missing).
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "FactStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def accessions(self) -> Set[str]:
+        """Accession numbers with facts in the store."""
+        return {row[0] for row in
+                self.conn.execute("SELECT DISTINCT accession FROM facts")}
+
+    def insert_facts(self, accession: str, facts: Iterable[Fact],
+                     cik: Optional[str] = None, replace: bool = True) -> int:
+        """
+        Bulk-inserts the facts of one filing, replacing any facts already
+        stored for the same accession, in a single transaction. Exact
+        duplicates within the filing are inserted once.
+
+        Args:
+            accession (str): Accession number (or file stem) of the filing.
+            facts (Iterable[Fact]): Facts from `xbrl_parser.iter_facts`.
+            cik (str): CIK to use when the facts do not carry one.
+            replace (bool): Delete the facts already stored for the
+            accession first; False appends to them.
+
+        Returns:
+            int: Number of facts inserted.
+        """
+        # Inline XBRL repeats a fact wherever it is displayed; identical
+        # duplicates are stored once.
+        rows = iter(dict.fromkeys(
+            (fact.cik or cik, accession, fact.concept, fact.period_start,
+             fact.period_end, fact.instant, fact.unit, fact.decimals,
+             fact.dimensions, fact.value) for fact in facts))
+        total = 0
+        with self.conn:
+            if replace:
+                self.conn.execute("DELETE FROM facts WHERE accession = ?",
+                                  (accession,))
+            while True:
+                batch = list(islice(rows, INSERT_BATCH_SIZE))
+                if not batch:
+                    break
+                self.conn.executemany(
+                    "INSERT INTO facts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    batch)
+                total += len(batch)
+        return total
+
+    def ingest_xml(self, xml_path: str, accession: Optional[str] = None,
+                   concepts: Optional[Iterable[str]] = None) -> int:
+        """
+        Parses an XBRL instance in streaming mode and stores its facts.
+
+        Args:
+            xml_path (str): Path to the instance.
+            accession (str): Filing id; defaults to the file stem, as in
+            process_all_xml (aapl-20230930_htm.xml -> aapl-20230930).
+            concepts (Iterable[str]): Lowercase local names to keep; all
+            facts by default.
+
+        Returns:
+            int: Number of facts inserted.
+        """
+        if accession is None:
+            filename = os.path.basename(xml_path)
+            accession = filename.replace("_htm.xml", "").replace(".xml", "")
+        facts = iter_facts(iter_top_level(xml_path), concepts)
+        return self.insert_facts(accession, facts)
+
+    def ingest_directory(self, xml_folder: str,
+                         concepts: Optional[Iterable[str]] = None) -> int:
+        """Stores the facts of every .xml instance in `xml_folder`."""
+        total = 0
+        for filename in sorted(os.listdir(xml_folder)):
+            if filename.endswith(".xml"):
+                count = self.ingest_xml(os.path.join(xml_folder, filename),
+                                        concepts=concepts)
+                print(f"Stored {count} facts from {filename}")
+                total += count
+        return total
+
+    def query(self, ciks: Optional[List[str]] = None,
+              concepts: Optional[List[str]] = None,
+              start: Optional[str] = None, end: Optional[str] = None,
+              dimensional: bool = False) -> pd.DataFrame:
+        """
+        Returns the facts matching the filters as a DataFrame.
+
+        Args:
+            ciks (List[str]): 10-digit CIKs.
+            concepts (List[str]): Concept local names (e.g. "Revenues").
+            start (str): Only facts whose period end / instant is >= start
+            (YYYY-MM-DD).
+            end (str): Only facts whose period end / instant is <= end.
+            dimensional (bool): Include facts reported on dimensional
+            contexts (segments); by default only entity-wide facts.
+        """
+        clauses, params = [], []
+        if ciks:
+            clauses.append(f"cik IN ({','.join('?' * len(ciks))})")
+            params += list(ciks)
+        if concepts:
+            clauses.append(f"concept IN ({','.join('?' * len(concepts))})")
+            params += list(concepts)
+        if start:
+            clauses.append("COALESCE(period_end, instant) >= ?")
+            params.append(start)
+        if end:
+            clauses.append("COALESCE(period_end, instant) <= ?")
+            params.append(end)
+        if not dimensional:
+            clauses.append("dimensions = ''")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return pd.read_sql_query(f"SELECT * FROM facts {where}", self.conn,
+                                 params=params)
+
+
+if __name__ == "__main__":
+    XML_FOLDER = "dataset/xml_reports"
+    DB_PATH = "dataset/xbrl_facts.sqlite"
+
+    with FactStore(DB_PATH) as store:
+        total = store.ingest_directory(XML_FOLDER)
+    print(f"Stored {total} facts in {DB_PATH}")
@@ -0,0 +1,430 @@
+"""
+Module: filing_catalog
+Description: Persistent catalog of every filing in dataset/index_json/, for
+"filings of these CIKs and forms in this date range" lookups without
+re-reading the submissions files or the per-form CSVs.
+
+The catalog is one Parquet file sorted by (cik, filing_date). Dates are
+stored typed, cik / form / fiscal_period dictionary-encoded, and the period
+columns are computed once when the catalog is built:
+
+    filing_year, filing_quarter   calendar year and quarter of filing_date
+    fiscal_year, fiscal_period    fiscal year and FY / Q1..Q4 of the period
+                                  the filing reports on, from reportDate and
+                                  the company's fiscalYearEnd
+
+Queries use two in-memory indexes: the row range of every CIK (the file is
+sorted by CIK, then by date, so a date range inside a CIK is a binary
+search) and a permutation of the rows by filing date for queries without
+CIKs. The catalog is rebuilt by `load_catalog` when a file of the index
+directory is added, removed or modified.
+"""
+
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from src.extract_filings import CATALOG_SOURCE_COLUMNS, collect_filings
+
+CATALOG_FILENAME = "filing_catalog.parquet"
+
+# Bump when the catalog layout changes; older catalogs are rebuilt.
+CATALOG_VERSION = 2
+
+# Parquet schema metadata key holding the version and source signature
+METADATA_KEY = b"filing_catalog"
+
+CATALOG_COLUMNS = ["cik", "accession_number", "form", "filing_date",
+                   "report_date", "filing_year", "filing_quarter",
+                   "fiscal_year", "fiscal_period", "fiscal_year_end",
+                   "filing_url"]
+
+CATEGORY_COLUMNS = ["cik", "form", "fiscal_period", "fiscal_year_end"]
+
+# Forms covering a whole fiscal year (amendments included)
+ANNUAL_FORMS = frozenset(["10-K", "10-KT", "10-K405", "20-F", "40-F"])
+
+# 52/53-week years end up to a week after the nominal fiscalYearEnd
+# (Apple: "0927", fiscal 2023 ended on 2023-09-30; J&J: "1229", fiscal
+# 2022 ended on 2023-01-01).
+FISCAL_YEAR_END_TOLERANCE = np.timedelta64(7, "D")
+
+DAYS_PER_QUARTER = 365.25 / 4
+
+# Sorted by cik then filing_date: row groups of this size let Parquet
+# readers skip groups by their cik statistics.
+ROW_GROUP_SIZE = 256 * 1024
+
+DateLike = Union[str, pd.Timestamp, np.datetime64, None]
+
+_catalogs: Dict[str, Tuple[Tuple, "FilingCatalog"]] = {}
+_catalogs_lock = threading.Lock()
+
+
+def _fiscal_year_end_dates(years: np.ndarray, month: np.ndarray,
+                           day: np.ndarray) -> np.ndarray:
+    """
+    Dates (datetime64[D]) on which fiscal years ending in `years` end, for
+    fiscalYearEnd month / day pairs; the day is clipped to the month length
+    ("0229" ends on Feb 28 in common years).
+    """
+    month_start = ((years - 1970).astype("datetime64[Y]")
+                   .astype("datetime64[M]")
+                   + (month - 1).astype("timedelta64[M]"))
+    days_in_month = ((month_start + np.timedelta64(1, "M")).astype(
+        "datetime64[D]") - month_start.astype("datetime64[D]")).astype(int)
+    return month_start.astype("datetime64[D]") + (
+        np.minimum(day, days_in_month) - 1).astype("timedelta64[D]")
+
+
+def fiscal_periods(report_date: pd.Series, fiscal_year_end: pd.Series,
+                   form: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Fiscal year and period of each filing, vectorized.
+
+    The fiscal year is the calendar year in which the fiscal year containing
+    the report date ends (fiscalYearEnd "0131": a report dated 2024-01-31
+    is fiscal 2024, as the filers label it). Year ends up to a week past
+    the nominal date, even across January 1st, belong to the year that
+    just ended. The period comes from the
+    distance between the report date and that fiscal year end, in quarters:
+    annual forms ending with the year are "FY", other filings "Q1".."Q4".
+    Filings without a report date, or of companies without fiscalYearEnd,
+    get missing values. fiscalYearEnd is the company's current one; older
+    filings of companies that changed it are classified with the new one.
+
+    Args:
+        report_date (pd.Series): Period end dates (datetime64).
+        fiscal_year_end (pd.Series): "MMDD" strings, one per filing.
+        form (pd.Series): Form types.
+
+    Returns:
+        Tuple[pd.Series, pd.Series]: fiscal_year (Int16) and fiscal_period.
+    """
+    fye = fiscal_year_end.astype("string").str.zfill(4)
+    month = pd.to_numeric(fye.str[:2], errors="coerce")
+    day = pd.to_numeric(fye.str[2:4], errors="coerce")
+    valid = (report_date.notna() & month.between(1, 12)
+             & day.between(1, 31)).to_numpy()
+
+    dates = report_date.to_numpy(dtype="datetime64[D]")
+    month = month.fillna(12).to_numpy(dtype="int64")
+    day = day.fillna(31).to_numpy(dtype="int64")
+    calendar_year = np.where(valid, dates.astype("datetime64[Y]").astype(
+        "int64") + 1970, 1970)
+
+    # A 52/53-week year may end a few days after its nominal date, in the
+    # next calendar year too (J&J "1229": fiscal 2022 ended on 2023-01-01)
+    previous_year_end = _fiscal_year_end_dates(calendar_year - 1, month, day)
+    same_year_end = _fiscal_year_end_dates(calendar_year, month, day)
+    fiscal_year = (calendar_year
+                   - (dates <= previous_year_end + FISCAL_YEAR_END_TOLERANCE)
+                   + (dates > same_year_end + FISCAL_YEAR_END_TOLERANCE))
+    days_to_end = (_fiscal_year_end_dates(fiscal_year, month, day)
+                   - dates).astype("timedelta64[D]").astype("int64")
+    quarter = np.clip(4 - np.rint(days_to_end / DAYS_PER_QUARTER), 1, 4)
+
+    annual = form.str.replace("/A", "", regex=False).isin(
+        ANNUAL_FORMS).to_numpy()
+    period = np.where(annual & (quarter == 4), "FY",
+                      np.char.add("Q", quarter.astype(int).astype(str)))
+    index = report_date.index
+    return (pd.Series(fiscal_year, index=index, dtype="Int16")
+            .where(valid),
+            pd.Series(period, index=index, dtype="string").where(valid))
+
+
+def catalog_frame(filings: pd.DataFrame) -> pd.DataFrame:
+    """
+    Typed catalog rows, sorted by (cik, filing_date), from filings with
+    CATALOG_SOURCE_COLUMNS (report_date and fiscal_year_end may be missing,
+    e.g. when the filings come from the per-form CSVs).
+    """
+    df = filings.reindex(columns=CATALOG_SOURCE_COLUMNS)
+    filing_date = pd.to_datetime(df["filing_date"], format="%Y-%m-%d",
+                                 errors="coerce")
+    report_date = pd.to_datetime(df["report_date"], format="%Y-%m-%d",
+                                 errors="coerce")
+    form = df["form"].astype("string")
+    fiscal_year, fiscal_period = fiscal_periods(
+        report_date, df["fiscal_year_end"], form)
+
+    df = pd.DataFrame({
+        "cik": df["cik"].astype("string").str.zfill(10),
+        "accession_number": df["accession_number"].astype("string"),
+        "form": form,
+        "filing_date": filing_date,
+        "report_date": report_date,
+        "filing_year": filing_date.dt.year.astype("Int16"),
+        "filing_quarter": filing_date.dt.quarter.astype("Int8"),
+        "fiscal_year": fiscal_year,
+        "fiscal_period": fiscal_period,
+        "fiscal_year_end": df["fiscal_year_end"].astype("string"),
+        "filing_url": df["filing_url"].astype("string"),
+    })
+    df = df.sort_values(["cik", "filing_date"], kind="stable")
+    for column in CATEGORY_COLUMNS:
+        # str categories: what Parquet dictionaries are read back as
+        df[column] = df[column].astype("str").astype("category")
+    return df.reset_index(drop=True)
+
+
+def _as_date(value: DateLike, unit: np.dtype) -> Optional[np.datetime64]:
+    if value is None:
+        return None
+    return np.datetime64(pd.Timestamp(value)).astype(unit)
+
+
+def _as_set(values: Union[str, int, Iterable, None]) -> Optional[List]:
+    if values is None:
+        return None
+    if isinstance(values, (str, int)):
+        return [values]
+    return list(values)
+
+
+class FilingCatalog:
+    """
+    Filing catalog with CIK and filing date indexes.
+
+    Args:
+        df (pd.DataFrame): Catalog rows as built by `catalog_frame` (sorted
+        by cik, then filing_date).
+        signature (Tuple): Source signature stored with the catalog.
+    """
+
+    def __init__(self, df: pd.DataFrame, signature: Tuple = ()):
+        self.df = df
+        self.signature = tuple(signature)
+        self._dates = df["filing_date"].to_numpy()
+        self._fiscal_years = df["fiscal_year"].to_numpy(dtype="float64",
+                                                        na_value=np.nan)
+        # Rows ordered by filing date and their dates, built on first use
+        self._by_date: Optional[np.ndarray] = None
+        self._sorted_dates: Optional[np.ndarray] = None
+
+        # Row range of each CIK: the rows are sorted by cik
+        codes = df["cik"].cat.codes.to_numpy()
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        stops = np.append(starts[1:], len(codes))
+        categories = df["cik"].cat.categories
+        self._cik_rows: Dict[str, Tuple[int, int]] = {
+            categories[codes[start]]: (int(start), int(stop))
+            for start, stop in zip(starts, stops)}
+
+    @classmethod
+    def from_filings(cls, filings: pd.DataFrame,
+                     signature: Tuple = ()) -> "FilingCatalog":
+        """Builds a catalog from a filings DataFrame (see `catalog_frame`)."""
+        return cls(catalog_frame(filings), signature)
+
+    @classmethod
+    def build(cls, index_json_dir: str,
+              forms: Optional[Iterable[str]] = None,
+              max_workers: Optional[int] = None) -> "FilingCatalog":
+        """
+        Builds a catalog from every submissions file (and cached history
+        page) in `index_json_dir`.
+
+        Args:
+            index_json_dir (str): Directory containing CIK index.json files.
+            forms (Iterable[str]): Form types to keep (every form by
+            default).
+            max_workers (int): Worker processes (see
+            `extract_filings.collect_filings`).
+        """
+        filings = collect_filings(index_json_dir, forms, max_workers,
+                                  CATALOG_SOURCE_COLUMNS)
+        return cls.from_filings(filings,
+                                _source_signature(index_json_dir, forms))
+
+    @classmethod
+    def load(cls, path: str) -> "FilingCatalog":
+        """Reads a catalog written by `save`."""
+        table = pq.read_table(path)
+        metadata = json.loads(table.schema.metadata[METADATA_KEY])
+        if metadata.get("version") != CATALOG_VERSION:
+            raise ValueError(f"{path}: catalog version "
+                             f"{metadata.get('version')}, expected "
+                             f"{CATALOG_VERSION}")
+        # One chunk per column: row lookups on the string columns of a
+        # chunked table cost a search through the chunks for every row
+        return cls(table.combine_chunks().to_pandas(),
+                   tuple(metadata.get("signature", ())))
+
+    def save(self, path: str) -> None:
+        """Writes the catalog to a Parquet file (atomically)."""
+        table = pa.Table.from_pandas(self.df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[METADATA_KEY] = json.dumps({
+            "version": CATALOG_VERSION,
+            "signature": list(self.signature)}).encode()
+        table = table.replace_schema_metadata(metadata)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @property
+    def ciks(self) -> List[str]:
+        """CIKs with at least one filing, in catalog order."""
+        return list(self._cik_rows)
+
+    def _date_slice(self, start: int, stop: int,
+                    first: Optional[np.datetime64],
+                    last: Optional[np.datetime64]) -> Tuple[int, int]:
+        """Narrows the rows [start, stop) of one CIK to a date range."""
+        dates = self._dates[start:stop]
+        lo = 0 if first is None else np.searchsorted(dates, first, "left")
+        hi = len(dates) if last is None \
+            else np.searchsorted(dates, last, "right")
+        return start + int(lo), start + int(hi)
+
+    def _rows(self, ciks: Optional[List], first: Optional[np.datetime64],
+              last: Optional[np.datetime64]) -> np.ndarray:
+        """Row positions matching the CIKs and filing date range."""
+        if ciks is not None:
+            ranges = []
+            for cik in ciks:
+                rows = self._cik_rows.get(str(cik).zfill(10))
+                if rows is not None:
+                    ranges.append(self._date_slice(*rows, first, last))
+            if not ranges:
+                return np.empty(0, dtype=np.int64)
+            return np.concatenate([np.arange(lo, hi) for lo, hi in ranges])
+
+        if first is None and last is None:
+            return np.arange(len(self.df))
+        if self._by_date is None:
+            self._by_date = np.argsort(self._dates, kind="stable")
+            self._sorted_dates = self._dates[self._by_date]
+        dates = self._sorted_dates
+        lo = 0 if first is None else np.searchsorted(dates, first, "left")
+        hi = len(dates) if last is None \
+            else np.searchsorted(dates, last, "right")
+        return np.sort(self._by_date[lo:hi])
+
+    def query(self, ciks: Union[str, Iterable[str], None] = None,
+              forms: Union[str, Iterable[str], None] = None,
+              start: DateLike = None, end: DateLike = None,
+              fiscal_year: Union[int, Iterable[int], None] = None,
+              fiscal_period: Union[str, Iterable[str], None] = None
+              ) -> pd.DataFrame:
+        """
+        Filings matching every given filter, sorted by (cik, filing_date).
+
+        Args:
+            ciks (str | Iterable[str]): CIKs, padded or not.
+            forms (str | Iterable[str]): Form types.
+            start (str | Timestamp): First filing date (inclusive).
+            end (str | Timestamp): Last filing date (inclusive).
+            fiscal_year (int | Iterable[int]): Fiscal years.
+            fiscal_period (str | Iterable[str]): "FY", "Q1".."Q4".
+
+        Returns:
+            pd.DataFrame: Catalog rows (CATALOG_COLUMNS).
+        """
+        unit = self._dates.dtype
+        rows = self._rows(_as_set(ciks), _as_date(start, unit),
+                          _as_date(end, unit))
+
+        filters = [("form", _as_set(forms)),
+                   ("fiscal_period", _as_set(fiscal_period))]
+        for column, values in filters:
+            if values is not None and len(rows):
+                categories = self.df[column].cat.categories
+                wanted = categories.get_indexer(values)
+                codes = self.df[column].cat.codes.to_numpy()[rows]
+                rows = rows[np.isin(codes, wanted[wanted >= 0])]
+        years = _as_set(fiscal_year)
+        if years is not None and len(rows):
+            rows = rows[np.isin(self._fiscal_years[rows], years)]
+        return self.df.iloc[rows].reset_index(drop=True)
+
+
+def default_catalog_path(index_json_dir: str) -> str:
+    """The catalog of dataset/index_json is dataset/filing_catalog.parquet."""
+    parent = os.path.dirname(os.path.abspath(index_json_dir))
+    return os.path.join(parent, CATALOG_FILENAME)
+
+
+def _source_signature(index_json_dir: str,
+                      forms: Optional[Iterable[str]] = None) -> Tuple:
+    # The directory mtime only changes when files are added, removed or
+    # replaced; a file overwritten in place (cp, an editor) only changes its
+    # own mtime and size. Bookkeeping files (_refresh_index.json) and
+    # in-progress .tmp files are left out.
+    count = size = mtime_ns = 0
+    with os.scandir(index_json_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json") \
+                    or entry.name.startswith("_"):
+                continue
+            stat = entry.stat()
+            count += 1
+            size += stat.st_size
+            mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+    return (os.path.abspath(index_json_dir),
+            os.stat(index_json_dir).st_mtime_ns, count, size, mtime_ns,
+            ",".join(sorted(forms)) if forms is not None else "*")
+
+
+def load_catalog(index_json_dir: str, catalog_path: Optional[str] = None,
+                 forms: Optional[Iterable[str]] = None,
+                 max_workers: Optional[int] = None,
+                 rebuild: bool = False) -> FilingCatalog:
+    """
+    Loads the catalog of `index_json_dir`, or builds it (and rewrites the
+    catalog file) when the file is missing, was built with other forms or
+    the index directory has changed since.
+
+    Args:
+        index_json_dir (str): Directory containing CIK index.json files.
+        catalog_path (str): Catalog file (default: filing_catalog.parquet
+        next to the index directory).
+        forms (Iterable[str]): Form types to keep (every form by default).
+        max_workers (int): Worker processes used to build the catalog.
+        rebuild (bool): Build the catalog even if the file is current.
+    """
+    catalog_path = catalog_path or default_catalog_path(index_json_dir)
+    forms = None if forms is None else tuple(dict.fromkeys(forms))
+    signature = _source_signature(index_json_dir, forms)
+    if not rebuild and os.path.exists(catalog_path):
+        try:
+            catalog = FilingCatalog.load(catalog_path)
+            if catalog.signature == signature:
+                return catalog
+        except Exception as e:
+            print(f"Ignoring unreadable filing catalog: {e}")
+
+    catalog = FilingCatalog.build(index_json_dir, forms, max_workers)
+    try:
+        catalog.save(catalog_path)
+        print(f"Saved filing catalog ({len(catalog)} filings) to "
+              f"{catalog_path}")
+    except OSError as e:
+        print(f"Could not write filing catalog {catalog_path}: {e}")
+    return catalog
+
+
+def get_catalog(index_json_dir: str,
+                catalog_path: Optional[str] = None) -> FilingCatalog:
+    """
+    Shared catalog of `index_json_dir` (every form), loaded on first use
+    and reloaded only if the index directory changes.
+    """
+    key = os.path.abspath(catalog_path
+                          or default_catalog_path(index_json_dir))
+    signature = _source_signature(index_json_dir)
+    with _catalogs_lock:
+        cached = _catalogs.get(key)
+        if cached is None or cached[0] != signature:
+            cached = (signature, load_catalog(index_json_dir, catalog_path))
+            _catalogs[key] = cached
+    return cached[1]
@@ -6,7 +6,7 @@ CIK, ticker, and company name.
 
 import json
 import pandas as pd
-from typing import List, Dict
+from typing import Dict
 
 
 def load_company_list(json_path: str) -> pd.DataFrame:
@@ -22,22 +22,20 @@ def load_company_list(json_path: str) -> pd.DataFrame:
     with open(json_path, 'r') as f:
         data: Dict = json.load(f)
 
-    companies: List[Dict[str, str]] = []
-    for item in data.values():
-        cik_str = str(item['cik_str']).zfill(10)  # Pad CIK to 10 digits
-        companies.append({
-            'cik': cik_str,
-            'ticker': item['ticker'],
-            'title': item['title']
-        })
-
-    df = pd.DataFrame(companies)
+    # Column-wise build; the JSON keys ("0", "1", ...) keep the SEC order
+    items = list(data.values())
+    df = pd.DataFrame({
+        'cik': [str(item['cik_str']) for item in items],
+        'ticker': [item['ticker'] for item in items],
+        'title': [item['title'] for item in items]
+    })
+    df['cik'] = df['cik'].str.zfill(10)  # Pad CIK to 10 digits
     return df
 
 
 if __name__ == "__main__":
-    input_path = "../dataset/company_tickers.json"
-    output_path = "../dataset/company_list.csv"
+    input_path = "dataset/company_tickers.json"
+    output_path = "dataset/company_list.csv"
 
     df_companies = load_company_list(input_path)
     print(df_companies.head())
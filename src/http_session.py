@@ -0,0 +1,77 @@
+"""
+Module: http_session
+Description: Session factory shared by every pipeline stage. A single
+requests.Session keeps one keep-alive connection pool per SEC host
+(data.sec.gov, www.sec.gov), so a bulk run pays the TCP/TLS handshake once
+per connection instead of once per request. Responses are requested with
+gzip and decompressed transparently, and every request carries the same
+identity header, as required by the SEC fair-access policy.
+"""
+
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+USER_AGENT = ("Alberto Paramio Galisteo (aparamio@uoc.edu) - "
+              "SEC Scraper for academic use")
+
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept-Encoding": "gzip, deflate"
+}
+
+# Number of hosts whose pools are kept alive, and connections per host.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_maxsize: int = POOL_MAXSIZE) -> "requests.Session":
+    """
+    Creates a session with the SEC identity headers and pooled adapters.
+
+    Retries are not configured here; they are handled by
+    `src.downloader.fetch` so they share the rate limiter.
+
+    Args:
+        pool_maxsize (int): Maximum keep-alive connections per host. Should
+        be at least the number of concurrent download threads.
+
+    Returns:
+        requests.Session: Configured session.
+    """
+    # Imported here so that importing this module (e.g. for HEADERS) stays
+    # cheap for commands that never open a session
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                          pool_maxsize=pool_maxsize, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> "requests.Session":
+    """Returns the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def close_session() -> None:
+    """Closes the process-wide session and its pooled connections."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,381 @@
+"""
+Module: metrics
+Description: In-process instrumentation shared by every pipeline stage.
+Counters (requests, bytes, status classes, retries, jobs), gauges (queue
+depths, with their peak) and histograms (request latency per host, parse
+time per file, time per job) are kept in one thread-safe registry per
+process. At the end of a run the registry is written as a JSON summary
+and, optionally, in the Prometheus text format, either to a file (for the
+node_exporter textfile collector) or served over HTTP.
+
+Only the standard library is used, so importing this module is cheap.
+Metrics recorded inside process-pool workers stay in those workers; the
+stages that use process pools record their measurements in the parent.
+"""
+
+import os
+import json
+import time
+import heapq
+import bisect
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PREFIX = "sec_scraper_"
+
+# Upper bounds, in seconds, of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+# Files kept in the "slowest_files" list of the JSON summary
+SLOWEST_FILES = 20
+
+HELP = {
+    "http_requests_total": "HTTP attempts by host and status class "
+                           "(2xx, 3xx, 4xx, 5xx, error)",
+    "http_response_bytes_total": "Decoded response bytes by host",
+    "http_retries_total": "Retried attempts by host and reason",
+    "http_request_seconds": "Time to the response headers by host",
+    "rate_limit_wait_seconds_total": "Time spent waiting for the shared "
+                                     "rate limiter",
+    "queue_depth": "Work items queued and not yet started",
+    "jobs_total": "Pipeline jobs processed by stage and outcome",
+    "job_seconds": "Time per pipeline job by stage",
+    "parse_files_total": "XBRL instances parsed",
+    "parse_facts_total": "Facts extracted from XBRL instances",
+    "parse_bytes_total": "Bytes of XBRL instances parsed",
+    "parse_seconds": "Parse time per XBRL instance",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket histogram with exact count, sum, min and max."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "mean": round(self.sum / self.count, 6),
+                "min": round(self.min, 6), "max": round(self.max, 6),
+                "p50": round(self.quantile(0.5), 6),
+                "p90": round(self.quantile(0.9), 6),
+                "p99": round(self.quantile(0.99), 6)}
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and histograms.
+
+    Every metric is identified by a name and keyword labels, e.g.
+    `metrics.inc("http_requests_total", host="data.sec.gov", status="2xx")`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._counters: Dict[Tuple[str, Labels], float] = {}
+            self._gauges: Dict[Tuple[str, Labels], List[float]] = {}
+            self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+            self._slowest: List[Tuple[float, int, Dict]] = []
+            self._files = 0
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, object]) -> Tuple[str, Labels]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Adds `value` to a counter."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Sets a gauge; its peak value is kept alongside."""
+        key = self._key(name, labels)
+        with self._lock:
+            gauge = self._gauges.setdefault(key, [0.0, value])
+            gauge[0] = value
+            gauge[1] = max(gauge[1], value)
+
+    def add_gauge(self, name: str, delta: float, **labels) -> None:
+        """Moves a gauge by `delta`."""
+        key = self._key(name, labels)
+        with self._lock:
+            gauge = self._gauges.setdefault(key, [0.0, 0.0])
+            gauge[0] += delta
+            gauge[1] = max(gauge[1], gauge[0])
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Records a value (seconds) in a histogram."""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observes the wall time of the `with` block in a histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_parse(self, source: str, seconds: float, facts: int,
+                     size: Optional[int] = None) -> None:
+        """
+        Records the parse of one XBRL instance. Files are aggregated in the
+        counters and the parse_seconds histogram; the slowest ones are
+        also listed by name in the JSON summary.
+
+        Args:
+            source (str): File name or accession number.
+            seconds (float): Parse time.
+            facts (int): Facts extracted.
+            size (int): Bytes of the instance, if known.
+        """
+        self.observe("parse_seconds", seconds)
+        self.inc("parse_files_total")
+        self.inc("parse_facts_total", facts)
+        if size is not None:
+            self.inc("parse_bytes_total", size)
+        entry = {"file": source, "seconds": round(seconds, 4),
+                 "facts": facts,
+                 "facts_per_second": round(facts / seconds, 1)
+                 if seconds > 0 else None}
+        if size is not None:
+            entry["bytes"] = size
+        with self._lock:
+            self._files += 1
+            item = (seconds, self._files, entry)
+            if len(self._slowest) < SLOWEST_FILES:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+    def counter(self, name: str, **labels) -> float:
+        """Current value of a counter (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0.0)
+
+    def total(self, name: str) -> float:
+        """Sum of a counter over all its label sets."""
+        with self._lock:
+            return sum(value for (n, _), value in self._counters.items()
+                       if n == name)
+
+    def summary(self) -> Dict:
+        """JSON-serializable snapshot of every metric."""
+        with self._lock:
+            elapsed = time.time() - self.started
+            counters = {_series(n, l): round(v, 6)
+                        for (n, l), v in sorted(self._counters.items())}
+            gauges = {_series(n, l): {"value": v, "peak": peak}
+                      for (n, l), (v, peak) in sorted(self._gauges.items())}
+            histograms = {_series(n, l): h.summary()
+                          for (n, l), h in sorted(self._histograms.items())}
+            slowest = [entry for _, _, entry in
+                       sorted(self._slowest, reverse=True)]
+            totals: Dict[str, float] = {}
+            for (n, _), v in self._counters.items():
+                totals[n] = totals.get(n, 0.0) + v
+            parse_seconds = sum(h.sum for (n, _), h
+                                in self._histograms.items()
+                                if n == "parse_seconds")
+
+        requests = totals.get("http_requests_total", 0.0)
+        facts = totals.get("parse_facts_total", 0.0)
+        return {
+            "started": datetime.fromtimestamp(
+                self.started, timezone.utc).isoformat(timespec="seconds"),
+            "elapsed_seconds": round(elapsed, 3),
+            "rates": {
+                "requests_per_second": round(requests / elapsed, 2)
+                if elapsed > 0 else 0.0,
+                "response_mb_per_second": round(
+                    totals.get("http_response_bytes_total", 0.0) / 1e6
+                    / elapsed, 3) if elapsed > 0 else 0.0,
+                "facts_per_parse_second": round(facts / parse_seconds, 1)
+                if parse_seconds > 0 else 0.0,
+            },
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+            "slowest_files": slowest,
+        }
+
+    def to_prometheus(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items())
+
+        lines: List[str] = []
+        declared = set()
+
+        def declare(name: str, kind: str) -> None:
+            if name not in declared:
+                declared.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{PREFIX}{_series(name, labels)} {value:g}")
+        for (name, labels), (value, peak) in gauges:
+            declare(name, "gauge")
+            lines.append(f"{PREFIX}{_series(name, labels)} {value:g}")
+        for (name, labels), (value, peak) in gauges:
+            declare(f"{name}_peak", "gauge")
+            lines.append(f"{PREFIX}{_series(name + '_peak', labels)} "
+                         f"{peak:g}")
+        for (name, labels), histogram in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{PREFIX}"
+                             f"{_series(name + '_bucket', labels, le=bound)}"
+                             f" {cumulative}")
+            lines.append(f"{PREFIX}"
+                         f"{_series(name + '_bucket', labels, le='+Inf')}"
+                         f" {histogram.count}")
+            lines.append(f"{PREFIX}{_series(name + '_sum', labels)} "
+                         f"{histogram.sum:g}")
+            lines.append(f"{PREFIX}{_series(name + '_count', labels)} "
+                         f"{histogram.count}")
+        return "".join(line + "\n" for line in lines)
+
+
+def _series(name: str, labels: Labels, **extra) -> str:
+    """name{label="value",...} with the label values escaped."""
+    pairs = list(labels) + [(k, str(v)) for k, v in extra.items()]
+    if not pairs:
+        return name
+    body = ",".join('{}="{}"'.format(
+        k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs)
+    return f"{name}{{{body}}}"
+
+
+_default_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Returns the process-wide registry shared by all stages."""
+    return _default_metrics
+
+
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_json_summary(path: str, metrics: Optional[Metrics] = None) -> None:
+    """Writes the JSON summary of `metrics` (default: the shared one)."""
+    summary = (metrics or get_metrics()).summary()
+    _write_atomic(path, json.dumps(summary, indent=1))
+
+
+def write_prometheus(path: str, metrics: Optional[Metrics] = None) -> None:
+    """
+    Writes `metrics` in the Prometheus text format. The file is replaced
+    atomically, as the node_exporter textfile collector expects.
+    """
+    _write_atomic(path, (metrics or get_metrics()).to_prometheus())
+
+
+def export_periodically(path: str, interval: float = 15.0,
+                        metrics: Optional[Metrics] = None
+                        ) -> threading.Event:
+    """
+    Rewrites the Prometheus file every `interval` seconds from a daemon
+    thread, so a long run can be watched while it goes.
+
+    Returns:
+        threading.Event: Set it to stop the thread; write the final values
+        with `write_prometheus`.
+    """
+    stop = threading.Event()
+
+    def loop() -> None:
+        while not stop.wait(interval):
+            write_prometheus(path, metrics)
+
+    threading.Thread(target=loop, name="metrics-export", daemon=True).start()
+    return stop
+
+
+def serve_prometheus(port: int, host: str = "127.0.0.1",
+                     metrics: Optional[Metrics] = None
+                     ) -> ThreadingHTTPServer:
+    """
+    Serves `metrics` at http://host:port/metrics from a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: Call shutdown() on it to stop serving.
+    """
+    registry = metrics or get_metrics()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http",
+                     daemon=True).start()
+    return server
@@ -0,0 +1,441 @@
+"""
+Module: pipeline
+Description: Resumable orchestrator for the scraping pipeline. Every company
+and filing is a job in a local SQLite table that moves through four stages:
+
+    index    download the submissions index.json (and history pages) of a CIK
+    filings  extract the filings of the requested forms from that index
+    xml      download the XBRL instance of a filing
+    parse    store the facts of the instance in the FactStore
+
+A finished job enqueues its follow-up jobs in the same transaction, so the
+table always says exactly what is left to do. Jobs are claimed atomically,
+so several threads (or several orchestrator processes sharing the database)
+can work on a stage at once. After an interruption, running the pipeline
+again only retries failed jobs and jobs whose claim has expired; everything
+already done is skipped.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import pandas as pd
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from src.document_cache import DocumentCache
+from src.downloader import DEFAULT_MAX_WORKERS
+from src.download_index_json import (clean_cik, download_index_json,
+                                     download_history_page, history_page_url,
+                                     list_history_pages, load_refresh_index,
+                                     save_refresh_index, submissions_url)
+from src.download_xml_reports import (download_xml_report,
+                                      transform_htm_to_xml_url)
+from src.extract_filings import (DEFAULT_FORMS, extract_filings_from_cache,
+                                 extract_filings_from_file)
+from src.fact_store import FactStore
+from src.metrics import get_metrics
+from src.xbrl_parser import iter_facts, iter_top_level
+
+STAGES = ["index", "filings", "xml", "parse"]
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+# A running job whose claim is older than this is considered abandoned
+# (its worker crashed or was killed) and is handed out again.
+DEFAULT_LEASE_SECONDS = 30 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    stage TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    claimed_at REAL,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (stage, key)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_stage_status ON jobs (stage, status);
+"""
+
+# (stage, {key: payload}) jobs to enqueue when a job completes
+Children = Optional[Tuple[str, Dict[str, Dict]]]
+
+
+class JobStore:
+    """
+    SQLite table of pipeline jobs keyed by (stage, key).
+
+    Safe to use from several threads or processes: every call opens its
+    own connection and claims are single UPDATE statements.
+
+    Args:
+        db_path (str): Database file (created if missing).
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, stage: str,
+                jobs: Dict[str, Dict]) -> int:
+        now = time.time()
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO jobs (stage, key, payload, status, "
+            "updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(stage, key, json.dumps(payload), PENDING, now)
+             for key, payload in jobs.items()])
+        return cursor.rowcount
+
+    def add(self, stage: str, jobs: Dict[str, Dict]) -> int:
+        """
+        Enqueues jobs that are not in the table yet; existing jobs keep
+        their status.
+
+        Returns:
+            int: Number of new jobs.
+        """
+        with self._connect() as conn:
+            return self._insert(conn, stage, jobs)
+
+    def claim(self, stage: str, worker: str) -> Optional[Tuple[str, Dict]]:
+        """
+        Atomically takes the oldest pending job of `stage`.
+
+        Returns:
+            Tuple[str, Dict]: Key and payload, or None if nothing is pending.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, "
+                "worker = ?, claimed_at = ?, updated_at = ? "
+                "WHERE rowid = (SELECT rowid FROM jobs WHERE stage = ? "
+                "AND status = ? ORDER BY rowid LIMIT 1) "
+                "RETURNING key, payload",
+                (RUNNING, worker, now, now, stage, PENDING)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def complete(self, stage: str, key: str, children: Children = None) -> None:
+        """Marks a job as done and enqueues its follow-up jobs."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = NULL, updated_at = ? "
+                "WHERE stage = ? AND key = ?", (DONE, time.time(), stage, key))
+            if children:
+                self._insert(conn, *children)
+
+    def fail(self, stage: str, key: str, error: str) -> None:
+        """Marks a job as failed; `requeue` decides whether it is retried."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE stage = ? AND key = ?",
+                (FAILED, error, time.time(), stage, key))
+
+    def release(self, stage: str, key: str, worker: str) -> None:
+        """
+        Gives back a job claimed by `worker` that was interrupted before it
+        could finish (Ctrl-C, SystemExit...): it is pending again and the
+        interrupted attempt is not counted.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE stage = ? AND key = ? AND status = ? AND worker = ?",
+                (PENDING, time.time(), stage, key, RUNNING, worker))
+
+    def release_run(self, stage: str, run: str) -> int:
+        """
+        Gives back every job of `stage` still claimed by the workers of a
+        run (named "<run>-<n>"), as `release` does.
+
+        Returns:
+            int: Number of jobs released.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE stage = ? AND status = ? AND worker LIKE ?",
+                (PENDING, time.time(), stage, RUNNING, f"{run}-%"))
+            return cursor.rowcount
+
+    def requeue(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                lease_seconds: float = DEFAULT_LEASE_SECONDS) -> int:
+        """
+        Makes failed jobs with attempts left, and running jobs whose claim
+        has expired, pending again. Expired running jobs without attempts
+        left are marked as failed.
+
+        Returns:
+            int: Number of jobs requeued.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, error = ?, "
+                "updated_at = ? WHERE status = ? AND claimed_at < ? "
+                "AND attempts >= ?",
+                (FAILED, "claim expired (worker interrupted or killed)", now,
+                 RUNNING, now - lease_seconds, max_attempts))
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, updated_at = ? "
+                "WHERE attempts < ? AND (status = ? OR "
+                "(status = ? AND claimed_at < ?))",
+                (PENDING, now, max_attempts, FAILED, RUNNING,
+                 now - lease_seconds))
+            return cursor.rowcount
+
+    def reset(self, stage: str, keys: Iterable[str]) -> int:
+        """Sets jobs back to pending with a fresh attempt count."""
+        with self._connect() as conn:
+            cursor = conn.executemany(
+                "UPDATE jobs SET status = ?, attempts = 0, error = NULL, "
+                "updated_at = ? WHERE stage = ? AND key = ? AND status != ?",
+                [(PENDING, time.time(), stage, key, RUNNING) for key in keys])
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of jobs per stage and status."""
+        counts = {stage: {} for stage in STAGES}
+        with self._connect() as conn:
+            for stage, status, n in conn.execute(
+                    "SELECT stage, status, COUNT(*) FROM jobs "
+                    "GROUP BY stage, status"):
+                counts.setdefault(stage, {})[status] = n
+        return counts
+
+    def failures(self, stage: str) -> List[Tuple[str, int, str]]:
+        """(key, attempts, error) of the failed jobs of `stage`."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT key, attempts, error FROM jobs "
+                "WHERE stage = ? AND status = ? ORDER BY key",
+                (stage, FAILED)).fetchall()
+
+
+def run_stage(store: JobStore, stage: str,
+              handler: Callable[[str, Dict], Children],
+              max_workers: int = 1) -> int:
+    """
+    Claims and runs the pending jobs of `stage` until none are left.
+
+    `handler(key, payload)` does the work and returns the follow-up jobs to
+    enqueue; an exception marks the job as failed. With max_workers == 1
+    the jobs run in the calling thread. Jobs are counted per outcome and
+    timed in the shared metrics, and the queue_depth gauge of the stage
+    follows the pending jobs.
+
+    Returns:
+        int: Number of jobs processed (done or failed).
+    """
+    prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    processed = [0]
+    lock = threading.Lock()
+    metrics = get_metrics()
+    metrics.set_gauge("queue_depth", store.counts()[stage].get(PENDING, 0),
+                      queue=stage)
+
+    stop = threading.Event()
+
+    def work(worker: str) -> None:
+        while not stop.is_set():
+            job = store.claim(stage, worker)
+            if job is None:
+                return
+            metrics.add_gauge("queue_depth", -1, queue=stage)
+            key, payload = job
+            start = time.perf_counter()
+            settled = False
+            try:
+                try:
+                    store.complete(stage, key, handler(key, payload))
+                    outcome = DONE
+                except Exception as e:
+                    print(f"[{stage}] {key} failed: {e}")
+                    store.fail(stage, key, f"{type(e).__name__}: {e}")
+                    outcome = FAILED
+                settled = True
+            finally:
+                # Interrupted (KeyboardInterrupt, SystemExit...): the job
+                # goes back to pending instead of waiting for its lease
+                if not settled:
+                    store.release(stage, key, worker)
+                    metrics.add_gauge("queue_depth", 1, queue=stage)
+            metrics.observe("job_seconds", time.perf_counter() - start,
+                            stage=stage)
+            metrics.inc("jobs_total", stage=stage, outcome=outcome)
+            with lock:
+                processed[0] += 1
+
+    try:
+        if max_workers == 1:
+            work(f"{prefix}-0")
+        else:
+            threads = [threading.Thread(target=work,
+                                        args=(f"{prefix}-{i}",))
+                       for i in range(max_workers)]
+            for thread in threads:
+                thread.start()
+            try:
+                for thread in threads:
+                    thread.join()
+            except BaseException:
+                # Ctrl-C reaches this thread only: the workers finish the
+                # job in hand and claim no more
+                stop.set()
+                for thread in threads:
+                    thread.join()
+                raise
+    finally:
+        # Jobs of this run still claimed (e.g. a second Ctrl-C while the
+        # workers were finishing) go back to pending
+        released = store.release_run(stage, prefix)
+        if released:
+            print(f"[{stage}] {released} interrupted jobs back to pending")
+    return processed[0]
+
+
+def run_pipeline(companies_df: pd.DataFrame, db_path: str, index_dir: str,
+                 xml_dir: str, fact_db_path: str,
+                 forms: Iterable[str] = DEFAULT_FORMS,
+                 year: int = 0, max_workers: int = DEFAULT_MAX_WORKERS,
+                 cache: Optional[DocumentCache] = None,
+                 refresh: bool = False,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS
+                 ) -> Dict[str, Dict[str, int]]:
+    """
+    Runs (or resumes) the pipeline for the given companies.
+
+    Args:
+        companies_df (pd.DataFrame): Companies with 'cik' and 'ticker'.
+        db_path (str): Job database.
+        index_dir (str): Directory of the index.json files (also holds the
+        refresh index when `cache` is used).
+        xml_dir (str): Directory of the XBRL instances.
+        fact_db_path (str): FactStore database filled by the parse stage.
+        forms (Iterable[str]): Form types to download and parse.
+        year (int): Only filings filed in this year (0 = all years).
+        max_workers (int): Download threads for the network stages.
+        cache (DocumentCache): Keep documents in this cache instead of as
+        plain files.
+        refresh (bool): Download the index of every company again, with a
+        conditional GET, to pick up filings published since the last run.
+        Filings already processed are not repeated.
+        max_attempts (int): Attempts per job before it stays failed.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Job counts per stage and status; the run
+        is complete when `unfinished_jobs` of it is 0.
+    """
+    forms = tuple(dict.fromkeys(forms))
+    store = JobStore(db_path)
+    tickers = {clean_cik(cik): ticker for cik, ticker
+               in zip(companies_df["cik"], companies_df["ticker"])}
+
+    added = store.add("index", {cik: {"cik": cik} for cik in tickers})
+    if refresh:
+        store.reset("index", tickers)
+        store.reset("filings", tickers)
+    requeued = store.requeue(max_attempts)
+    print(f"{added} new companies, {requeued} jobs to retry.")
+
+    os.makedirs(index_dir, exist_ok=True)
+    os.makedirs(xml_dir, exist_ok=True)
+    refresh_index = load_refresh_index(index_dir)
+
+    def is_stored(path: str, url: str) -> bool:
+        return cache.has(url) if cache is not None else os.path.exists(path)
+
+    def index_job(cik: str, payload: Dict) -> Children:
+        download_index_json(cik, index_dir, refresh_index, cache)
+        if not is_stored(os.path.join(index_dir, f"{cik}.json"),
+                         submissions_url(cik)):
+            raise RuntimeError("index.json could not be downloaded")
+        for name in list_history_pages(cik, index_dir, cache):
+            download_history_page(name, index_dir, cache)
+            if not is_stored(os.path.join(index_dir, name),
+                             history_page_url(name)):
+                raise RuntimeError(f"history page {name} missing")
+        return "filings", {cik: {"cik": cik}}
+
+    def filings_job(cik: str, payload: Dict) -> Children:
+        if cache is not None:
+            df = extract_filings_from_cache(cache, cik, forms)
+        else:
+            df = extract_filings_from_file(
+                os.path.join(index_dir, f"{cik}.json"), forms)
+        if year != 0:
+            df = df[pd.to_datetime(df["filing_date"]).dt.year == year]
+        rows = df.to_dict("records")
+        for row in rows:
+            row["ticker"] = tickers.get(cik, "UNKNOWN")
+        print(f"[filings] {cik}: {len(rows)} filings")
+        return "xml", {row["accession_number"]: row for row in rows}
+
+    def xml_job(accession: str, payload: Dict) -> Children:
+        if not download_xml_report(payload, xml_dir, cache=cache):
+            raise RuntimeError("XBRL instance could not be downloaded")
+        return "parse", {accession: payload}
+
+    try:
+        run_stage(store, "index", index_job, max_workers)
+    finally:
+        save_refresh_index(refresh_index, index_dir)
+    run_stage(store, "filings", filings_job)
+    run_stage(store, "xml", xml_job, max_workers)
+
+    with FactStore(fact_db_path) as fact_store:
+        def parse_job(accession: str, payload: Dict) -> Children:
+            xml_url = transform_htm_to_xml_url(payload["filing_url"])
+            if cache is not None:
+                source = cache.open(xml_url)
+            else:
+                source = open(os.path.join(xml_dir,
+                                           os.path.basename(xml_url)), "rb")
+            start = time.perf_counter()
+            with source:
+                count = fact_store.insert_facts(
+                    accession, iter_facts(iter_top_level(source)),
+                    cik=payload["cik"])
+            get_metrics().record_parse(accession,
+                                       time.perf_counter() - start, count)
+            print(f"[parse] {accession}: {count} facts")
+            return None
+
+        # One writer: the FactStore connection belongs to this thread
+        run_stage(store, "parse", parse_job)
+
+    return store.counts()
+
+
+def unfinished_jobs(counts: Dict[str, Dict[str, int]]) -> int:
+    """Jobs left failed or running (claimed) after a run."""
+    return sum(statuses.get(FAILED, 0) + statuses.get(RUNNING, 0)
+               for statuses in counts.values())
+
+
+def print_status(counts: Dict[str, Dict[str, int]]) -> None:
+    """Prints the job counts per stage."""
+    for stage, statuses in counts.items():
+        summary = ", ".join(f"{n} {status}"
+                            for status, n in sorted(statuses.items()))
+        print(f"{stage:>8}: {summary or 'no jobs'}")
@@ -1,27 +1,33 @@
 # src/select_companies.py
 
-import pandas as pd
 import random
+from src.company_registry import COMPANY_TICKERS_JSON, get_registry
 
-def select_companies(modo):
-    df = pd.read_csv('company_list.csv')
+def select_companies(modo, tickers=None, sample_size=10,
+                     path=COMPANY_TICKERS_JSON):
+    # tickers: lista para el modo 1; si es None se piden por teclado.
+    # path: company_tickers.json o company_list.csv (vía el registro, que
+    # se carga una sola vez por proceso)
+    registry = get_registry(path)
+    df = registry.frame
 
     if modo == 0:
         print("Seleccionando TODAS las empresas del listado.")
         return df
 
     elif modo == 1:
-        print("Introduce los tickers deseados separados por coma "
-              "(ej: AAPL,MSFT,GOOG):")
-        input_str = input("Tickers: ").upper()
-        tickers = [ticker.strip() for ticker in input_str.split(',')]
-        seleccion = df[df['ticker'].isin(tickers)]
+        if tickers is None:
+            print("Introduce los tickers deseados separados por coma "
+                  "(ej: AAPL,MSFT,GOOG):")
+            input_str = input("Tickers: ").upper()
+            tickers = input_str.split(',')
+        seleccion = registry.select_tickers(tickers)
         print(f"{len(seleccion)} compañías seleccionadas.")
         return seleccion
 
     elif modo == 2:
-        print("Seleccionando 10 empresas aleatorias.")
-        return df.sample(10)
+        print(f"Seleccionando {sample_size} empresas aleatorias.")
+        return df.sample(sample_size)
 
     else:
         raise ValueError("Modo no válido (debe ser 0, 1 o 2).")
@@ -0,0 +1,210 @@
+"""
+Module: text_blocks
+Description: Out-of-line storage for XBRL TextBlock facts. Tags such as
+SegmentReportingDisclosureTextBlock carry whole inline-HTML sections; kept
+in the extracted tables they make every scan of the numeric columns read
+megabytes of markup. `externalize_text_blocks` strips the HTML to plain
+text in a process pool, stores each block zlib-compressed in a SQLite blob
+store and replaces the cell with the block id (the SHA-256 of the HTML), so
+the main table only holds short references. Readers load a block's text
+only when they ask for it.
+"""
+
+import os
+import zlib
+import sqlite3
+import hashlib
+import pandas as pd
+from lxml import etree, html
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from src.xbrl_parser import PERIOD_SEPARATOR
+
+TEXT_BLOCK_SUFFIX = "textblock"
+
+COMPRESS_LEVEL = 6
+
+# Elements surrounded by line breaks when converting to text
+BLOCK_ELEMENTS = {"p", "div", "br", "tr", "li", "table", "h1", "h2", "h3",
+                  "h4", "h5", "h6"}
+CELL_ELEMENTS = {"td", "th"}
+
+# Below this many blocks the process pool costs more than it saves
+PARALLEL_MIN_BLOCKS = 8
+
+
+def is_text_block(tag: str) -> bool:
+    """True for TextBlock concepts (e.g. debtdisclosuretextblock), also in
+    their multi-period columns (debtdisclosuretextblock__fy)."""
+    return tag.lower().split(PERIOD_SEPARATOR)[0].endswith(TEXT_BLOCK_SUFFIX)
+
+
+def block_id(content: str) -> str:
+    """Id of a text block: SHA-256 of its original HTML."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def html_to_text(content: str) -> str:
+    """
+    Converts an inline-HTML text block to plain text, one line per block
+    element, non-empty table cells separated by tabs.
+    """
+    try:
+        root = html.fragment_fromstring(content, create_parent="div")
+    except (etree.ParserError, ValueError):
+        return content.strip()
+    for elem in root.iter():
+        if not isinstance(elem.tag, str):
+            continue
+        tag = elem.tag.lower()
+        if tag in BLOCK_ELEMENTS:
+            elem.text = "\n" + (elem.text or "")
+            elem.tail = "\n" + (elem.tail or "")
+        elif tag in CELL_ELEMENTS:
+            elem.tail = "\t" + (elem.tail or "")
+    lines = []
+    for line in root.text_content().replace("\xa0", " ").splitlines():
+        # Collapse whitespace and drop the empty spacer cells of the tables
+        cells = (" ".join(cell.split()) for cell in line.split("\t"))
+        line = "\t".join(cell for cell in cells if cell)
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+class TextBlockStore:
+    """
+    SQLite store of compressed text blocks keyed by block id.
+
+    Each block keeps the plain text and the original HTML, both
+    zlib-compressed. Identical blocks are stored once.
+
+    Args:
+        db_path (str): Database file (created if missing).
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS blocks (
+                id TEXT PRIMARY KEY,
+                text BLOB NOT NULL,
+                html BLOB NOT NULL,
+                text_size INTEGER NOT NULL,
+                html_size INTEGER NOT NULL
+            )""")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "TextBlockStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def has(self, ids: Iterable[str]) -> Set[str]:
+        """Returns the subset of `ids` already stored."""
+        ids = list(ids)
+        found = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            found.update(row[0] for row in self.conn.execute(
+                f"SELECT id FROM blocks WHERE id IN "
+                f"({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def put_many(self, blocks: Dict[str, Tuple[str, str]]) -> None:
+        """Stores {id: (html, text)} blocks; existing ids are kept."""
+        rows = []
+        for bid, (content, text) in blocks.items():
+            html_bytes, text_bytes = content.encode("utf-8"), \
+                text.encode("utf-8")
+            rows.append((bid, zlib.compress(text_bytes, COMPRESS_LEVEL),
+                         zlib.compress(html_bytes, COMPRESS_LEVEL),
+                         len(text_bytes), len(html_bytes)))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO blocks VALUES (?, ?, ?, ?, ?)", rows)
+
+    def _get(self, bid: str, column: str) -> Optional[str]:
+        row = self.conn.execute(f"SELECT {column} FROM blocks WHERE id = ?",
+                                (bid,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def get(self, bid: str) -> Optional[str]:
+        """Plain text of a block, or None if the id is unknown."""
+        return self._get(bid, "text")
+
+    def get_html(self, bid: str) -> Optional[str]:
+        """Original HTML of a block, or None if the id is unknown."""
+        return self._get(bid, "html")
+
+    def resolve(self, ids: pd.Series) -> pd.Series:
+        """
+        Replaces block ids with their text. Only the blocks referenced by
+        `ids` are read, so select the rows first and resolve afterwards.
+        """
+        cache = {}
+
+        def load(bid):
+            if not isinstance(bid, str):
+                return bid
+            if bid not in cache:
+                cache[bid] = self.get(bid)
+            return cache[bid]
+
+        return ids.map(load)
+
+
+def _strip_block(content: str) -> Tuple[str, str, str]:
+    return block_id(content), content, html_to_text(content)
+
+
+def externalize_text_blocks(df: pd.DataFrame, store: TextBlockStore,
+                            columns: Optional[List[str]] = None,
+                            max_workers: Optional[int] = None
+                            ) -> pd.DataFrame:
+    """
+    Moves TextBlock cells out of `df` into `store`.
+
+    The HTML of every block not already stored is converted to text in a
+    process pool. Each cell is replaced by its block id.
+
+    Args:
+        df (pd.DataFrame): Extracted rows, one column per tag.
+        store (TextBlockStore): Destination store.
+        columns (List[str]): Columns to move (default: every column whose
+        name ends in "textblock").
+        max_workers (int): Worker processes (None = every core, 1 = run in
+        this process).
+
+    Returns:
+        pd.DataFrame: Copy of `df` with block ids in those columns.
+    """
+    if columns is None:
+        columns = [column for column in df.columns if is_text_block(column)]
+    ids, contents = {}, {}
+    for column in columns:
+        for value in df[column].dropna():
+            if isinstance(value, str) and value and value not in ids:
+                ids[value] = block_id(value)
+                contents[ids[value]] = value
+
+    missing = set(contents) - store.has(contents)
+    pending = [contents[bid] for bid in missing]
+    if max_workers == 1 or len(pending) < PARALLEL_MIN_BLOCKS:
+        stripped = [_strip_block(content) for content in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            stripped = list(executor.map(_strip_block, pending,
+                                         chunksize=4))
+    store.put_many({bid: (content, text)
+                    for bid, content, text in stripped})
+
+    replaced = {column: df[column].map(lambda value: ids.get(value, value)
+                                       if isinstance(value, str) else value)
+                for column in columns}
+    return df.assign(**replaced)
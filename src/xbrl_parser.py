@@ -0,0 +1,581 @@
+"""
+Module: xbrl_parser
+Description: Streaming XBRL instance parser built on lxml.iterparse (files)
+and lxml.XMLPullParser (byte streams such as HTTP responses). Only the
+top-level children of the instance (contexts, units and facts) are
+materialized, one at a time, and cleared as soon as they are processed, so
+peak memory stays flat regardless of the size of the filing.
+"""
+
+from datetime import date, datetime, timedelta
+from lxml import etree
+from typing import (Dict, FrozenSet, IO, Iterable, Iterator, List, NamedTuple,
+                    Optional, Set, Tuple, Union)
+
+XBRLI_NS = "http://www.xbrl.org/2003/instance"
+XBRLDI_NS = "http://xbrl.org/2006/xbrldi"
+XSI_NIL = "{http://www.w3.org/2001/XMLSchema-instance}nil"
+CONTEXT_TAG = f"{{{XBRLI_NS}}}context"
+UNIT_TAG = f"{{{XBRLI_NS}}}unit"
+IDENTIFIER_TAG = f"{{{XBRLI_NS}}}identifier"
+START_DATE_TAG = f"{{{XBRLI_NS}}}startDate"
+END_DATE_TAG = f"{{{XBRLI_NS}}}endDate"
+INSTANT_TAG = f"{{{XBRLI_NS}}}instant"
+SEGMENT_TAG = f"{{{XBRLI_NS}}}segment"
+MEASURE_TAG = f"{{{XBRLI_NS}}}measure"
+NUMERATOR_TAG = f"{{{XBRLI_NS}}}unitNumerator"
+DENOMINATOR_TAG = f"{{{XBRLI_NS}}}unitDenominator"
+
+# Period labels of the multi-period extraction, relative to the report date
+# (the end of the period the document reports on):
+#   FY / FY_prior    duration of about a year ending on the report date /
+#                    one year earlier
+#   Q / Q_prior      duration of about a quarter, same ends
+#   YTD / YTD_prior  duration from the start of the fiscal year, same ends
+#                    (in a first-quarter 10-Q, Q and YTD are the same context)
+#   I                instant on the report date (balance sheet)
+#   I_prior          instant at the end of the previous fiscal year (the
+#                    comparative balance sheet of both 10-K and 10-Q)
+PERIODS = ("FY", "FY_prior", "Q", "Q_prior", "YTD", "YTD_prior", "I",
+           "I_prior")
+
+# Separator of tag and period in the multi-period column names
+# (revenues__fy_prior)
+PERIOD_SEPARATOR = "__"
+
+# Day tolerances: report date matches as in the single-period extractor;
+# year-ago dates allow for 52/53-week fiscal years
+CURRENT_TOLERANCE_DAYS = 1
+PRIOR_TOLERANCE_DAYS = 7
+MIN_YEAR_DAYS = 340
+MAX_QUARTER_DAYS = 100
+
+# Cover-page facts (dei:DocumentType, dei:DocumentFiscalYearFocus...)
+# describe the document, not a period
+DEI_NAMESPACE_MARK = "/dei/"
+DOCUMENT_PERIOD_END_TAG = "documentperiodenddate"
+
+
+class Context(NamedTuple):
+    """Period and entity of an xbrli:context."""
+    id: str
+    cik: Optional[str]
+    period_start: Optional[str]
+    period_end: Optional[str]
+    instant: Optional[str]
+    dimensions: str  # "Axis=Member;..." sorted, "" when not dimensional
+
+
+class Fact(NamedTuple):
+    """One reported fact with its context and unit resolved."""
+    cik: Optional[str]
+    concept: str
+    period_start: Optional[str]
+    period_end: Optional[str]
+    instant: Optional[str]
+    unit: Optional[str]
+    decimals: Optional[str]
+    dimensions: str
+    value: Optional[str]
+
+
+def _child_text(elem, path: str) -> Optional[str]:
+    found = elem.find(path)
+    if found is None or found.text is None:
+        return None
+    return found.text.strip()
+
+
+def parse_context(elem) -> Context:
+    """Builds a Context from an xbrli:context element."""
+    members = []
+    segment = elem.find(f".//{SEGMENT_TAG}")
+    if segment is not None:
+        for member in segment:
+            if not isinstance(member.tag, str):
+                continue
+            if member.tag.endswith("}typedMember"):
+                value = "".join(member.itertext()).strip()
+            else:
+                value = (member.text or "").strip()
+            members.append(f"{member.attrib.get('dimension', '')}={value}")
+    return Context(
+        id=elem.attrib.get("id", ""),
+        cik=_child_text(elem, f".//{IDENTIFIER_TAG}"),
+        period_start=_child_text(elem, f".//{START_DATE_TAG}"),
+        period_end=_child_text(elem, f".//{END_DATE_TAG}"),
+        instant=_child_text(elem, f".//{INSTANT_TAG}"),
+        dimensions=";".join(sorted(members)))
+
+
+def parse_unit(elem) -> str:
+    """Renders an xbrli:unit as text, e.g. iso4217:USD/shares."""
+    numerator = elem.find(f".//{NUMERATOR_TAG}")
+    if numerator is not None:
+        denominator = elem.find(f".//{DENOMINATOR_TAG}")
+        return "/".join(
+            "*".join(m.text.strip() for m in part.iter(MEASURE_TAG))
+            for part in (numerator, denominator) if part is not None)
+    return "*".join(m.text.strip() for m in elem.iter(MEASURE_TAG))
+
+
+class TagIndex:
+    """
+    Resolves namespaced element tags ({namespace}LocalName) to the requested
+    lowercase tag names with a hash lookup.
+
+    The namespace split and lowercasing run once per distinct QName in the
+    document; afterwards each element costs a single dict lookup.
+
+    Args:
+        tag_list (Iterable[str]): Lowercase local tag names to extract.
+    """
+
+    def __init__(self, tag_list: Iterable[str]):
+        self.tags = frozenset(tag_list)
+        self._resolved: Dict[str, Optional[str]] = {}
+
+    def resolve(self, qname: str) -> Optional[str]:
+        """Returns the requested tag name for `qname`, or None."""
+        try:
+            return self._resolved[qname]
+        except KeyError:
+            local = qname.split("}")[-1].strip().lower()
+            name = local if local in self.tags else None
+            self._resolved[qname] = name
+            return name
+
+
+class StreamingExtractor:
+    """
+    Collects the requested facts of one XBRL instance from a stream of
+    top-level elements.
+
+    A fact is kept when its local name (lowercase) is in `tag_list` and its
+    contextRef points to a context whose endDate is within one day of
+    `target_date`. As in the tree-based extractor, the last matching fact of
+    each tag wins. Contexts normally precede facts; facts whose context has
+    not been seen yet are buffered and resolved at the end.
+
+    Args:
+        tag_list (Iterable[str]): Lowercase local tag names to extract.
+        target_date (str): Report date as YYYYMMDD.
+    """
+
+    def __init__(self, tag_list: Iterable[str], target_date: str):
+        self.tag_index = TagIndex(tag_list)
+        try:
+            self.target_dt = datetime.strptime(target_date, "%Y%m%d")
+        except ValueError:
+            self.target_dt = None
+        self.seen_contexts: Set[str] = set()
+        self.relevant_contexts: Set[str] = set()
+        self.data: Dict[str, Tuple[int, str]] = {}
+        self.pending: List[Tuple[int, str, str, str]] = []
+        self.position = 0
+
+    def handle_context(self, elem) -> None:
+        context_id = elem.attrib.get("id", "")
+        self.seen_contexts.add(context_id)
+        end_date_elem = elem.find(f".//{END_DATE_TAG}")
+        if self.target_dt is None or end_date_elem is None:
+            return
+        try:
+            context_dt = datetime.strptime(end_date_elem.text.strip(),
+                                           "%Y-%m-%d")
+        except (AttributeError, ValueError):
+            return
+        if abs((context_dt - self.target_dt).days) <= 1:
+            self.relevant_contexts.add(context_id)
+
+    def handle_fact(self, elem) -> None:
+        self.position += 1
+        if not isinstance(elem.tag, str):
+            return  # comments and processing instructions
+        tag = self.tag_index.resolve(elem.tag)
+        if tag is None or not elem.text:
+            return
+        context = elem.attrib.get("contextRef", "")
+        if context in self.relevant_contexts:
+            self.data[tag] = (self.position, elem.text.strip())
+        elif context not in self.seen_contexts:
+            self.pending.append((self.position, tag, context,
+                                 elem.text.strip()))
+
+    def handle(self, elem) -> None:
+        """Processes one top-level element of the instance."""
+        if elem.tag == CONTEXT_TAG:
+            self.handle_context(elem)
+        else:
+            self.handle_fact(elem)
+
+    def result(self) -> Dict[str, str]:
+        """Returns the extracted {tag: value} dictionary."""
+        for position, tag, context, value in self.pending:
+            if context in self.relevant_contexts \
+                    and position > self.data.get(tag, (0, None))[0]:
+                self.data[tag] = (position, value)
+        return {tag: value for tag, (_, value) in self.data.items()}
+
+
+def validate_periods(periods: Iterable[str]) -> Tuple[str, ...]:
+    """Returns `periods` in PERIODS order; raises ValueError if unknown."""
+    periods = set(periods)
+    unknown = periods.difference(PERIODS)
+    if unknown:
+        raise ValueError(f"Unknown periods: {sorted(unknown)} "
+                         f"(valid: {', '.join(PERIODS)})")
+    return tuple(period for period in PERIODS if period in periods)
+
+
+def period_column(tag: str, period: str) -> str:
+    """Column of a tag in a period: period_column("assets", "I") ->
+    "assets__i"."""
+    return f"{tag}{PERIOD_SEPARATOR}{period.lower()}"
+
+
+def _to_date(value: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(value[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def _near(value: Optional[date], target: Optional[date], days: int) -> bool:
+    return value is not None and target is not None \
+        and abs((value - target).days) <= days
+
+
+def _year_before(day: date) -> date:
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:  # 29 February
+        return day - timedelta(days=365)
+
+
+class ContextIndex:
+    """
+    Contexts of one XBRL instance (period type, start, end, instant and
+    dimensional segment), collected while the document is parsed and
+    classified into report periods once all of them are known.
+    """
+
+    def __init__(self):
+        self.contexts: Dict[str, Context] = {}
+
+    def add(self, elem) -> Context:
+        """Indexes an xbrli:context element."""
+        context = parse_context(elem)
+        self.contexts[context.id] = context
+        return context
+
+    def __contains__(self, context_id: str) -> bool:
+        return context_id in self.contexts
+
+    def __len__(self) -> int:
+        return len(self.contexts)
+
+    def get(self, context_id: str) -> Optional[Context]:
+        return self.contexts.get(context_id)
+
+    def _durations(self, dimensional: bool
+                   ) -> Iterator[Tuple[str, date, date]]:
+        for context in self.contexts.values():
+            if context.dimensions and not dimensional:
+                continue
+            start = _to_date(context.period_start)
+            end = _to_date(context.period_end)
+            if start is not None and end is not None:
+                yield context.id, start, end
+
+    def fiscal_year_start(self, report_date: date) -> Optional[date]:
+        """
+        First day of the fiscal year of the report: start of the longest
+        entity-wide duration ending on the report date (the FY of a 10-K,
+        the year-to-date period of a 10-Q).
+        """
+        starts = [start for _, start, end in self._durations(False)
+                  if _near(end, report_date, CURRENT_TOLERANCE_DAYS)]
+        return min(starts) if starts else None
+
+    def classify(self, report_date: date, dimensional: bool = False
+                 ) -> Dict[str, FrozenSet[str]]:
+        """
+        Period labels (see PERIODS) of every context that has one.
+
+        Args:
+            report_date (date): End of the period the document reports on.
+            dimensional (bool): Also classify contexts with a segment
+            (entity-wide contexts only by default).
+
+        Returns:
+            Dict[str, FrozenSet[str]]: {context id: labels}.
+        """
+        prior_date = _year_before(report_date)
+        fy_start = self.fiscal_year_start(report_date)
+        prior_fy_start = _year_before(fy_start) if fy_start else None
+        # Previous fiscal year end; a year before the report date when the
+        # document has no duration ending on the report date
+        prior_fy_end = fy_start - timedelta(days=1) if fy_start \
+            else prior_date
+
+        labels: Dict[str, FrozenSet[str]] = {}
+        for context_id, start, end in self._durations(dimensional):
+            if _near(end, report_date, CURRENT_TOLERANCE_DAYS):
+                suffix, year_start = "", fy_start
+            elif _near(end, prior_date, PRIOR_TOLERANCE_DAYS):
+                suffix, year_start = "_prior", prior_fy_start
+            else:
+                continue
+            days = (end - start).days
+            found = set()
+            if days >= MIN_YEAR_DAYS:
+                found.add("FY" + suffix)
+            else:
+                if days <= MAX_QUARTER_DAYS:
+                    found.add("Q" + suffix)
+                if _near(start, year_start, PRIOR_TOLERANCE_DAYS
+                         if suffix else CURRENT_TOLERANCE_DAYS):
+                    found.add("YTD" + suffix)
+            if found:
+                labels[context_id] = frozenset(found)
+
+        for context in self.contexts.values():
+            if context.instant is None or (context.dimensions
+                                           and not dimensional):
+                continue
+            instant = _to_date(context.instant)
+            if _near(instant, report_date, CURRENT_TOLERANCE_DAYS):
+                labels[context.id] = frozenset(["I"])
+            elif _near(instant, prior_fy_end, CURRENT_TOLERANCE_DAYS):
+                labels[context.id] = frozenset(["I_prior"])
+        return labels
+
+
+class MultiPeriodExtractor:
+    """
+    Collects the requested facts of one XBRL instance for several report
+    periods in a single pass (see PERIODS): current and prior fiscal year,
+    quarter and year-to-date durations, and current and prior balance sheet
+    instants.
+
+    Contexts go to a ContextIndex and the facts of the requested tags are
+    kept as they stream by; periods are resolved at the end, when every
+    context is known, so the order of contexts and facts in the document
+    does not matter. The report date is dei:DocumentPeriodEndDate when the
+    document has it, `target_date` otherwise.
+
+    Facts go to "{tag}__{period}" columns (see `period_column`), the last
+    matching fact winning. Cover-page (dei) facts describe the document, not
+    a period, and keep their plain tag name.
+
+    Args:
+        tag_list (Iterable[str]): Lowercase local tag names to extract.
+        target_date (str): Report date as YYYYMMDD (file name fallback).
+        periods (Iterable[str]): Period labels to emit (default: all).
+        dimensional (bool): Also use contexts with a segment.
+    """
+
+    def __init__(self, tag_list: Iterable[str], target_date: str,
+                 periods: Iterable[str] = PERIODS,
+                 dimensional: bool = False):
+        self.tag_index = TagIndex(tag_list)
+        self.periods = frozenset(validate_periods(periods))
+        self.dimensional = dimensional
+        try:
+            self.target_date = datetime.strptime(target_date,
+                                                 "%Y%m%d").date()
+        except ValueError:
+            self.target_date = None
+        self.document_period_end: Optional[date] = None
+        self.index = ContextIndex()
+        self.facts: List[Tuple[str, bool, str, str]] = []
+        self._dei: Dict[str, bool] = {}
+
+    def handle_fact(self, elem) -> None:
+        qname = elem.tag
+        if not isinstance(qname, str) or not elem.text:
+            return
+        is_dei = self._dei.get(qname)
+        if is_dei is None:
+            is_dei = self._dei[qname] = DEI_NAMESPACE_MARK in qname
+        tag = self.tag_index.resolve(qname)
+        if is_dei and qname.lower().endswith(DOCUMENT_PERIOD_END_TAG):
+            self.document_period_end = _to_date(elem.text.strip())
+        if tag is not None:
+            self.facts.append((tag, is_dei,
+                               elem.attrib.get("contextRef", ""),
+                               elem.text.strip()))
+
+    def handle(self, elem) -> None:
+        """Processes one top-level element of the instance."""
+        if elem.tag == CONTEXT_TAG:
+            self.index.add(elem)
+        elif elem.tag != UNIT_TAG:
+            self.handle_fact(elem)
+
+    def report_date(self) -> Optional[date]:
+        return self.document_period_end or self.target_date
+
+    def result(self) -> Dict[str, str]:
+        """Returns the extracted {column: value} dictionary."""
+        report_date = self.report_date()
+        labels = self.index.classify(report_date, self.dimensional) \
+            if report_date is not None else {}
+        data: Dict[str, str] = {}
+        for tag, is_dei, context_id, value in self.facts:
+            if is_dei:
+                context = self.index.get(context_id)
+                if context is not None and (self.dimensional
+                                            or not context.dimensions):
+                    data[tag] = value
+                continue
+            for period in labels.get(context_id, ()):
+                if period in self.periods:
+                    data[period_column(tag, period)] = value
+        return data
+
+
+def _top_level(events):
+    """Yields and then clears the top-level children seen in `events`."""
+    for _, elem in events:
+        parent = elem.getparent()
+        if parent is None or parent.getparent() is not None:
+            continue
+        yield elem
+        elem.clear()
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def iter_top_level(source: Union[str, IO[bytes]]):
+    """
+    Yields the top-level children of an XBRL instance one by one, clearing
+    each element (and dropping it from the root) once the caller is done
+    with it.
+
+    Args:
+        source: Path or binary file object of the instance.
+    """
+    return _top_level(etree.iterparse(source, events=("end",),
+                                      huge_tree=True))
+
+
+def iter_top_level_chunks(chunks: Iterable[bytes]):
+    """
+    Same as `iter_top_level`, but fed incrementally with byte chunks (e.g.
+    an HTTP response body), so parsing overlaps with the transfer and the
+    full document is never held in memory.
+
+    Args:
+        chunks (Iterable[bytes]): Consecutive pieces of the document.
+    """
+    parser = etree.XMLPullParser(events=("end",), huge_tree=True)
+
+    def events():
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+
+    return _top_level(events())
+
+
+def iter_facts(top_level: Iterable,
+               concepts: Optional[Iterable[str]] = None) -> Iterator[Fact]:
+    """
+    Resolves every fact of an instance against its context and unit.
+
+    Args:
+        top_level (Iterable): Top-level elements, as produced by
+        `iter_top_level` or `iter_top_level_chunks`.
+        concepts (Iterable[str]): Lowercase local names to keep; all facts
+        are returned by default.
+
+    Yields:
+        Fact: Facts in document order (facts whose context or unit appears
+        later in the document are yielded at the end).
+    """
+    tag_index = TagIndex(concepts) if concepts is not None else None
+    contexts: Dict[str, Context] = {}
+    units: Dict[str, str] = {}
+    pending = []
+
+    def build(concept, attrib, value) -> Fact:
+        context = contexts[attrib["contextRef"]]
+        unit_ref = attrib.get("unitRef")
+        return Fact(context.cik, concept, context.period_start,
+                    context.period_end, context.instant,
+                    units.get(unit_ref, unit_ref), attrib.get("decimals"),
+                    context.dimensions, value)
+
+    for elem in top_level:
+        tag = elem.tag
+        if not isinstance(tag, str):
+            continue
+        if tag == CONTEXT_TAG:
+            context = parse_context(elem)
+            contexts[context.id] = context
+            continue
+        if tag == UNIT_TAG:
+            units[elem.attrib.get("id", "")] = parse_unit(elem)
+            continue
+        attrib = elem.attrib
+        if "contextRef" not in attrib:
+            continue
+        if tag_index is not None and tag_index.resolve(tag) is None:
+            continue
+        concept = tag.split("}")[-1]
+        value = None if attrib.get(XSI_NIL) == "true" \
+            else (elem.text or "").strip()
+        if attrib["contextRef"] in contexts and \
+                ("unitRef" not in attrib or attrib["unitRef"] in units):
+            yield build(concept, attrib, value)
+        else:
+            # The element is cleared after this step: keep a copy
+            pending.append((concept, dict(attrib), value))
+
+    for concept, attrib, value in pending:
+        if attrib["contextRef"] in contexts:
+            yield build(concept, attrib, value)
+
+
+Extractor = Union[StreamingExtractor, MultiPeriodExtractor]
+
+
+def parse_streaming(source: Union[str, IO[bytes]], tag_list: Iterable[str],
+                    target_date: str,
+                    extractor: Optional[Extractor] = None
+                    ) -> Dict[str, str]:
+    """
+    Extracts the requested facts from an XBRL instance in a single
+    streaming pass.
+
+    Args:
+        source: Path or binary file object of the instance.
+        tag_list (Iterable[str]): Lowercase local tag names to extract.
+        target_date (str): Report date as YYYYMMDD.
+        extractor (StreamingExtractor | MultiPeriodExtractor): Extractor to
+        feed; a new StreamingExtractor is created by default.
+
+    Returns:
+        Dict[str, str]: {tag: value} for the tags found.
+    """
+    extractor = extractor or StreamingExtractor(tag_list, target_date)
+    for elem in iter_top_level(source):
+        extractor.handle(elem)
+    return extractor.result()
+
+
+def parse_chunks(chunks: Iterable[bytes], tag_list: Iterable[str],
+                 target_date: str,
+                 extractor: Optional[Extractor] = None) -> Dict[str, str]:
+    """
+    Extracts the requested facts from an XBRL instance delivered as byte
+    chunks. See `parse_streaming` for the arguments and return value.
+    """
+    extractor = extractor or StreamingExtractor(tag_list, target_date)
+    for elem in iter_top_level_chunks(chunks):
+        extractor.handle(elem)
+    return extractor.result()
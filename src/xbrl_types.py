@@ -0,0 +1,166 @@
+"""
+Module: xbrl_types
+Description: Typed conversion of extracted XBRL tables. The extractors
+return every fact as text; dataset/xbrl_tags.csv declares a data_type per
+tag, and `to_declared_types` converts each declared column to a compact
+dtype in one vectorized pass per column:
+
+    integer     Int64 (nullable)
+    float       float64
+    percentage  float64 (XBRL percentages are ratios: 0.21 = 21%)
+    boolean     boolean (nullable): true/false, yes/no, 1/0
+    date        datetime64 (YYYY-MM-DD)
+    string      category: entity names, tickers, form types, DEI codes
+    text        str: narrative and TextBlock content (or block ids)
+
+Cells that do not parse as their declared type become missing values and
+are reported in an errors frame (row, column, data_type, value) instead of
+failing the conversion. Columns of undeclared tags, metadata columns and
+columns that are already typed are left as they are. Multi-period columns
+(revenues__fy) take the type of their tag.
+"""
+
+import pandas as pd
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from src.xbrl_parser import PERIOD_SEPARATOR
+
+ERROR_COLUMNS = ["row", "column", "data_type", "value"]
+
+TRUE_VALUES = ("true", "yes", "1")
+FALSE_VALUES = ("false", "no", "0")
+BOOLEAN_VALUES = {**{value: True for value in TRUE_VALUES},
+                  **{value: False for value in FALSE_VALUES}}
+
+# Integers as XBRL writes them; "1500.0" is still an integer
+INTEGER_PATTERN = r"[+-]?\d+(?:\.0*)?"
+
+# xs:date without time zone; gMonthDay values such as "--12-31" are not
+# dates (and pandas would read them as year 0)
+DATE_PATTERN = r"\d{4}-\d{2}-\d{2}"
+
+
+def _to_integer(values: pd.Series) -> pd.Series:
+    integers = values.where(values.str.fullmatch(INTEGER_PATTERN))
+    return integers.str.replace(r"\.0*$", "", regex=True).astype("Int64")
+
+
+def _to_float(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values, errors="coerce").astype("float64")
+
+
+def _to_boolean(values: pd.Series) -> pd.Series:
+    return values.str.lower().map(BOOLEAN_VALUES).astype("boolean")
+
+
+def _to_date(values: pd.Series) -> pd.Series:
+    dates = values.where(values.str.fullmatch(DATE_PATTERN))
+    return pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce")
+
+
+def _to_category(values: pd.Series) -> pd.Series:
+    return values.astype("category")
+
+
+def _to_text(values: pd.Series) -> pd.Series:
+    return values
+
+
+CONVERTERS: Dict[str, Callable[[pd.Series], pd.Series]] = {
+    "integer": _to_integer,
+    "float": _to_float,
+    "percentage": _to_float,
+    "boolean": _to_boolean,
+    "date": _to_date,
+    "string": _to_category,
+    "text": _to_text,
+}
+
+DATA_TYPES = tuple(CONVERTERS)
+
+
+def tag_types(tags_df: pd.DataFrame) -> Dict[str, str]:
+    """
+    {lowercase tag: data_type} from a tags table with tag_name and
+    data_type columns; empty when the table declares no types (e.g.
+    xbrl_tags_sample.csv). Unknown data types raise ValueError.
+    """
+    columns = {column.strip().lower(): column for column in tags_df.columns}
+    if "tag_name" not in columns or "data_type" not in columns:
+        return {}
+    declared = tags_df[[columns["tag_name"], columns["data_type"]]].dropna()
+    types = dict(zip(declared.iloc[:, 0].str.strip().str.lower(),
+                     declared.iloc[:, 1].str.strip().str.lower()))
+    unknown = sorted(set(types.values()) - set(DATA_TYPES))
+    if unknown:
+        raise ValueError(f"Unknown data types: {', '.join(unknown)} "
+                         f"(expected: {', '.join(DATA_TYPES)})")
+    return types
+
+
+def load_tag_types(tags_file: str) -> Dict[str, str]:
+    """Reads the declared data type of every tag from a tags CSV."""
+    return tag_types(pd.read_csv(tags_file, dtype=str))
+
+
+def declared_type(column: str, types: Dict[str, str]) -> Optional[str]:
+    """Data type of a tag column, also for its multi-period columns."""
+    return types.get(column.lower().split(PERIOD_SEPARATOR)[0])
+
+
+def convert_column(series: pd.Series, data_type: str
+                   ) -> Tuple[pd.Series, pd.Series]:
+    """
+    Converts a text column to `data_type`.
+
+    Args:
+        series (pd.Series): Extracted values (text, missing allowed).
+        data_type (str): One of DATA_TYPES.
+
+    Returns:
+        Tuple[pd.Series, pd.Series]: The typed column and a boolean mask of
+        the cells that had a value but did not parse.
+    """
+    values = series.astype("str").str.strip().where(series.notna())
+    typed = CONVERTERS[data_type](values)
+    return typed, values.notna() & typed.isna()
+
+
+def to_declared_types(df: pd.DataFrame, types: Dict[str, str],
+                      columns: Optional[Iterable[str]] = None
+                      ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Converts the declared columns of an extracted table to their types.
+
+    Args:
+        df (pd.DataFrame): Extracted rows, one column per tag.
+        types (Dict[str, str]): {lowercase tag: data_type}, see `tag_types`.
+        columns (Iterable[str]): Only these columns (all by default).
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The typed table (same index and
+        column order) and the cells that failed to convert, with
+        ERROR_COLUMNS (row is the index label).
+    """
+    converted, errors = {}, []
+    for column in df.columns if columns is None else columns:
+        data_type = declared_type(column, types)
+        series = df[column]
+        # Already typed (e.g. read back from Parquet): nothing to do
+        if data_type is None or not (
+                pd.api.types.is_object_dtype(series)
+                or pd.api.types.is_string_dtype(series)) \
+                or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        typed, failed = convert_column(series, data_type)
+        converted[column] = typed
+        if failed.any():
+            errors.append(pd.DataFrame({
+                "row": series.index[failed], "column": column,
+                "data_type": data_type, "value": series[failed].to_numpy()}))
+    if not converted:
+        typed_df = df
+    else:
+        typed_df = df.assign(**converted)
+    if not errors:
+        return typed_df, pd.DataFrame(columns=ERROR_COLUMNS)
+    return typed_df, pd.concat(errors, ignore_index=True)